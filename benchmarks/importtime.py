@@ -0,0 +1,95 @@
+"""各子命令的导入耗时基准 - 基于 python -X importtime
+
+每个子命令在新解释器中运行若干次，统计顶层模块的累计导入耗时（不含
+解释器启动时 site 的导入），取最小值与阈值比较；控制类命令还检查
+没有导入禁止的重量级模块。
+
+用法：
+    python benchmarks/importtime.py            # 输出各子命令耗时
+    python benchmarks/importtime.py --check    # 超出阈值时返回非零退出码
+    python benchmarks/importtime.py --top 10   # 同时列出耗时最多的模块
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# 控制类命令只应加载标准库（和 click）
+CONTROL_FORBIDDEN = {"numpy", "sounddevice", "litellm", "httpx", "openai", "torch", "voxy.daemon"}
+
+# (名称, 命令行参数, 阈值 ms, 禁止导入的模块)
+BENCHMARKS = [
+    ("voxy --help", ["-m", "voxy", "--help"], 100, CONTROL_FORBIDDEN),
+    ("voxy config", ["-m", "voxy", "config"], 100, CONTROL_FORBIDDEN),
+    ("voxy daemon status", ["-m", "voxy", "daemon", "status"], 100, CONTROL_FORBIDDEN),
+    ("voxy daemon stop", ["-m", "voxy", "daemon", "stop"], 100, CONTROL_FORBIDDEN),
+    ("voxy-trigger --help", ["-m", "voxy.fast", "--help"], 60,
+     CONTROL_FORBIDDEN | {"click", "voxy.config", "voxy.daemon_client"}),
+]
+
+
+def parse_importtime(stderr: str) -> tuple[dict[str, int], int]:
+    """解析 -X importtime 输出，返回 ({模块名: 累计耗时 us}, 顶层模块累计耗时之和 us)。
+
+    site 及其子模块属于解释器启动，不计入总耗时。
+    """
+    modules: dict[str, int] = {}
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # 表头
+        us = int(cumulative)
+        top_level = not name[1:].startswith(" ")  # 名称前只有一个分隔空格
+        name = name.strip()
+        modules[name] = us
+        if top_level and name != "site":
+            total += us
+    return modules, total
+
+
+def run_once(args: list[str], runtime_dir: str) -> tuple[dict[str, int], int]:
+    # XDG_RUNTIME_DIR 指向空目录：daemon status/stop 连不上 socket，立即返回
+    env = {**os.environ, "PYTHONPATH": SRC, "XDG_RUNTIME_DIR": runtime_dir}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True, text=True, env=env,
+    )
+    return parse_importtime(proc.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="voxy 子命令导入耗时基准")
+    parser.add_argument("--check", action="store_true", help="超出阈值或导入了禁止的模块时失败")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="每个命令运行次数，取最小值")
+    parser.add_argument("--top", type=int, default=0, help="列出耗时最多的 N 个模块")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as runtime_dir:
+        for name, argv, limit_ms, forbidden in BENCHMARKS:
+            runs = [run_once(argv, runtime_dir) for _ in range(args.repeat)]
+            modules, total = min(runs, key=lambda r: r[1])
+            ms = total / 1000
+            bad = sorted(forbidden & set(modules))
+            ok = ms <= limit_ms and not bad
+            failed |= not ok
+            status = "ok" if ok else "FAIL"
+            print(f"{name:<24} {ms:7.1f} ms  (阈值 {limit_ms} ms)  {status}")
+            if bad:
+                print(f"    导入了禁止的模块: {', '.join(bad)}")
+            if args.top:
+                for mod, us in sorted(modules.items(), key=lambda kv: -kv[1])[: args.top]:
+                    print(f"    {us / 1000:7.1f} ms  {mod}")
+
+    return 1 if args.check and failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
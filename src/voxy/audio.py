@@ -1,16 +1,22 @@
-"""麦克风录音模块 - sounddevice 流式采集 + 静音检测"""
+"""麦克风录音模块 - sounddevice 流式采集 + VAD 端点检测
+
+sounddevice 在录音时才导入：没有 PortAudio 的环境也能使用 AudioBuffer。
+"""
 
 import sys
 import threading
+from collections.abc import Callable
 
 import numpy as np
-import sounddevice as sd
 
 from voxy.config import AudioConfig
+from voxy.vad import Endpointer, NoiseFloorTracker, create_vad
 
 
 def list_devices() -> str:
     """列出所有音频输入设备。"""
+    import sounddevice as sd
+
     devices = sd.query_devices()
     lines = []
     for i, dev in enumerate(devices):
@@ -22,24 +28,69 @@ def list_devices() -> str:
     return "音频输入设备:\n" + "\n".join(lines) + "\n\n  * = 系统默认设备"
 
 
-def _measure_noise(sample_rate: int, device, duration: float = 0.5) -> float:
-    """测量环境噪音水平，返回平均音量。"""
-    data = sd.rec(
-        int(duration * sample_rate),
-        samplerate=sample_rate,
-        channels=1,
-        dtype="float32",
-        device=device,
-    )
-    sd.wait()
-    return float(np.abs(data).mean())
+class AudioBuffer:
+    """预分配的 float32 录音缓冲区，音频回调原地写入，按需倍增扩容。
 
+    已写入的数据不会被修改，view() 和 write() 返回的都是零拷贝视图；
+    扩容时旧视图仍引用旧数组，内容保持有效。达到 max_samples 后不再写入。
+    """
 
-def record(config: AudioConfig) -> np.ndarray:
+    def __init__(self, capacity: int, max_samples: int = 0):
+        self._max = max_samples
+        if max_samples > 0:
+            capacity = min(capacity, max_samples)
+        self._data = np.empty(max(capacity, 1), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def full(self) -> bool:
+        """是否已达到最大时长。"""
+        return 0 < self._max <= self._size
+
+    def write(self, block: np.ndarray) -> np.ndarray:
+        """追加一块音频，返回刚写入部分的视图（超出上限的部分丢弃）。"""
+        n = len(block)
+        if self._max > 0:
+            n = min(n, self._max - self._size)
+        end = self._size + n
+        if end > len(self._data):
+            capacity = max(end, len(self._data) * 2)
+            if self._max > 0:
+                capacity = min(capacity, self._max)
+            grown = np.empty(capacity, dtype=np.float32)
+            grown[: self._size] = self._data[: self._size]
+            self._data = grown
+        self._data[self._size:end] = block[:n]
+        start, self._size = self._size, end
+        return self._data[start:end]
+
+    def view(self) -> np.ndarray:
+        """已录音频的零拷贝视图。"""
+        return self._data[: self._size]
+
+
+def record(
+    config: AudioConfig,
+    on_chunk: Callable[[np.ndarray], None] | None = None,
+    noise: NoiseFloorTracker | None = None,
+) -> np.ndarray:
     """录音直到用户按 Enter 或连续静音超时。
 
-    返回 16kHz 单声道 float32 numpy array。
+    Args:
+        config: 音频配置
+        on_chunk: 每个音频块采集后的回调（在音频线程中调用，不可阻塞），
+            用于边录边发送给 daemon 流式转写；参数是录音缓冲区的只读视图
+        noise: 噪音底估计器（可带入上次缓存的噪音底），录音结束后
+            调用方可读取 noise.floor 缓存给下次使用
+
+    返回 16kHz 单声道 float32 numpy array（录音缓冲区的视图，不复制），
+    首尾静音裁剪到 pre-roll 长度。录音达到 config.max_duration 秒时自动停止。
     """
+    import sounddevice as sd
+
     sample_rate = config.sample_rate
     silence_duration = config.silence_duration
     device = None if config.device == "default" else config.device
@@ -51,33 +102,31 @@ def record(config: AudioConfig) -> np.ndarray:
         except ValueError:
             pass
 
-    # 自动测量环境噪音，阈值 = 噪音水平 * 1.5
-    noise_level = _measure_noise(sample_rate, device)
-    silence_threshold = noise_level * 1.5
-    print(f"  环境噪音: {noise_level:.3f}, 静音阈值: {silence_threshold:.3f}", file=sys.stderr)
+    # 噪音底在录音回调中持续估计，无需录音前单独校准
+    if noise is None:
+        noise = NoiseFloorTracker(sample_rate)
+    vad = create_vad(config.vad, sample_rate, noise)
+    # 逐帧端点检测：至少检测到一次说话后，连续静音 silence_duration 秒停止
+    endpoint = Endpointer(vad.frame, sample_rate, silence_duration)
 
-    chunks: list[np.ndarray] = []
-    silent_samples = 0
-    max_silent = int(silence_duration * sample_rate)
-    has_speech = False  # 确保至少检测到一次说话才触发静音停止
+    max_samples = int(config.max_duration * sample_rate)
+    buffer = AudioBuffer(60 * sample_rate, max_samples)
     stop_event = threading.Event()
 
     def audio_callback(indata: np.ndarray, frames: int, time_info, status):
-        nonlocal silent_samples, has_speech
         if status:
             print(f"  音频警告: {status}", file=sys.stderr)
 
-        chunk = indata[:, 0].copy()
-        chunks.append(chunk)
+        chunk = buffer.write(indata[:, 0])
+        if buffer.full:
+            stop_event.set()
+        if chunk.size == 0:
+            return
+        if on_chunk is not None:
+            on_chunk(chunk)
 
-        volume = np.abs(chunk).mean()
-        if volume < silence_threshold:
-            silent_samples += frames
-            if has_speech and silent_samples >= max_silent:
-                stop_event.set()
-        else:
-            silent_samples = 0
-            has_speech = True
+        if endpoint.update(vad.detect(chunk)):
+            stop_event.set()
 
     def wait_for_enter():
         try:
@@ -96,14 +145,16 @@ def record(config: AudioConfig) -> np.ndarray:
         dtype="float32",
         device=device,
         callback=audio_callback,
-        blocksize=int(sample_rate * 0.1),  # 100ms blocks
+        blocksize=int(sample_rate * 0.04),  # 40ms blocks，端点检测按 20ms 帧
     ):
         enter_thread.start()
         stop_event.wait()
 
+    if buffer.full:
+        print(f"  已达到最长录音时长 ({config.max_duration:g} 秒)", file=sys.stderr)
     print("  录音结束。", file=sys.stderr)
+    if noise.floor is not None:
+        print(f"  环境噪音: {noise.floor:.4f}", file=sys.stderr)
 
-    if not chunks:
-        return np.array([], dtype=np.float32)
-
-    return np.concatenate(chunks)
+    start, end = endpoint.bounds(len(buffer))
+    return buffer.view()[start:end]
@@ -0,0 +1,339 @@
+"""性能基准 - STT 引擎直连 / 经 daemon 转写，以及与后端无关的组件
+
+一组固定的语料（WAV 目录，或没有语料时生成的合成音频）依次通过：
+
+- 直连引擎：冷启动加载耗时、热态延迟分位数、实时率 (RTF)、峰值 RSS / 显存
+- 进程内 daemon：经 Unix socket 整段转写的延迟，以及 N 个并发客户端的吞吐
+- 组件：协议编解码、录音缓冲区写入、逐帧 VAD，不依赖任何模型
+
+--stub 使用按固定实时率 sleep 的桩引擎，仅 CPU 的机器上也能跑完整流程。
+结果可输出为 JSON，便于在不同提交之间比较。
+"""
+
+import os
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+import wave
+from dataclasses import replace
+
+import numpy as np
+
+from voxy.config import Config
+from voxy.stt import STTEngine, create_stt
+from voxy.timing import percentile
+
+SYNTHETIC_SECONDS = (2.0, 5.0, 15.0)
+
+
+class StubSTT(STTEngine):
+    """桩引擎：按 rtf × 音频时长 sleep，模拟推理耗时。"""
+
+    def __init__(self, rtf: float = 0.05, load_seconds: float = 0.0):
+        self._rtf = rtf
+        time.sleep(load_seconds)
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        time.sleep(len(audio) / sample_rate * self._rtf)
+        return "stub"
+
+
+def synthetic_corpus(sample_rate: int = 16000,
+                     seconds: tuple[float, ...] = SYNTHETIC_SECONDS) -> list[tuple[str, np.ndarray]]:
+    """生成类语音的合成音频：带谐波和抖动的音节，音节间有停顿，叠加底噪。"""
+    rng = np.random.default_rng(0)
+    corpus = []
+    for total in seconds:
+        n = int(total * sample_rate)
+        audio = rng.normal(0, 0.002, n).astype(np.float32)
+        pos = int(0.3 * sample_rate)
+        while pos < n:
+            length = int(rng.uniform(0.15, 0.4) * sample_rate)
+            t = np.arange(min(length, n - pos)) / sample_rate
+            f0 = rng.uniform(110, 260)
+            voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 5))
+            envelope = np.sin(np.pi * np.linspace(0, 1, len(t))) ** 2
+            audio[pos:pos + len(t)] += (0.2 * voiced * envelope).astype(np.float32)
+            pos += length + int(rng.uniform(0.05, 0.6) * sample_rate)
+        corpus.append((f"synthetic-{total:g}s", audio))
+    return corpus
+
+
+def load_wav(path: str, sample_rate: int) -> np.ndarray:
+    """读取 16-bit PCM WAV，混为单声道并线性重采样到 sample_rate。"""
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path}: 只支持 16-bit PCM WAV")
+        channels, rate = f.getnchannels(), f.getframerate()
+        data = np.frombuffer(f.readframes(f.getnframes()), dtype="<i2")
+    audio = data.reshape(-1, channels).mean(axis=1).astype(np.float32) / 32768.0
+    if rate != sample_rate:
+        n = int(len(audio) * sample_rate / rate)
+        audio = np.interp(np.linspace(0, len(audio) - 1, n), np.arange(len(audio)),
+                          audio).astype(np.float32)
+    return audio
+
+
+def load_corpus(directory: str, sample_rate: int) -> list[tuple[str, np.ndarray]]:
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(".wav"))
+    if not names:
+        raise ValueError(f"{directory} 中没有 WAV 文件")
+    return [(n, load_wav(os.path.join(directory, n), sample_rate)) for n in names]
+
+
+def _peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _peak_vram_mb() -> float | None:
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return None
+    try:
+        if torch.cuda.is_available():
+            return torch.cuda.max_memory_allocated() / (1024 * 1024)
+    except Exception:
+        pass
+    return None
+
+
+def _latency_stats(latencies: list[float], audio_seconds: float) -> dict:
+    total = sum(latencies)
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "rtf": round(total / audio_seconds, 4) if audio_seconds else None,
+    }
+
+
+def bench_direct(factory, corpus: list[tuple[str, np.ndarray]], sample_rate: int,
+                 repeat: int) -> tuple[dict, STTEngine]:
+    """直连引擎：冷启动（创建 + 首次推理）后逐条热态转写。"""
+    start = time.perf_counter()
+    engine = factory()
+    engine.transcribe(np.zeros(sample_rate // 10, dtype=np.float32), sample_rate=sample_rate)
+    cold = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(repeat):
+        for _, audio in corpus:
+            t0 = time.perf_counter()
+            engine.transcribe(audio, sample_rate=sample_rate)
+            latencies.append(time.perf_counter() - t0)
+    audio_seconds = repeat * sum(len(a) for _, a in corpus) / sample_rate
+    result = {"cold_load_s": round(cold, 3), **_latency_stats(latencies, audio_seconds),
+              "peak_rss_mb": round(_peak_rss_mb(), 1)}
+    vram = _peak_vram_mb()
+    if vram is not None:
+        result["peak_vram_mb"] = round(vram, 1)
+    return result, engine
+
+
+def bench_daemon(config: Config, engine_factory, corpus: list[tuple[str, np.ndarray]],
+                 repeat: int, clients: list[int]) -> dict:
+    """在临时 Unix socket 上启动进程内 daemon，测整段转写延迟与并发吞吐。"""
+    from voxy.daemon import DaemonServer
+    from voxy.daemon_client import DaemonClient
+
+    sample_rate = config.audio.sample_rate
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sock")
+        dc = replace(config.daemon, listen=f"unix://{path}", connect="", token="",
+                     tls_cert="", tls_key="", tls_ca="", capture=False, metrics_port=0)
+        server = DaemonServer(replace(config, daemon=dc), engine_factory=engine_factory)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.listen(64)
+        thread = threading.Thread(target=server.serve, args=(sock,), daemon=True)
+        thread.start()
+        try:
+            with DaemonClient(dc) as client:
+                # 首个请求触发模型加载，计入冷启动
+                start = time.perf_counter()
+                client.transcribe(corpus[0][1], sample_rate=sample_rate,
+                                  dtype=dc.audio_dtype)
+                cold = time.perf_counter() - start
+
+            result = {"cold_request_s": round(cold, 3), "concurrency": []}
+            for n in clients:
+                result["concurrency"].append(_bench_clients(dc, corpus, sample_rate, repeat, n))
+            result["metrics"] = {
+                "model_loads": server.metrics.model_loads.value(engine=config.stt.backend),
+                "busy_rejections": server.metrics.busy.value(),
+            }
+        finally:
+            server._running = False
+            thread.join(timeout=5.0)
+    return result
+
+
+def _bench_clients(dc, corpus, sample_rate: int, repeat: int, n: int) -> dict:
+    """n 个客户端各自用一条长连接发送全部语料 repeat 遍。"""
+    from voxy.daemon_client import DaemonClient
+
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(n)
+
+    def _client():
+        nonlocal errors
+        with DaemonClient(dc) as client:
+            client.ping()
+            barrier.wait()
+            for _ in range(repeat):
+                for _, audio in corpus:
+                    t0 = time.perf_counter()
+                    try:
+                        client.transcribe(audio, sample_rate=sample_rate, dtype=dc.audio_dtype)
+                    except Exception:
+                        with lock:
+                            errors += 1
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=_client) for _ in range(n)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    audio_seconds = sum(len(a) for _, a in corpus) / sample_rate * repeat * n
+    stats = _latency_stats(latencies, audio_seconds) if latencies else {"requests": 0}
+    return {
+        "clients": n,
+        **stats,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(len(latencies) / wall, 2),
+        "audio_s_per_s": round(audio_seconds / wall, 2),
+    }
+
+
+def bench_components(sample_rate: int = 16000, seconds: float = 60.0) -> dict:
+    """与后端无关的部分：协议编解码、录音缓冲区、逐帧 VAD。"""
+    from voxy.audio import AudioBuffer
+    from voxy.protocol import decode_audio, encode_audio, recv_audio, recv_message, send_message
+    from voxy.vad import create_vad
+
+    audio = synthetic_corpus(sample_rate, (seconds,))[0][1]
+    block = int(sample_rate * 0.04)
+    result = {"audio_s": seconds}
+
+    # 协议：经 socketpair 发送 float32 / int16 音频帧
+    for dtype in ("float32", "int16"):
+        a, b = socket.socketpair()
+        try:
+            payload = encode_audio(audio, dtype)
+            reader = threading.Thread(
+                target=lambda: recv_audio(b, recv_message(b)["length"], dtype))
+            start = time.perf_counter()
+            reader.start()
+            send_message(a, {"length": len(payload)}, payload)
+            reader.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            a.close()
+            b.close()
+        result[f"protocol_{dtype}_mb_per_s"] = round(len(payload) / elapsed / 1e6, 1)
+    start = time.perf_counter()
+    decode_audio(bytes(encode_audio(audio, "int16")), "int16")
+    result["int16_codec_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    # 录音缓冲区：按 40ms 块写入，从小容量起倍增扩容
+    start = time.perf_counter()
+    buffer = AudioBuffer(sample_rate)
+    for i in range(0, len(audio), block):
+        buffer.write(audio[i:i + block])
+    result["buffer_x_realtime"] = round(seconds / (time.perf_counter() - start))
+
+    # VAD：按 40ms 块逐帧检测
+    vad = create_vad("energy", sample_rate)
+    start = time.perf_counter()
+    for i in range(0, len(audio), block):
+        vad.detect(audio[i:i + block])
+    result["vad_x_realtime"] = round(seconds / (time.perf_counter() - start))
+    return result
+
+
+def run(config: Config, engines: list[str], corpus: list[tuple[str, np.ndarray]],
+        repeat: int = 3, clients: list[int] | None = None, stub: bool = False,
+        daemon: bool = True, log=None) -> dict:
+    """运行全部基准，返回可 JSON 序列化的结果。"""
+    from voxy.engines import engine_config
+
+    log = log or (lambda msg: None)
+    sample_rate = config.audio.sample_rate
+    clients = clients or [1]
+    report = {
+        "timestamp": round(time.time(), 3),
+        "python": sys.version.split()[0],
+        "sample_rate": sample_rate,
+        "corpus": [{"name": n, "seconds": round(len(a) / sample_rate, 2)} for n, a in corpus],
+        "engines": {},
+    }
+
+    log("组件基准...")
+    report["components"] = bench_components(sample_rate)
+
+    for name in engines:
+        name, stt_config, _ = engine_config(config, name)
+        engine_factory = (lambda c: StubSTT()) if stub else create_stt
+        entry = {"backend": "stub" if stub else stt_config.backend}
+        report["engines"][name] = entry
+        try:
+            log(f"[{name}] 直连引擎...")
+            entry["direct"], engine = bench_direct(lambda: engine_factory(stt_config),
+                                                   corpus, sample_rate, repeat)
+            engine.unload()
+            del engine
+            if daemon:
+                log(f"[{name}] 经 daemon...")
+                # 进程内 daemon 只登记这一个引擎，作为默认引擎
+                cfg = replace(config, stt=stt_config,
+                              daemon=replace(config.daemon, engines={}))
+                entry["daemon"] = bench_daemon(cfg, engine_factory, corpus, repeat, clients)
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+            log(f"[{name}] 失败: {e}")
+    return report
+
+
+def format_report(report: dict) -> str:
+    """把结果整理为终端表格。"""
+    lines = [f"语料: {len(report['corpus'])} 条,"
+             f" 共 {sum(c['seconds'] for c in report['corpus']):.1f} 秒"]
+    comp = report["components"]
+    lines.append(f"组件: 协议 float32 {comp['protocol_float32_mb_per_s']} MB/s,"
+                 f" int16 {comp['protocol_int16_mb_per_s']} MB/s;"
+                 f" 录音缓冲 {comp['buffer_x_realtime']}x 实时; VAD {comp['vad_x_realtime']}x 实时")
+    for name, entry in report["engines"].items():
+        lines.append(f"[{name}] ({entry['backend']})")
+        if "error" in entry:
+            lines.append(f"  失败: {entry['error']}")
+            continue
+        d = entry["direct"]
+        vram = f", 峰值显存 {d['peak_vram_mb']} MB" if "peak_vram_mb" in d else ""
+        lines.append(f"  直连: 冷启动 {d['cold_load_s']}s, p50 {d['p50_ms']}ms,"
+                     f" p95 {d['p95_ms']}ms, RTF {d['rtf']},"
+                     f" 峰值 RSS {d['peak_rss_mb']} MB{vram}")
+        if "daemon" in entry:
+            dm = entry["daemon"]
+            lines.append(f"  daemon: 首个请求 {dm['cold_request_s']}s")
+            for c in dm["concurrency"]:
+                if not c["requests"]:
+                    lines.append(f"    {c['clients']} 客户端: 全部失败 ({c['errors']} 个错误)")
+                    continue
+                errors = f", {c['errors']} 个错误" if c["errors"] else ""
+                lines.append(f"    {c['clients']} 客户端: p50 {c['p50_ms']}ms, p95 {c['p95_ms']}ms,"
+                             f" {c['requests_per_s']} 请求/s, {c['audio_s_per_s']} 音频秒/s{errors}")
+    return "\n".join(lines)
@@ -0,0 +1,164 @@
+"""常驻录音 - daemon 持有麦克风输入流，收到命令即开始录音
+
+输入流一直开着：空闲时音频只写入 pre-roll 环形缓冲区，同时持续更新
+噪音底；start() 时把 pre-roll 作为录音开头，按下热键瞬间说出的第一个字
+不会丢失，也省去每次打开 PortAudio 和校准的时间。
+"""
+
+import queue
+import sys
+import threading
+from collections.abc import Callable
+
+import numpy as np
+
+from voxy.audio import AudioBuffer
+from voxy.config import AudioConfig
+from voxy.vad import Endpointer, NoiseFloorTracker, create_vad
+
+
+class _Ring:
+    """定长 float32 环形缓冲区，保留最近 capacity 个样本。"""
+
+    def __init__(self, capacity: int):
+        self._data = np.zeros(max(capacity, 1), dtype=np.float32)
+        self._pos = 0
+        self._size = 0
+
+    def write(self, block: np.ndarray) -> None:
+        cap = len(self._data)
+        block = block[-cap:]
+        n = len(block)
+        first = min(n, cap - self._pos)
+        self._data[self._pos:self._pos + first] = block[:first]
+        self._data[: n - first] = block[first:]
+        self._pos = (self._pos + n) % cap
+        self._size = min(self._size + n, cap)
+
+    def snapshot(self) -> np.ndarray:
+        """按时间顺序返回缓冲内容的副本，并清空缓冲区。"""
+        start = (self._pos - self._size) % len(self._data)
+        out = np.roll(self._data, -start)[: self._size].copy()
+        self._size = 0
+        return out
+
+
+class _CaptureSession:
+    """一次录音：音频写入缓冲区后交给喂料线程，回调线程从不阻塞。"""
+
+    def __init__(self, config: AudioConfig, frame: int, until_silence: bool,
+                 on_chunk: Callable[[np.ndarray], None], on_end: Callable[[], None]):
+        sr = config.sample_rate
+        self.buffer = AudioBuffer(60 * sr, int(config.max_duration * sr))
+        self.endpoint = Endpointer(frame, sr, config.silence_duration)
+        self.until_silence = until_silence
+        self._on_chunk = on_chunk
+        self._on_end = on_end
+        self._queue: queue.SimpleQueue[np.ndarray | None] = queue.SimpleQueue()
+        self._feeder = threading.Thread(target=self._feed_loop, daemon=True)
+        self._feeder.start()
+
+    def write(self, block: np.ndarray, flags: np.ndarray | None = None) -> bool:
+        """追加音频，返回录音是否应结束（静音结束或达到最长时长）。"""
+        chunk = self.buffer.write(block)
+        if chunk.size:
+            self._queue.put(chunk)
+        ended = flags is not None and self.endpoint.update(flags)
+        return self.buffer.full or (self.until_silence and ended)
+
+    def end(self) -> None:
+        self._queue.put(None)
+
+    def _feed_loop(self) -> None:
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                break
+            try:
+                self._on_chunk(chunk)
+            except Exception as e:
+                print(f"  录音数据处理失败: {e}", file=sys.stderr, flush=True)
+        self._on_end()
+
+
+class CaptureService:
+    """持有输入流的常驻录音服务，同一时间最多一个录音会话。"""
+
+    def __init__(self, config: AudioConfig, preroll: float = 0.5):
+        self._config = config
+        self.noise = NoiseFloorTracker(config.sample_rate)
+        self._vad = create_vad(config.vad, config.sample_rate, self.noise)
+        self._ring = _Ring(int(preroll * config.sample_rate))
+        self._session: _CaptureSession | None = None
+        self._lock = threading.Lock()
+        self._stream = None
+
+    @property
+    def active(self) -> bool:
+        with self._lock:
+            return self._session is not None
+
+    def open(self) -> None:
+        """打开并启动麦克风输入流。"""
+        import sounddevice as sd
+
+        device = None if self._config.device == "default" else self._config.device
+        if isinstance(device, str):
+            try:
+                device = int(device)
+            except ValueError:
+                pass
+        self._stream = sd.InputStream(
+            samplerate=self._config.sample_rate,
+            channels=1,
+            dtype="float32",
+            device=device,
+            callback=self._callback,
+            blocksize=int(self._config.sample_rate * 0.04),
+        )
+        self._stream.start()
+
+    def close(self) -> None:
+        self.stop()
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def start(self, on_chunk: Callable[[np.ndarray], None], on_end: Callable[[], None],
+              until_silence: bool = True) -> None:
+        """开始录音：先交出 pre-roll，之后每块音频依次交给 on_chunk，
+        结束后调用 on_end。两者都在喂料线程中调用，可以阻塞。
+
+        Raises:
+            RuntimeError: 已有录音在进行
+        """
+        with self._lock:
+            if self._session is not None:
+                raise RuntimeError("已有录音在进行")
+            session = _CaptureSession(self._config, self._vad.frame, until_silence,
+                                      on_chunk, on_end)
+            session.write(self._ring.snapshot())
+            self._session = session
+
+    def stop(self) -> bool:
+        """结束当前录音，返回是否有录音在进行。"""
+        with self._lock:
+            session, self._session = self._session, None
+        if session is None:
+            return False
+        session.end()
+        return True
+
+    def _callback(self, indata: np.ndarray, frames: int, time_info, status) -> None:
+        block = indata[:, 0]
+        # VAD 一直在跑，噪音底随环境持续更新
+        flags = self._vad.detect(block)
+        with self._lock:
+            session = self._session
+            if session is None:
+                self._ring.write(block)
+                return
+            if not session.write(block, flags):
+                return
+            self._session = None
+        session.end()
@@ -3,13 +3,12 @@
 import json
 import os
 import sys
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
 
 import click
 
-from voxy.config import load_config
-
 
 HISTORY_PATH = Path.home() / ".local" / "share" / "voxy" / "history.json"
 
@@ -36,27 +35,204 @@ def _append_history(raw: str, polished: str) -> None:
         click.echo(f"保存历史记录失败: {e}", err=True)
 
 
-def _transcribe(audio_data, config):
-    """转写音频：优先 daemon，不可用则回退直接模式。"""
+def _report_timings(config, trace, show: bool) -> None:
+    """--timings 时打印分阶段耗时；配置了 timings.log 时追加一行 JSONL。"""
+    if show:
+        click.echo(f"  耗时: {trace.format()}", err=True)
+    if config.timings.log:
+        from voxy.timing import append_jsonl
+
+        try:
+            append_jsonl(config.timings.log, trace.to_record())
+        except OSError as e:
+            click.echo(f"写入耗时记录失败: {e}", err=True)
+
+
+def _open_stream(config, engine: str = "", trace=None, polish: bool = False):
+    """录音开始前尝试建立 daemon 流式转写连接，不可用返回 None。"""
+    if not config.daemon.enabled:
+        return None
+    try:
+        from voxy.daemon_client import DaemonStream
+
+        return DaemonStream(sample_rate=config.audio.sample_rate,
+                            dtype=config.daemon.audio_dtype, config=config.daemon,
+                            engine=engine, trace=trace, polish=polish)
+    except Exception:
+        return None
+
+
+def _noise_floor(config, stream, floor: float | None = None) -> float | None:
+    """经流式转写的连接读取/缓存上次录音的噪音底，没有流或不可用时返回 None。"""
+    if stream is None:
+        return None
+    device = f"{config.audio.device}@{config.audio.sample_rate}"
+    return stream.noise_floor(device, floor)
+
+
+def _transcribe(audio_data, config, trace, stream=None, engine: str = ""):
+    """转写音频：优先 daemon（流式 > 整段），不可用则回退直接模式。
+
+    engine 为引擎名（内置后端或 [daemon.engines] 中的条目），空则使用 [stt]。
+    trace 记录走的路径 (path) 并并入 daemon 返回的分阶段耗时。
+    """
+    if stream is not None:
+        try:
+            trace.fields["path"] = "stream"
+            return stream.finish()
+        except Exception:
+            click.echo("  流式转写失败，重新整段转写...", err=True)
+
     if config.daemon.enabled:
         try:
             from voxy.daemon_client import transcribe_via_daemon
 
-            text = transcribe_via_daemon(audio_data, sample_rate=config.audio.sample_rate)
+            trace.fields["path"] = "daemon"
+            text = transcribe_via_daemon(audio_data, sample_rate=config.audio.sample_rate,
+                                         dtype=config.daemon.audio_dtype, config=config.daemon,
+                                         engine=engine, trace=trace)
             return text
         except Exception:
             click.echo("  守护进程不可用，使用直接模式...", err=True)
 
+    from voxy.engines import engine_config
     from voxy.stt import create_stt
 
-    engine = create_stt(config.stt)
-    return engine.transcribe(audio_data, sample_rate=config.audio.sample_rate)
+    trace.fields["path"] = "direct"
+    _, stt_config, _ = engine_config(config, engine)
+    stt = create_stt(stt_config)
+    return stt.transcribe(audio_data, sample_rate=config.audio.sample_rate)
+
+
+def _record_and_transcribe(config, trace, engine: str = "",
+                           polish: bool = False) -> tuple[str, dict | None]:
+    """本进程录音并转写，失败时退出。
+
+    返回 (原文, daemon 润色结果)。polish=True 且走流式转写时由 daemon 接着润色，
+    其他路径润色结果为 None。
+    """
+    from voxy.audio import record as do_record
+    from voxy.vad import NoiseFloorTracker
+
+    # daemon 可用时边录边传，录音结束时大部分音频已转写完
+    with trace.span("connect"):
+        stream = _open_stream(config, engine, trace, polish)
+        # 沿用上次录音的噪音底，录音立即开始，无需先校准
+        noise = NoiseFloorTracker(config.audio.sample_rate, _noise_floor(config, stream))
+    try:
+        with trace.span("record"):
+            audio_data = do_record(config.audio, on_chunk=stream.send if stream else None,
+                                   noise=noise)
+    except Exception as e:
+        if stream is not None:
+            stream.close()
+        click.echo(f"录音失败: {e}", err=True)
+        sys.exit(1)
+
+    if stream is not None and noise.floor is not None:
+        _noise_floor(config, stream, noise.floor)
+
+    if audio_data.size == 0:
+        if stream is not None:
+            stream.close()
+        click.echo("未录到音频。", err=True)
+        sys.exit(1)
+
+    # 语音识别 (daemon 优先，回退直接模式)
+    trace.fields["audio_s"] = round(audio_data.size / config.audio.sample_rate, 2)
+    click.echo("  转写中...", err=True)
+    try:
+        with trace.span("transcribe"):
+            text = _transcribe(audio_data, config, trace, stream, engine)
+    except Exception as e:
+        click.echo(f"转写失败: {e}", err=True)
+        sys.exit(1)
+    polished = stream.polish_result if trace.fields.get("path") == "stream" else None
+    return text, polished
+
+
+def _capture_via_daemon(config, trace, engine: str = "",
+                        polish: bool = False) -> tuple[str, dict | None] | None:
+    """用 daemon 常驻的输入流录音并转写。未启用或 daemon 不可用时返回 None。
+
+    录音和转写（polish=True 时还有润色）都在 daemon 中完成，本进程只记录
+    整体耗时 (capture)，分阶段耗时来自响应中的 timings。返回 (原文, 润色结果)。
+    """
+    if not (config.daemon.enabled and config.daemon.capture):
+        return None
+    from voxy.daemon_client import DaemonClient, polish_result
+
+    client = DaemonClient(config.daemon)
+    try:
+        future = client.start_capture(until_silence=True, engine=engine, polish=polish)
+    except Exception:
+        client.close()
+        return None
+
+    def wait_for_enter():
+        try:
+            input()
+        except EOFError:
+            pass
+        try:
+            client.stop_capture()
+        except Exception:
+            pass
+
+    with client, trace.span("capture"):
+        click.echo("  录音中... (按 Enter 停止，或静音自动停止)", err=True)
+        threading.Thread(target=wait_for_enter, daemon=True).start()
+        try:
+            resp = future.result()
+        except Exception as e:
+            click.echo(f"录音失败: {e}", err=True)
+            sys.exit(1)
+
+    if resp.get("capture") is False:
+        return None  # daemon 未启用常驻录音，改为本进程录音
+    if not resp.get("ok"):
+        click.echo(f"转写失败: {resp.get('error', '未知错误')}", err=True)
+        sys.exit(1)
+    trace.fields["path"] = "capture"
+    trace.merge(resp.get("timings"))
+    return resp.get("text", ""), polish_result(resp)
+
+
+def _polish_streaming(text: str, config, output_mode: str, trace) -> bool:
+    """流式润色并边生成边输出。首个 token 之前失败返回 False，由调用方输出原文。"""
+    from itertools import chain
+
+    from voxy.output import output_stream
+    from voxy.processor import process_text_stream
+
+    tokens = process_text_stream(text, config.llm)
+    try:
+        with trace.span("polish_first_token"):
+            first = next(tokens)
+    except StopIteration:
+        click.echo("AI 润色失败 (使用原始文本): 模型返回为空", err=True)
+        return False
+    except Exception as e:
+        click.echo(f"AI 润色失败 (使用原始文本): {e}", err=True)
+        return False
+
+    try:
+        with trace.span("polish_stream"):
+            polished = output_stream(chain([first], tokens), output_mode)
+    except Exception as e:
+        # 已有部分文本输出，无法再回退到原文
+        click.echo(f"流式输出中断: {e}", err=True)
+        sys.exit(1)
+    _append_history(text, polished)
+    return True
 
 
 @click.group()
 @click.pass_context
 def main(ctx):
     """Voxy - Linux 语音听写工具"""
+    from voxy.config import load_config
+
     ctx.ensure_object(dict)
     ctx.obj["config"] = load_config()
 
@@ -70,32 +246,44 @@ def main(ctx):
     default=None,
     help="输出方式 (默认使用配置文件设置)",
 )
+@click.option("-e", "--engine", default="",
+              help="STT 引擎 (sensevoice / whisper / cloud 或 [daemon.engines] 中的名称)")
+@click.option("--timings", is_flag=True, help="结束后打印各阶段耗时")
 @click.pass_context
-def record(ctx, raw: bool, output: str | None):
+def record(ctx, raw: bool, output: str | None, engine: str, timings: bool):
     """录音 → 转写 → 润色 → 输出"""
+    from voxy.timing import Trace
+
     config = ctx.obj["config"]
     output_mode = output or config.output.mode
+    trace = Trace()
+    if engine:
+        trace.fields["engine"] = engine
 
-    # 1. 录音
-    from voxy.audio import record as do_record
+    if engine:
+        from voxy.engines import UnknownEngineError, engine_config
 
-    try:
-        audio_data = do_record(config.audio)
-    except Exception as e:
-        click.echo(f"录音失败: {e}", err=True)
-        sys.exit(1)
+        try:
+            engine_config(config, engine)
+        except UnknownEngineError as e:
+            click.echo(f"错误: {e}", err=True)
+            sys.exit(1)
 
-    if audio_data.size == 0:
-        click.echo("未录到音频。", err=True)
-        sys.exit(1)
+    # llm.daemon：转写后由 daemon 接着润色，省去本进程的导入、提示词和连接开销
+    daemon_polish = not raw and config.llm.enabled and config.llm.daemon and config.daemon.enabled
 
-    # 2. 语音识别 (daemon 优先，回退直接模式)
-    click.echo("  转写中...", err=True)
-    try:
-        text = _transcribe(audio_data, config)
-    except Exception as e:
-        click.echo(f"转写失败: {e}", err=True)
-        sys.exit(1)
+    # 润色用的连接和 litellm 导入在录音期间后台预热
+    if not raw and config.llm.enabled and not daemon_polish:
+        from voxy.processor import prewarm
+
+        prewarm(config.llm)
+
+    # 1-2. 录音 + 语音识别：daemon 常驻录音优先，否则本进程录音
+    captured = _capture_via_daemon(config, trace, engine, daemon_polish)
+    if captured is None:
+        captured = _record_and_transcribe(config, trace, engine, daemon_polish)
+    text, polished = captured
+    trace.fields["chars"] = len(text)
 
     if not text.strip():
         click.echo("未识别到文字。", err=True)
@@ -107,39 +295,59 @@ def record(ctx, raw: bool, output: str | None):
     if config.commands.map:
         from voxy.commands import match_command
 
-        result = match_command(text, config.commands.map, config.commands.fuzzy_threshold)
+        with trace.span("command"):
+            result = match_command(text, config.commands.map, config.commands.fuzzy_threshold)
         if result:
             trigger, action = result
             click.echo(f"  命令匹配: {trigger} → {action}", err=True)
             click.echo(f"CMD:{action}")
+            _report_timings(config, trace, timings)
             return
 
     # 4. AI 润色 (可选)
-    if not raw and config.llm.enabled:
+    if not raw and config.llm.enabled and polished is not None:
+        # daemon 已在转写后润色
+        if "polished" in polished:
+            _append_history(text, polished["polished"])
+            text = polished["polished"]
+        else:
+            click.echo(f"AI 润色失败 (使用原始文本): {polished['polish_error']}", err=True)
+    elif not raw and config.llm.enabled:
         from voxy.processor import process_text
 
         raw_text = text
         use_long = (config.llm.long_provider
                     and len(text) > config.llm.long_threshold)
-        if use_long:
+        if config.llm.hedge and config.llm.long_provider:
+            click.echo(f"  AI 润色中 (竞速 {config.llm.provider} / {config.llm.long_provider})...",
+                       err=True)
+        elif use_long:
             click.echo(f"  AI 润色中 (长文本 → {config.llm.long_provider})...", err=True)
         else:
             click.echo("  AI 润色中...", err=True)
-        try:
-            text = process_text(text, config.llm)
-        except Exception as e:
-            click.echo(f"AI 润色失败 (使用原始文本): {e}", err=True)
+        if config.llm.stream and output_mode != "clipboard":
+            if _polish_streaming(text, config, output_mode, trace):
+                _report_timings(config, trace, timings)
+                return
         else:
-            _append_history(raw_text, text)
+            try:
+                with trace.span("polish"):
+                    text = process_text(text, config.llm)
+            except Exception as e:
+                click.echo(f"AI 润色失败 (使用原始文本): {e}", err=True)
+            else:
+                _append_history(raw_text, text)
 
     # 5. 输出
     from voxy.output import output_text
 
     try:
-        output_text(text, output_mode)
+        with trace.span("output"):
+            output_text(text, output_mode)
     except Exception as e:
         click.echo(f"输出失败: {e}", err=True)
         sys.exit(1)
+    _report_timings(config, trace, timings)
 
 
 @main.command()
@@ -192,11 +400,12 @@ def daemon_start(ctx, foreground: bool):
 
 
 @daemon.command("stop")
-def daemon_stop():
+@click.pass_context
+def daemon_stop(ctx):
     """停止 STT 守护进程"""
     from voxy.daemon_client import daemon_shutdown
 
-    if daemon_shutdown():
+    if daemon_shutdown(ctx.obj["config"].daemon):
         click.echo("守护进程已停止")
     else:
         click.echo("守护进程未运行或无法连接", err=True)
@@ -204,20 +413,52 @@ def daemon_stop():
 
 
 @daemon.command("status")
-def daemon_status_cmd():
+@click.pass_context
+def daemon_status_cmd(ctx):
     """查看守护进程状态"""
     from voxy.daemon_client import daemon_status
 
-    status = daemon_status()
+    status = daemon_status(ctx.obj["config"].daemon)
     if status is None:
         click.echo("守护进程未运行")
         sys.exit(1)
 
     click.echo("守护进程运行中")
     click.echo(f"  STT 后端: {status.get('backend', '?')}")
-    loaded = status.get("model_loaded", False)
-    click.echo(f"  模型状态: {'已加载' if loaded else '未加载 (空闲已卸载)'}")
+    tier_names = {
+        "loaded": "已加载 (可直接推理)",
+        "offloaded": "已移至内存 (空闲释放显存，可快速恢复)",
+        "unloaded": "未加载 (空闲已卸载)",
+    }
+    tier = status.get("tier") or ("loaded" if status.get("model_loaded") else "unloaded")
+    click.echo(f"  模型状态: {tier_names.get(tier, tier)}")
     click.echo(f"  空闲时间: {status.get('idle_seconds', 0):.0f} 秒")
+    click.echo(f"  推理队列: {status.get('queue_depth', 0)}/{status.get('queue_size', '?')}"
+               f"{' (推理中)' if status.get('busy') else ''}")
+    if status.get("capture"):
+        click.echo(f"  常驻录音: {'录音中' if status.get('capturing') else '待命'}")
+    engines = status.get("engines", [])
+    if len(engines) > 1:
+        click.echo("  引擎:")
+        for e in engines:
+            mark = " (默认)" if e.get("default") else ""
+            memory = f", ~{e['memory_mb']:.0f} MB" if e.get("memory_mb") else ""
+            click.echo(f"    {e['name']}{mark}: {e['backend']},"
+                       f" {tier_names.get(e['tier'], e['tier'])}{memory},"
+                       f" 空闲 {e['idle_seconds']:.0f} 秒, 已加载 {e['loads']} 次")
+
+
+@daemon.command("metrics")
+@click.pass_context
+def daemon_metrics_cmd(ctx):
+    """输出守护进程运行指标 (Prometheus 文本格式)"""
+    from voxy.daemon_client import daemon_metrics
+
+    text = daemon_metrics(ctx.obj["config"].daemon)
+    if text is None:
+        click.echo("守护进程未运行", err=True)
+        sys.exit(1)
+    click.echo(text, nl=False)
 
 
 # ── config 命令 ────────────────────────────────────────────
@@ -239,10 +480,14 @@ def show_config(ctx):
     click.echo(f"  sample_rate = {config.audio.sample_rate}")
     click.echo(f"  silence_threshold = {config.audio.silence_threshold}")
     click.echo(f"  silence_duration = {config.audio.silence_duration}")
+    click.echo(f"  max_duration = {config.audio.max_duration}")
+    click.echo(f"  vad = {config.audio.vad}")
     click.echo()
     click.echo(f"[stt]")
     click.echo(f"  backend = {config.stt.backend}")
     click.echo(f"  language = {config.stt.language}")
+    click.echo(f"  max_segment_seconds = {config.stt.max_segment_seconds}")
+    click.echo(f"  segment_batch_size = {config.stt.segment_batch_size}")
 
     if config.stt.backend == "whisper":
         click.echo(f"  [stt.whisper]")
@@ -267,10 +512,128 @@ def show_config(ctx):
     click.echo(f"  api_key = {'***' if config.llm.api_key else '(未设置)'}")
     if config.llm.proxy:
         click.echo(f"  proxy = {config.llm.proxy}")
+    click.echo(f"  stream = {config.llm.stream}")
+    click.echo(f"  cache = {config.llm.cache}")
+    click.echo(f"  daemon = {config.llm.daemon}")
+    if config.llm.keep_alive:
+        click.echo(f"  keep_alive = {config.llm.keep_alive}")
+    if config.llm.chunk_chars:
+        click.echo(f"  chunk_chars = {config.llm.chunk_chars} (并发 {config.llm.chunk_parallel})")
+    if config.llm.hedge:
+        click.echo(f"  hedge = {config.llm.hedge} (budget {config.llm.hedge_budget_ms} ms)")
     click.echo()
     click.echo(f"[daemon]")
     click.echo(f"  enabled = {config.daemon.enabled}")
+    click.echo(f"  listen = {config.daemon.listen or '(默认 Unix socket)'}")
+    if config.daemon.connect:
+        click.echo(f"  connect = {config.daemon.connect}")
+    click.echo(f"  token = {'***' if config.daemon.token else '(未设置)'}")
+    if config.daemon.tls_cert:
+        click.echo(f"  tls_cert = {config.daemon.tls_cert}")
+    click.echo(f"  offload_timeout = {config.daemon.offload_timeout}")
     click.echo(f"  idle_timeout = {config.daemon.idle_timeout}")
+    click.echo(f"  audio_dtype = {config.daemon.audio_dtype}")
+    click.echo(f"  queue_size = {config.daemon.queue_size}")
+    click.echo(f"  batch_window_ms = {config.daemon.batch_window_ms}")
+    click.echo(f"  batch_max_items = {config.daemon.batch_max_items}")
+    click.echo(f"  batch_max_seconds = {config.daemon.batch_max_seconds}")
+    click.echo(f"  memory_budget_mb = {config.daemon.memory_budget_mb or '(不限)'}")
+    click.echo(f"  capture = {config.daemon.capture}")
+    click.echo(f"  capture_preroll = {config.daemon.capture_preroll}")
+    click.echo(f"  metrics_port = {config.daemon.metrics_port or '(关闭)'}")
+    for name, overrides in config.daemon.engines.items():
+        click.echo(f"  [daemon.engines.{name}]")
+        for key, value in overrides.items():
+            click.echo(f"    {key} = {value}")
     click.echo()
     click.echo(f"[output]")
     click.echo(f"  mode = {config.output.mode}")
+    click.echo()
+    click.echo(f"[timings]")
+    click.echo(f"  log = {config.timings.log or '(未开启)'}")
+
+
+# ── bench 命令 ─────────────────────────────────────────────
+
+
+@main.command("bench")
+@click.option("-e", "--engine", "engines", multiple=True,
+              help="要测试的 STT 引擎，可多次指定 (默认 [stt].backend)")
+@click.option("--stub", is_flag=True, help="使用桩引擎 (无需模型，仅 CPU 也可运行)")
+@click.option("--corpus", type=click.Path(exists=True, file_okay=False), default=None,
+              help="WAV 语料目录 (默认使用合成音频)")
+@click.option("-n", "--repeat", type=int, default=3, help="每条语料重复次数")
+@click.option("--clients", default="1,4", help="daemon 并发客户端数，逗号分隔")
+@click.option("--no-daemon", is_flag=True, help="跳过经 daemon 的测试")
+@click.option("--json", "json_path", default=None, help="结果写入 JSON 文件 (- 为标准输出)")
+@click.pass_context
+def bench_cmd(ctx, engines: tuple[str, ...], stub: bool, corpus: str | None, repeat: int,
+              clients: str, no_daemon: bool, json_path: str | None):
+    """性能基准：冷启动、延迟分位数、RTF、并发吞吐"""
+    from voxy import bench
+    from voxy.engines import UnknownEngineError
+
+    config = ctx.obj["config"]
+    sample_rate = config.audio.sample_rate
+    try:
+        client_counts = [int(c) for c in clients.split(",") if c.strip()]
+    except ValueError:
+        click.echo(f"错误: 无效的 --clients: {clients}", err=True)
+        sys.exit(1)
+    try:
+        audio = (bench.load_corpus(corpus, sample_rate) if corpus
+                 else bench.synthetic_corpus(sample_rate))
+    except (OSError, ValueError) as e:
+        click.echo(f"读取语料失败: {e}", err=True)
+        sys.exit(1)
+
+    try:
+        report = bench.run(config, list(engines) or [config.stt.backend], audio,
+                           repeat=repeat, clients=client_counts, stub=stub,
+                           daemon=not no_daemon, log=lambda msg: click.echo(f"  {msg}", err=True))
+    except UnknownEngineError as e:
+        click.echo(f"错误: {e}", err=True)
+        sys.exit(1)
+
+    if json_path == "-":
+        click.echo(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    click.echo(bench.format_report(report))
+    if json_path:
+        Path(json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n",
+                                   encoding="utf-8")
+        click.echo(f"结果已写入 {json_path}")
+
+
+# ── timings 命令 ───────────────────────────────────────────
+
+
+@main.command("timings")
+@click.option("--file", "path", default=None, help="耗时记录文件 (默认 timings.log)")
+@click.option("-n", "--last", type=int, default=0, help="只统计最近 N 条")
+@click.pass_context
+def timings_cmd(ctx, path: str | None, last: int):
+    """统计各阶段耗时的 p50 / p95"""
+    from voxy.timing import summarize
+
+    path = path or ctx.obj["config"].timings.log
+    if not path:
+        click.echo("未配置耗时记录文件 ([timings] log)", err=True)
+        sys.exit(1)
+    try:
+        with open(os.path.expanduser(path), encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError) as e:
+        click.echo(f"读取耗时记录失败: {e}", err=True)
+        sys.exit(1)
+    if last > 0:
+        records = records[-last:]
+    if not records:
+        click.echo("暂无耗时记录")
+        return
+
+    click.echo(f"共 {len(records)} 次听写")
+    click.echo(f"  {'阶段':<20} {'次数':>6} {'p50':>9} {'p95':>9} {'最大':>9}")
+    for name, stat in summarize(records).items():
+        click.echo(f"  {name:<20} {stat['count']:>6} {stat['p50']:>7.0f}ms"
+                   f" {stat['p95']:>7.0f}ms {stat['max']:>7.0f}ms")
@@ -14,10 +14,14 @@ DEFAULTS: dict[str, Any] = {
         "sample_rate": 16000,
         "silence_threshold": 0.15,
         "silence_duration": 2.0,
+        "max_duration": 600.0,
+        "vad": "energy",
     },
     "stt": {
         "backend": "sensevoice",
         "language": "auto",
+        "max_segment_seconds": 30.0,
+        "segment_batch_size": 4,
         "whisper": {
             "model": "small",
             "device": "cuda",
@@ -44,6 +48,19 @@ DEFAULTS: dict[str, Any] = {
         "long_api_key": "",
         "long_proxy": "",
         "long_threshold": 200,
+        "stream": False,
+        "cache": True,
+        "cache_size": 5000,
+        "cache_ttl_days": 30,
+        "chunk_chars": 0,
+        "chunk_parallel": 4,
+        "timeout": 0,
+        "retries": 1,
+        "keep_alive": "",
+        "daemon": False,
+        "hedge": False,
+        "hedge_budget_ms": 8000,
+        "hedge_log": "~/.local/share/voxy/hedge.jsonl",
         "custom_terms": {},
     },
     "commands": {
@@ -52,11 +69,31 @@ DEFAULTS: dict[str, Any] = {
     },
     "daemon": {
         "enabled": True,
+        "listen": "",
+        "connect": "",
+        "token": "",
+        "tls_cert": "",
+        "tls_key": "",
+        "tls_ca": "",
         "idle_timeout": 10,
+        "offload_timeout": 3,
+        "audio_dtype": "float32",
+        "queue_size": 8,
+        "batch_window_ms": 20,
+        "batch_max_items": 8,
+        "batch_max_seconds": 120.0,
+        "memory_budget_mb": 0,
+        "capture": False,
+        "capture_preroll": 0.5,
+        "metrics_port": 0,
+        "engines": {},
     },
     "output": {
         "mode": "clipboard",
     },
+    "timings": {
+        "log": "",
+    },
 }
 
 
@@ -77,6 +114,8 @@ class AudioConfig:
     sample_rate: int = 16000
     silence_threshold: float = 0.15
     silence_duration: float = 2.0
+    max_duration: float = 600.0
+    vad: str = "energy"
 
 
 @dataclass
@@ -103,6 +142,8 @@ class CloudSTTConfig:
 class STTConfig:
     backend: str = "sensevoice"
     language: str = "auto"
+    max_segment_seconds: float = 30.0
+    segment_batch_size: int = 4
     whisper: WhisperConfig = field(default_factory=WhisperConfig)
     sensevoice: SenseVoiceConfig = field(default_factory=SenseVoiceConfig)
     cloud: CloudSTTConfig = field(default_factory=CloudSTTConfig)
@@ -120,6 +161,19 @@ class LLMConfig:
     long_api_key: str = ""
     long_proxy: str = ""
     long_threshold: int = 200
+    stream: bool = False
+    cache: bool = True
+    cache_size: int = 5000
+    cache_ttl_days: float = 30
+    chunk_chars: int = 0
+    chunk_parallel: int = 4
+    timeout: float = 0
+    retries: int = 1
+    keep_alive: str = ""
+    daemon: bool = False
+    hedge: bool = False
+    hedge_budget_ms: int = 8000
+    hedge_log: str = "~/.local/share/voxy/hedge.jsonl"
     custom_terms: dict[str, str] = field(default_factory=dict)
 
 
@@ -132,7 +186,24 @@ class CommandsConfig:
 @dataclass
 class DaemonConfig:
     enabled: bool = True
+    listen: str = ""
+    connect: str = ""
+    token: str = ""
+    tls_cert: str = ""
+    tls_key: str = ""
+    tls_ca: str = ""
     idle_timeout: int = 10
+    offload_timeout: int = 3
+    audio_dtype: str = "float32"
+    queue_size: int = 8
+    batch_window_ms: int = 20
+    batch_max_items: int = 8
+    batch_max_seconds: float = 120.0
+    memory_budget_mb: int = 0
+    capture: bool = False
+    capture_preroll: float = 0.5
+    metrics_port: int = 0
+    engines: dict[str, dict] = field(default_factory=dict)
 
 
 @dataclass
@@ -140,6 +211,11 @@ class OutputConfig:
     mode: str = "clipboard"
 
 
+@dataclass
+class TimingsConfig:
+    log: str = ""
+
+
 @dataclass
 class Config:
     audio: AudioConfig = field(default_factory=AudioConfig)
@@ -148,6 +224,20 @@ class Config:
     commands: CommandsConfig = field(default_factory=CommandsConfig)
     daemon: DaemonConfig = field(default_factory=DaemonConfig)
     output: OutputConfig = field(default_factory=OutputConfig)
+    timings: TimingsConfig = field(default_factory=TimingsConfig)
+
+
+def build_stt_config(stt_d: dict) -> STTConfig:
+    """从字典构建 STTConfig。"""
+    return STTConfig(
+        backend=stt_d.get("backend", "sensevoice"),
+        language=stt_d.get("language", "auto"),
+        max_segment_seconds=stt_d.get("max_segment_seconds", 30.0),
+        segment_batch_size=stt_d.get("segment_batch_size", 4),
+        whisper=WhisperConfig(**stt_d.get("whisper", {})),
+        sensevoice=SenseVoiceConfig(**stt_d.get("sensevoice", {})),
+        cloud=CloudSTTConfig(**stt_d.get("cloud", {})),
+    )
 
 
 def _build_config(data: dict) -> Config:
@@ -158,16 +248,11 @@ def _build_config(data: dict) -> Config:
     commands_d = data.get("commands", {})
     daemon_d = data.get("daemon", {})
     output_d = data.get("output", {})
+    timings_d = data.get("timings", {})
 
     return Config(
         audio=AudioConfig(**{k: v for k, v in audio_d.items() if not isinstance(v, dict)}),
-        stt=STTConfig(
-            backend=stt_d.get("backend", "sensevoice"),
-            language=stt_d.get("language", "auto"),
-            whisper=WhisperConfig(**stt_d.get("whisper", {})),
-            sensevoice=SenseVoiceConfig(**stt_d.get("sensevoice", {})),
-            cloud=CloudSTTConfig(**stt_d.get("cloud", {})),
-        ),
+        stt=build_stt_config(stt_d),
         llm=LLMConfig(
             **{k: v for k, v in llm_d.items() if k != "custom_terms"},
             custom_terms=llm_d.get("custom_terms", {}),
@@ -178,6 +263,7 @@ def _build_config(data: dict) -> Config:
         ),
         daemon=DaemonConfig(**daemon_d),
         output=OutputConfig(**output_d),
+        timings=TimingsConfig(**timings_d),
     )
 
 
@@ -1,155 +1,774 @@
 """Voxy STT 守护进程 - 模型常驻内存，Unix socket 通信"""
 
-import json
+import hmac
 import os
+import queue
 import signal
 import socket
-import struct
 import sys
 import threading
 import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import numpy as np
 
-from voxy.config import Config
+from voxy.config import Config, STTConfig
+from voxy.engines import (
+    TIER_LOADED,
+    TIER_UNLOADED,
+    EngineRegistry,
+    UnknownEngineError,
+)
+from voxy.metrics import DaemonMetrics, serve_http
+from voxy.protocol import (
+    decode_audio,
+    get_socket_path,
+    max_audio_bytes,
+    parse_address,
+    recv_audio,
+    recv_message,
+    send_message,
+)
 from voxy.stt import STTEngine, create_stt
+from voxy.stt.segment import MIN_PAUSE_S, find_pause, join_texts
+from voxy.vad import FRAME_S, VoiceDetector, create_vad
+
+# 流式转写分段参数
+_STREAM_MIN_SEGMENT_S = 3.0   # 攒够 N 秒才尝试切分
+_STREAM_MAX_SEGMENT_S = 30.0  # 超过 N 秒强制切分（stt.max_segment_seconds 为 0 时使用）
+_STREAM_PREROLL_S = 0.3       # 分段开头保留的语音前静音
+_MAX_SAMPLE_RATE = 48000      # 计算音频帧上限时采样率的封顶值（header 中的值不可信）
+_MAX_FRAME_S = 3600.0         # audio.max_duration 为 0（不限）时单帧音频的时长上限
+
+
+class DaemonBusyError(RuntimeError):
+    """推理队列已满，daemon 暂时无法接受新的转写请求。"""
+
+
+class _TimedFuture(Future):
+    """附带 daemon 端分阶段耗时的 Future：timings 为 {阶段_ms: 毫秒}，随响应返回。
+
+    fields 为附加到响应中的其他字段（如 polished）。两者都在 set_result /
+    set_exception 之前写好，完成回调中可直接读取。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.timings: dict[str, float] = {}
+        self.fields: dict = {}
+
+
+def _sum_timings(futures: list[Future]) -> dict[str, float]:
+    """合并多个分段的耗时：同名阶段相加。"""
+    total: dict[str, float] = {}
+    for f in futures:
+        for key, ms in getattr(f, "timings", {}).items():
+            total[key] = total.get(key, 0.0) + ms
+    return total
+
+
+class _Job:
+    """一个待推理的转写任务，audio=None 表示仅预加载模型。engine 为引擎注册名。"""
+
+    __slots__ = ("audio", "sample_rate", "engine", "future", "enqueued")
+
+    def __init__(self, audio: np.ndarray | None, sample_rate: int, engine: str):
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.engine = engine
+        self.future = _TimedFuture()
+        self.enqueued = time.monotonic()
+
+
+class _StreamSession:
+    """流式转写会话：边收音频边做逐帧 VAD，在说话停顿处切分，分段提交推理。
+
+    不含语音的分段不提交；分段开头的静音裁剪到 pre-roll 长度。
+    每块音频只扫描新增的帧来跟踪停顿，音频只在切分时拼接一次。
+    """
+
+    def __init__(self, submit: Callable[[np.ndarray], Future], sample_rate: int,
+                 max_seconds: float = _STREAM_MAX_SEGMENT_S, vad: VoiceDetector | None = None):
+        self._submit = submit
+        self._sample_rate = sample_rate
+        self._max_seconds = max(max_seconds or _STREAM_MAX_SEGMENT_S, _STREAM_MIN_SEGMENT_S)
+        self._vad = vad or create_vad("energy", sample_rate)
+        self._frame = self._vad.frame
+        self._min_pause = int(round(MIN_PAUSE_S / FRAME_S))
+        self._pending: list[np.ndarray] = []
+        self._pending_samples = 0
+        self._flags = np.zeros(int(self._max_seconds / FRAME_S) + 1, dtype=bool)
+        self._n_flags = 0
+        self._quiet_from: int | None = None  # 末尾静音区间的起点（帧下标）
+        self._pause: int | None = None       # 最后一段足够长的停顿的中点（帧下标）
+        self._futures: list[Future] = []
+
+    @property
+    def sample_rate(self) -> int:
+        return self._sample_rate
+
+    def feed(self, chunk: np.ndarray) -> None:
+        """追加一段音频，攒够后在停顿处切出一段并立即提交转写。"""
+        if chunk.size == 0:
+            return
+        self._pending.append(chunk)
+        self._pending_samples += chunk.size
+        start = self._n_flags
+        self._append_flags(self._vad.detect(chunk))
+        self._track_pauses(start)
 
+        if self._pending_samples < _STREAM_MIN_SEGMENT_S * self._sample_rate:
+            return
 
-def get_socket_path() -> str:
-    """返回 daemon socket 路径。"""
-    runtime_dir = os.environ.get("XDG_RUNTIME_DIR", f"/run/user/{os.getuid()}")
-    sock_dir = os.path.join(runtime_dir, "voxy")
-    os.makedirs(sock_dir, exist_ok=True)
-    return os.path.join(sock_dir, "stt.sock")
+        cut = self._pause
+        audio = None
+        if cut is None and self._pending_samples >= self._max_seconds * self._sample_rate:
+            # 超长无停顿：在最安静的帧处强制切分
+            audio = np.concatenate(self._pending)
+            cut = find_pause(audio, self._sample_rate, force=True) // self._frame
+        if not cut or cut * self._frame >= self._pending_samples:
+            if audio is not None:
+                self._pending = [audio]
+            return
 
+        if audio is None:
+            audio = np.concatenate(self._pending)
+        self._emit(audio[: cut * self._frame], self._flags[:cut])
+        rest = audio[cut * self._frame:]
+        self._pending = [rest]
+        self._pending_samples = rest.size
+        # 剩余的帧移到开头，重新扫描一次（只含最后一段停顿之后的部分）
+        n = self._n_flags - cut
+        self._flags[:n] = self._flags[cut:self._n_flags]
+        self._n_flags = n
+        self._quiet_from = self._pause = None
+        self._track_pauses(0)
+
+    def _append_flags(self, flags: np.ndarray) -> None:
+        end = self._n_flags + flags.size
+        if end > self._flags.size:
+            grown = np.zeros(max(end, self._flags.size * 2), dtype=bool)
+            grown[: self._n_flags] = self._flags[: self._n_flags]
+            self._flags = grown
+        self._flags[self._n_flags:end] = flags
+        self._n_flags = end
+
+    def _track_pauses(self, start: int) -> None:
+        """扫描 start 之后新增的帧，更新末尾静音的起点和最后一段足够长的停顿。"""
+        n = self._n_flags
+        quiet = np.concatenate([[False], ~self._flags[start:n], [False]])
+        edges = np.flatnonzero(quiet[1:] != quiet[:-1]) + start
+        starts, ends = edges[::2], edges[1::2]
+        if self._quiet_from is not None:
+            if starts.size and starts[0] == start:
+                starts[0] = self._quiet_from  # 接上之前末尾的静音
+            else:
+                starts = np.r_[self._quiet_from, starts]
+                ends = np.r_[start, ends]
+        self._quiet_from = int(starts[-1]) if ends.size and ends[-1] == n else None
+        runs = np.flatnonzero(ends - starts >= self._min_pause)
+        if runs.size:
+            i = runs[-1]
+            self._pause = int(starts[i] + ends[i]) // 2
+
+    def _emit(self, audio: np.ndarray, flags: np.ndarray) -> None:
+        speech = np.flatnonzero(flags)
+        if speech.size == 0:
+            return  # 纯静音/噪音段不送推理
+        preroll = int(_STREAM_PREROLL_S / FRAME_S)
+        start = max(0, int(speech[0]) - preroll) * self._frame
+        self._futures.append(self._submit(audio[start:]))
+
+    def finish(self) -> Future:
+        """提交剩余音频，返回所有分段完成后按顺序拼接文本的 Future。"""
+        if self._pending_samples > 0:
+            self._emit(np.concatenate(self._pending), self._flags[: self._n_flags])
+        self._pending = []
+        self._pending_samples = 0
+        self._n_flags = 0
+        self._quiet_from = self._pause = None
+
+        done = _TimedFuture()
+        remaining = len(self._futures)
+        lock = threading.Lock()
+
+        def _on_segment(_: Future) -> None:
+            nonlocal remaining
+            with lock:
+                remaining -= 1
+                if remaining > 0 or done.done():
+                    return
+            done.timings = {**_sum_timings(self._futures), "segments": len(self._futures)}
+            try:
+                done.set_result(join_texts([f.result() for f in self._futures]))
+            except Exception as e:
+                done.set_exception(e)
+
+        if not self._futures:
+            done.set_result("")
+        for f in self._futures:
+            f.add_done_callback(_on_segment)
+        return done
+
+
+class _Connection:
+    """一个客户端连接：串行化写入，跟踪进行中的请求和流。
+
+    同一连接上可以并发多个请求，响应带回请求的 id，顺序不保证。
+    """
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.streams: dict = {}
+        self._send_lock = threading.Lock()
+        self._inflight = 0
+        self._inflight_cond = threading.Condition()
+
+    def reply(self, req_id, data: dict) -> None:
+        """发送响应，连接已断开时静默忽略。"""
+        if req_id is not None:
+            data = {**data, "id": req_id}
+        try:
+            with self._send_lock:
+                send_message(self.sock, data)
+        except OSError:
+            pass
 
-def _recv_exact(conn: socket.socket, n: int) -> bytes:
-    """从 socket 精确读取 n 字节。"""
-    buf = bytearray()
-    while len(buf) < n:
-        chunk = conn.recv(n - len(buf))
-        if not chunk:
-            raise ConnectionError("连接中断")
-        buf.extend(chunk)
-    return bytes(buf)
+    def reply_future(self, req_id, future: Future) -> None:
+        """在 future 完成时发送转写结果。"""
+        def _done(f: Future) -> None:
+            try:
+                text = f.result()
+            except DaemonBusyError as e:
+                self.reply(req_id, {"ok": False, "error": str(e), "busy": True})
+            except Exception as e:
+                self.reply(req_id, {"ok": False, "error": str(e)})
+            else:
+                resp = {"ok": True, "text": text, **getattr(f, "fields", {})}
+                timings = getattr(f, "timings", None)
+                if timings:
+                    resp["timings"] = {k: round(v, 1) for k, v in timings.items()}
+                self.reply(req_id, resp)
+            with self._inflight_cond:
+                self._inflight -= 1
+                self._inflight_cond.notify_all()
+
+        with self._inflight_cond:
+            self._inflight += 1
+        future.add_done_callback(_done)
+
+    def drain(self) -> None:
+        """等待进行中的请求都已应答（客户端半关闭后仍能收到结果）。"""
+        with self._inflight_cond:
+            self._inflight_cond.wait_for(lambda: self._inflight == 0)
 
 
-def _send_response(conn: socket.socket, data: dict) -> None:
-    """发送 JSON 响应：[4 bytes 长度][JSON body]"""
-    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
-    conn.sendall(struct.pack(">I", len(body)) + body)
+class DaemonServer:
+    """STT 守护进程服务端。
 
+    每个连接由独立的 IO 线程读写；转写请求进入有界队列，
+    由唯一的推理线程通过 EngineRegistry 执行。推理线程在短时间窗口内
+    聚合并发到达的请求，按引擎分组通过 transcribe_batch 批量推理。
+    ping/status 等控制命令在 IO 线程直接应答，不受正在进行的推理影响。
 
-class DaemonServer:
-    """STT 守护进程服务端。"""
+    engine_factory 用于按 STTConfig 创建引擎，默认 create_stt。
+    运行指标汇总在 metrics 中，通过 metrics 命令或 daemon.metrics_port 的 HTTP 端点读取。
+
+    请求带 polish=true 时，转写完成后在润色线程池中按 [llm] 配置润色，
+    响应中 text 为原文，polished 为润色结果（失败时为 polish_error）。
+    润色不占用推理线程。
+    """
 
-    def __init__(self, config: Config):
+    def __init__(self, config: Config,
+                 engine_factory: Callable[[STTConfig], STTEngine] = create_stt):
         self._config = config
-        self._engine: STTEngine | None = None
-        self._engine_loaded = False
+        self.metrics = DaemonMetrics(queue_depth=lambda: self._jobs.qsize())
+        self._engines = EngineRegistry(config, engine_factory, self._on_engine_event)
         self._last_active = time.monotonic()
         self._idle_timeout = config.daemon.idle_timeout * 60  # 分钟 → 秒
+        self._offload_timeout = config.daemon.offload_timeout * 60
         self._running = False
         self._sock: socket.socket | None = None
         self._lock = threading.Lock()
-
-    def _ensure_engine(self) -> STTEngine:
-        """确保 STT 引擎已加载。"""
-        with self._lock:
-            if self._engine is None:
-                self._engine = create_stt(self._config.stt)
-            if not self._engine_loaded:
-                # 触发懒加载：用一小段静音做推理
-                dummy = np.zeros(1600, dtype=np.float32)
-                self._engine.transcribe(dummy, sample_rate=self._config.audio.sample_rate)
-                self._engine_loaded = True
-                print("  模型加载完成", file=sys.stderr, flush=True)
-            self._last_active = time.monotonic()
-            return self._engine
-
-    def _unload_engine(self) -> None:
-        """卸载模型释放显存。"""
-        with self._lock:
-            if self._engine is not None and self._engine_loaded:
-                print("  空闲超时，卸载模型释放显存...", file=sys.stderr, flush=True)
-                self._engine.unload()
-                self._engine_loaded = False
-                self._engine = None
-
-    def _idle_watcher(self) -> None:
-        """后台线程：检测空闲超时并卸载模型。"""
-        while self._running:
-            time.sleep(30)
-            if not self._running:
+        self._jobs: queue.Queue[_Job] = queue.Queue(maxsize=config.daemon.queue_size)
+        self._busy = False
+        self._tls_ctx = None
+        self._noise_floors: dict[str, float] = {}  # 录音设备 → 上次录音的噪音底
+        self._capture = None  # CaptureService，daemon.capture 开启时由 run() 创建
+        self._capture_conn: _Connection | None = None
+        self._polisher = ThreadPoolExecutor(max_workers=4, thread_name_prefix="voxy-polish")
+
+    # ── 推理线程 ──────────────────────────────────────────
+
+    def _submit(self, audio: np.ndarray | None, sample_rate: int,
+                block: bool = False, engine: str | None = None) -> Future:
+        """提交推理任务，engine 为空时使用默认引擎。
+
+        Raises:
+            UnknownEngineError: 未知的引擎名
+            DaemonBusyError: 队列已满（block=True 时等待超时）
+        """
+        job = _Job(audio, sample_rate, self._engines.resolve(engine))
+        try:
+            self._jobs.put(job, block=block, timeout=60.0 if block else None)
+        except queue.Full:
+            self.metrics.busy.inc()
+            raise DaemonBusyError(f"推理队列已满 ({self._jobs.maxsize})，请稍后重试") from None
+        return job.future
+
+    def _on_engine_event(self, name: str, event: str, seconds: float) -> None:
+        if event == "load":
+            self.metrics.model_loads.inc(engine=name)
+            self.metrics.model_load_seconds.observe(seconds, engine=name)
+        else:
+            self.metrics.model_events.inc(engine=name, event=event)
+
+    def _check_idle(self) -> None:
+        """按各引擎空闲时长逐级降级：offload_timeout 后移到内存，idle_timeout 后完全卸载。"""
+        self._engines.check_idle(self._offload_timeout, self._idle_timeout)
+
+    def _collect_batch(self, batch: list[_Job]) -> _Job | None:
+        """在批处理窗口内继续收集任务，凑成一个 batch。
+
+        超出音频总时长上限的任务不放入本批，作为返回值留给下一批。
+        """
+        dc = self._config.daemon
+        window = dc.batch_window_ms / 1000
+        if window <= 0 or dc.batch_max_items <= 1:
+            return None
+
+        total = sum(j.audio.size / j.sample_rate for j in batch if j.audio is not None)
+        deadline = time.monotonic() + window
+        while len(batch) < dc.batch_max_items:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
                 break
+            try:
+                job = self._jobs.get(timeout=remaining)
+            except queue.Empty:
+                break
+            seconds = job.audio.size / job.sample_rate if job.audio is not None else 0.0
+            if total + seconds > dc.batch_max_seconds:
+                return job
+            batch.append(job)
+            total += seconds
+        return None
+
+    def _run_batch(self, batch: list[_Job]) -> None:
+        """执行一个 batch：同引擎、同采样率的请求合并调用 transcribe_batch。"""
+        batch = [j for j in batch if j.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        now = time.monotonic()
+        for job in batch:
+            job.future.timings["queue_ms"] = (now - job.enqueued) * 1000
+        with self._lock:
+            self._busy = True
+        try:
+            groups: dict[tuple[str, int], list[_Job]] = {}
+            for job in batch:
+                groups.setdefault((job.engine, job.sample_rate), []).append(job)
+            for (name, sample_rate), jobs in groups.items():
+                self._run_group(name, sample_rate, jobs)
+        finally:
             with self._lock:
-                idle_secs = time.monotonic() - self._last_active
-                loaded = self._engine_loaded
-            if loaded and idle_secs >= self._idle_timeout:
-                self._unload_engine()
+                self._busy = False
+                self._last_active = time.monotonic()
 
-    def _handle_connection(self, conn: socket.socket) -> None:
-        """处理单个客户端连接。"""
+    def _run_group(self, name: str, sample_rate: int, jobs: list[_Job]) -> None:
+        """在一个引擎上执行同采样率的一组任务。"""
+        start = time.perf_counter()
+        try:
+            engine = self._engines.ensure(name)
+        except Exception as e:
+            for job in jobs:
+                if job.audio is not None:
+                    self.metrics.errors.inc(engine=name)
+                job.future.set_exception(e)
+            return
+        finally:
+            self._engines.touch(name)
+        load_ms = (time.perf_counter() - start) * 1000
+        for job in jobs:
+            job.future.timings["load_ms"] = load_ms
+
+        for job in [j for j in jobs if j.audio is None]:
+            job.future.set_result("")
+        jobs = [j for j in jobs if j.audio is not None]
+        if not jobs:
+            return
+        self.metrics.requests.inc(len(jobs), engine=name)
+        start = time.perf_counter()
         try:
-            # 读取 header 长度
-            header_len_bytes = _recv_exact(conn, 4)
-            header_len = struct.unpack(">I", header_len_bytes)[0]
+            if len(jobs) == 1:
+                texts = [engine.transcribe(jobs[0].audio, sample_rate=sample_rate)]
+            else:
+                texts = engine.transcribe_batch(
+                    [j.audio for j in jobs], sample_rate=sample_rate
+                )
+        except Exception as e:
+            if len(jobs) == 1:
+                self.metrics.errors.inc(engine=name)
+                jobs[0].future.set_exception(e)
+                return
+            # 批量失败时逐条重试，避免一条坏音频拖垮整批
+            for job in jobs:
+                try:
+                    text = engine.transcribe(job.audio, sample_rate=sample_rate)
+                except Exception as e2:
+                    self.metrics.errors.inc(engine=name)
+                    job.future.set_exception(e2)
+                else:
+                    job.future.timings["infer_ms"] = (time.perf_counter() - start) * 1000
+                    job.future.set_result(text)
+            return
+        finally:
+            self._engines.touch(name)
+        # 同一 batch 的请求共同等待整批推理完成
+        infer_ms = (time.perf_counter() - start) * 1000
+        self._observe_batch(name, sample_rate, jobs, infer_ms / 1000)
+        for job, text in zip(jobs, texts):
+            job.future.timings["infer_ms"] = infer_ms
+            job.future.set_result(text)
+
+    def _observe_batch(self, name: str, sample_rate: int, jobs: list[_Job],
+                       seconds: float) -> None:
+        audio_seconds = sum(j.audio.size for j in jobs) / sample_rate
+        self.metrics.audio_seconds.inc(audio_seconds, engine=name)
+        self.metrics.inference.observe(seconds, engine=name)
+        if audio_seconds > 0:
+            backend = self._engines.stt_config(name).backend
+            self.metrics.rtf.observe(seconds / audio_seconds, backend=backend)
+
+    def _inference_worker(self) -> None:
+        """推理线程：按批处理窗口聚合队列中的任务执行，空闲超时卸载模型。"""
+        carry: _Job | None = None
+        while self._running:
+            if carry is not None:
+                job, carry = carry, None
+            else:
+                try:
+                    job = self._jobs.get(timeout=1.0)
+                except queue.Empty:
+                    self._check_idle()
+                    continue
+
+            batch = [job]
+            carry = self._collect_batch(batch)
+            self._run_batch(batch)
 
-            # 读取 JSON header
-            header_bytes = _recv_exact(conn, header_len)
-            header = json.loads(header_bytes.decode("utf-8"))
+        # 退出前让仍在排队的请求失败，避免客户端一直等待
+        pending = [carry] if carry is not None else []
+        while True:
+            try:
+                pending.append(self._jobs.get_nowait())
+            except queue.Empty:
+                break
+        for job in pending:
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_exception(RuntimeError("守护进程正在关闭"))
 
-            # 检查是否是特殊命令
-            cmd = header.get("cmd")
+    # ── 连接处理（IO 线程）──────────────────────────────────
+
+    def _status(self) -> dict:
+        """顶层 model_loaded / tier / backend 描述默认引擎，engines 列出所有已登记引擎。"""
+        engines = self._engines.snapshot()
+        default = next(e for e in engines if e["default"])
+        with self._lock:
+            return {
+                "ok": True,
+                "model_loaded": default["tier"] != TIER_UNLOADED,
+                "tier": default["tier"],
+                "idle_seconds": round(time.monotonic() - self._last_active, 1),
+                "backend": default["backend"],
+                "engine": default["name"],
+                "engines": engines,
+                "busy": self._busy,
+                "queue_depth": self._jobs.qsize(),
+                "queue_size": self._jobs.maxsize,
+                "capture": self._capture is not None,
+                "capturing": self._capture is not None and self._capture.active,
+            }
+
+    def _accept_client(self, sock: socket.socket) -> socket.socket | None:
+        """TLS 握手 + token 认证。失败时返回 None（连接已关闭）。"""
+        token = self._config.daemon.token
+        if self._tls_ctx is None and not token:
+            return sock
+
+        sock.settimeout(10.0)  # 握手/认证阶段不允许无限等待
+        try:
+            if self._tls_ctx is not None:
+                sock = self._tls_ctx.wrap_socket(sock, server_side=True)
+            if token:
+                header = recv_message(sock)
+                given = header.get("token", "") if header.get("cmd") == "auth" else ""
+                if not hmac.compare_digest(str(given).encode(), token.encode()):
+                    send_message(sock, {"ok": False, "error": "认证失败", "id": header.get("id")})
+                    sock.close()
+                    return None
+                send_message(sock, {"ok": True, "id": header.get("id")})
+        except Exception:
+            sock.close()
+            return None
+        sock.settimeout(None)
+        return sock
+
+    def _handle_connection(self, sock: socket.socket) -> None:
+        """处理单个客户端连接：循环读取请求直到客户端关闭。"""
+        sock = self._accept_client(sock)
+        if sock is None:
+            return
+        conn = _Connection(sock)
+        try:
+            while True:
+                header = recv_message(sock, allow_eof=True)
+                if header is None or not self._dispatch(conn, header):
+                    break
+        except Exception as e:
+            # 协议错误：帧边界已不可信，报告后关闭连接
+            conn.reply(None, {"ok": False, "error": str(e)})
+        finally:
+            # 发起录音的客户端断开时结束录音，避免一直录到最长时长
+            if self._capture is not None and self._capture_conn is conn:
+                self._capture.stop()
+            conn.drain()
+            sock.close()
+
+    def _dispatch(self, conn: _Connection, header: dict) -> bool:
+        """处理一条请求。返回 False 表示连接不再可用（v1 以 EOF 结束音频）。"""
+        req_id = header.get("id")
+        cmd = header.get("cmd")
+        try:
             if cmd == "ping":
-                _send_response(conn, {"ok": True, "msg": "pong"})
-                return
+                conn.reply(req_id, {"ok": True, "msg": "pong"})
             elif cmd == "status":
-                with self._lock:
-                    loaded = self._engine_loaded
-                    idle = time.monotonic() - self._last_active
-                _send_response(conn, {
-                    "ok": True,
-                    "model_loaded": loaded,
-                    "idle_seconds": round(idle, 1),
-                    "backend": self._config.stt.backend,
-                })
-                return
+                conn.reply(req_id, self._status())
             elif cmd == "shutdown":
-                _send_response(conn, {"ok": True, "msg": "shutting down"})
+                conn.reply(req_id, {"ok": True, "msg": "shutting down"})
                 self._running = False
-                return
+            elif cmd == "prepare":
+                # 录音开始时预热：模型加载/恢复与用户说话重叠
+                name = self._prepare(header.get("engine"))
+                conn.reply(req_id, {"ok": True, "engine": name,
+                                    "tier": self._engines.tier(name)})
+            elif cmd == "metrics":
+                conn.reply(req_id, {"ok": True, "metrics": self.metrics.render()})
+            elif cmd == "polish":
+                done: Future = Future()
+                done.set_result(header.get("text", ""))
+                conn.reply_future(req_id, self._polish_after(done))
+            elif cmd == "noise_floor":
+                conn.reply(req_id, self._noise_floor(header))
+            elif cmd == "start_capture":
+                self._start_capture(conn, req_id, header)
+            elif cmd == "stop_capture":
+                stopped = self._capture.stop() if self._capture is not None else False
+                conn.reply(req_id, {"ok": True, "stopped": stopped})
+            elif cmd == "stream_start":
+                self._stream_start(conn, req_id, header)
+            elif cmd == "stream_chunk":
+                self._stream_chunk(conn, header)
+            elif cmd == "stream_end":
+                self._stream_end(conn, req_id)
+            elif cmd is not None:
+                conn.reply(req_id, {"ok": False, "error": f"未知命令: {cmd}"})
+            elif "length" in header:
+                # header 声明 length 时直接读入预分配缓冲区，连接可继续复用
+                dtype = header.get("dtype", "float32")
+                audio = recv_audio(conn.sock, header["length"], dtype,
+                                   self._max_audio_bytes(header.get("sample_rate", 16000), dtype))
+                self.metrics.bytes_received.inc(header["length"])
+                if audio.size == 0:
+                    conn.reply(req_id, {"ok": False, "error": "未收到音频数据"})
+                else:
+                    future = self._submit(audio, header.get("sample_rate", 16000),
+                                          engine=header.get("engine"))
+                    conn.reply_future(req_id, self._maybe_polish(future, header))
+            else:
+                # v1 客户端不带 length，音频读到 EOF 为止
+                self._transcribe_until_eof(conn, header)
+                return False
+        except DaemonBusyError as e:
+            conn.reply(req_id, {"ok": False, "error": str(e), "busy": True})
+        except UnknownEngineError as e:
+            conn.reply(req_id, {"ok": False, "error": str(e)})
+        return True
+
+    def _transcribe_until_eof(self, conn: _Connection, header: dict) -> None:
+        audio_chunks = []
+        while True:
+            chunk = conn.sock.recv(65536)
+            if not chunk:
+                break
+            audio_chunks.append(chunk)
+        self.metrics.bytes_received.inc(sum(len(c) for c in audio_chunks))
+        audio = decode_audio(b"".join(audio_chunks), header.get("dtype", "float32"))
 
-            # 正常转写请求：读取剩余音频数据
-            # 客户端发送完 header 后紧跟音频数据，然后关闭写端
-            audio_chunks = []
-            while True:
-                chunk = conn.recv(65536)
-                if not chunk:
-                    break
-                audio_chunks.append(chunk)
+        if audio.size == 0:
+            conn.reply(None, {"ok": False, "error": "未收到音频数据"})
+            return
+        try:
+            future = self._submit(audio, header.get("sample_rate", 16000),
+                                  engine=header.get("engine"))
+        except UnknownEngineError as e:
+            conn.reply(None, {"ok": False, "error": str(e)})
+            return
+        conn.reply_future(None, self._maybe_polish(future, header))
+
+    # ── AI 润色 ───────────────────────────────────────────
+
+    def _maybe_polish(self, future: Future, header: dict) -> Future:
+        return self._polish_after(future) if header.get("polish") else future
 
-            if not audio_chunks:
-                _send_response(conn, {"ok": False, "error": "未收到音频数据"})
+    def _polish_after(self, future: Future) -> Future:
+        """转写完成后提交润色，返回的 Future 结果仍为原文，润色结果放在 fields 中。"""
+        done = _TimedFuture()
+
+        def _chain(f: Future) -> None:
+            done.timings = dict(getattr(f, "timings", {}))
+            try:
+                raw = f.result()
+            except Exception as e:
+                done.set_exception(e)
                 return
+            def _finished(job: Future) -> None:
+                # 关闭时 cancel_futures 会取消排队中的润色，_polish_into 不会运行；
+                # 仍要以原文应答，否则连接的 drain() 会一直等下去
+                if not done.done():
+                    done.set_result(raw)
 
-            audio_bytes = b"".join(audio_chunks)
-            audio = np.frombuffer(audio_bytes, dtype=np.float32)
-            sample_rate = header.get("sample_rate", 16000)
+            try:
+                self._polisher.submit(self._polish_into, raw, done).add_done_callback(_finished)
+            except RuntimeError:  # 正在关闭，线程池已停止
+                done.set_result(raw)
 
-            # 执行转写
-            engine = self._ensure_engine()
-            text = engine.transcribe(audio, sample_rate=sample_rate)
+        future.add_done_callback(_chain)
+        return done
 
-            _send_response(conn, {"ok": True, "text": text})
+    def _polish_into(self, raw: str, done: _TimedFuture) -> None:
+        start = time.perf_counter()
+        try:
+            if not self._config.llm.enabled:
+                raise RuntimeError("守护进程未启用 AI 润色 (llm.enabled)")
+            from voxy.processor import process_text
 
+            done.fields["polished"] = process_text(raw, self._config.llm)
         except Exception as e:
-            try:
-                _send_response(conn, {"ok": False, "error": str(e)})
-            except Exception:
-                pass
-        finally:
-            conn.close()
+            self.metrics.polish_errors.inc()
+            done.fields["polish_error"] = str(e)
+        seconds = time.perf_counter() - start
+        self.metrics.polish.observe(seconds)
+        done.timings["polish_ms"] = seconds * 1000
+        done.set_result(raw)
+
+    def _prepare(self, engine: str | None = None) -> str:
+        """引擎不在显存时提交预加载任务；队列满时忽略（后续请求自会加载）。
+
+        Returns:
+            引擎注册名
+
+        Raises:
+            UnknownEngineError: 未知的引擎名
+        """
+        name = self._engines.resolve(engine)
+        if self._engines.tier(name) == TIER_LOADED:
+            return name
+        try:
+            self._submit(None, self._config.audio.sample_rate, engine=name)
+        except DaemonBusyError:
+            pass
+        return name
+
+    def _noise_floor(self, header: dict) -> dict:
+        """读取或缓存客户端的噪音底，下次录音无需重新校准即可判断静音。"""
+        key = str(header.get("device", "default"))
+        with self._lock:
+            if header.get("floor") is not None:
+                self._noise_floors[key] = float(header["floor"])
+            return {"ok": True, "floor": self._noise_floors.get(key)}
+
+    def _open_session(self, sample_rate: int, engine: str | None) -> _StreamSession:
+        """创建流式转写会话，同时预加载模型，与用户说话重叠。"""
+        name = self._prepare(engine)
+        # 分段提交时队列满则阻塞，把背压传递给音频来源
+        return _StreamSession(
+            lambda audio: self._submit(audio, sample_rate, block=True, engine=name),
+            sample_rate,
+            self._engines.stt_config(name).max_segment_seconds,
+            create_vad(self._config.audio.vad, sample_rate),
+        )
+
+    def _stream_start(self, conn: _Connection, req_id, header: dict) -> None:
+        """开始流式转写：之后的 stream_chunk 按停顿分段提交，stream_end 时返回全文。"""
+        session = self._open_session(header.get("sample_rate", 16000), header.get("engine"))
+        conn.streams[req_id] = (session, header.get("dtype", "float32"),
+                                header.get("polish", False))
+
+    def _start_capture(self, conn: _Connection, req_id, header: dict) -> None:
+        """用常驻输入流开始录音，边录边分段转写；录音结束（stop_capture、
+        until_silence 时检测到说完、或达到最长时长）后以本请求的 id 返回全文。"""
+        if self._capture is None:
+            conn.reply(req_id, {"ok": False, "error": "守护进程未启用常驻录音 (daemon.capture)",
+                                "capture": False})
+            return
+        session = self._open_session(self._config.audio.sample_rate, header.get("engine"))
+        done = _TimedFuture()
+        started = time.monotonic()
+
+        def _on_end() -> None:
+            capture_ms = (time.monotonic() - started) * 1000
+
+            def _chain(f: Future) -> None:
+                done.timings = {"capture_ms": capture_ms, **getattr(f, "timings", {})}
+                try:
+                    done.set_result(f.result())
+                except Exception as e:
+                    done.set_exception(e)
+
+            session.finish().add_done_callback(_chain)
+
+        try:
+            self._capture.start(session.feed, _on_end,
+                                until_silence=header.get("until_silence", True))
+        except RuntimeError as e:
+            conn.reply(req_id, {"ok": False, "error": str(e)})
+            return
+        self._capture_conn = conn
+        conn.reply_future(req_id, self._maybe_polish(done, header))
+
+    def _max_audio_bytes(self, sample_rate, dtype: str) -> int:
+        """单帧音频上限：audio.max_duration 秒的音频，超过的帧在分配内存前拒绝。"""
+        sample_rate = min(int(sample_rate), _MAX_SAMPLE_RATE)
+        seconds = self._config.audio.max_duration or _MAX_FRAME_S
+        return max_audio_bytes(seconds, sample_rate, dtype)
+
+    def _stream_chunk(self, conn: _Connection, header: dict) -> None:
+        req_id = header.get("id")
+        entry = conn.streams.get(req_id)
+        # 无论流是否存在都要读走 payload，保持帧边界
+        dtype = entry[1] if entry else header.get("dtype", "float32")
+        sample_rate = entry[0].sample_rate if entry else self._config.audio.sample_rate
+        audio = recv_audio(conn.sock, header.get("length", 0), dtype,
+                           self._max_audio_bytes(sample_rate, dtype))
+        self.metrics.bytes_received.inc(header.get("length", 0))
+        if entry is None:
+            return
+        try:
+            entry[0].feed(audio)
+        except DaemonBusyError as e:
+            # 流已失败：立即报告，后续 chunk 丢弃
+            del conn.streams[req_id]
+            conn.reply(req_id, {"ok": False, "error": str(e), "busy": True})
+
+    def _stream_end(self, conn: _Connection, req_id) -> None:
+        entry = conn.streams.pop(req_id, None)
+        if entry is None:
+            conn.reply(req_id, {"ok": False, "error": "流不存在或已失败"})
+            return
+        future = entry[0].finish()
+        conn.reply_future(req_id, self._polish_after(future) if entry[2] else future)
 
     def _cleanup_stale_socket(self, sock_path: str) -> None:
         """检测并清理残留的 socket 文件。"""
@@ -171,49 +790,146 @@ class DaemonServer:
         finally:
             test_sock.close()
 
-    def run(self) -> None:
-        """启动守护进程主循环。"""
-        sock_path = get_socket_path()
-        self._cleanup_stale_socket(sock_path)
+    def serve(self, sock: socket.socket, tls_ctx=None) -> None:
+        """在已监听的 socket 上运行 accept 循环，直到 _running 被清除。
 
-        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self._sock.bind(sock_path)
-        self._sock.listen(5)
+        tls_ctx 为服务端 ssl.SSLContext 时，每个连接在各自的 IO 线程中握手。
+        """
+        self._sock = sock
+        self._tls_ctx = tls_ctx
         self._sock.settimeout(1.0)  # 允许定期检查 _running 标志
         self._running = True
 
-        # 信号处理
-        def _shutdown(signum, frame):
-            print("\n  收到停止信号，正在关闭...", file=sys.stderr, flush=True)
-            self._running = False
-
-        signal.signal(signal.SIGTERM, _shutdown)
-        signal.signal(signal.SIGINT, _shutdown)
-
-        # 启动 idle watcher 线程
-        watcher = threading.Thread(target=self._idle_watcher, daemon=True)
-        watcher.start()
-
-        print(f"Voxy 守护进程已启动，监听: {sock_path}", file=sys.stderr, flush=True)
-        print(f"  STT 后端: {self._config.stt.backend}", file=sys.stderr, flush=True)
-        print(f"  空闲超时: {self._config.daemon.idle_timeout} 分钟", file=sys.stderr, flush=True)
+        worker = threading.Thread(target=self._inference_worker, daemon=True)
+        worker.start()
 
         try:
             while self._running:
                 try:
                     conn, _ = self._sock.accept()
-                    self._handle_connection(conn)
                 except socket.timeout:
                     continue
                 except OSError:
                     if self._running:
                         raise
                     break
+                conn.settimeout(None)
+                if conn.family != socket.AF_UNIX:
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                threading.Thread(
+                    target=self._handle_connection, args=(conn,), daemon=True
+                ).start()
         finally:
+            self._running = False
             self._sock.close()
+            worker.join(timeout=5.0)
+
+    def _listen(self) -> tuple[socket.socket, object, str | None]:
+        """按 daemon.listen 创建监听 socket。
+
+        Returns:
+            (监听 socket, TLS context 或 None, 需要在退出时删除的 Unix socket 路径)
+        """
+        dc = self._config.daemon
+        scheme, target = parse_address(dc.listen)
+
+        if scheme == "unix":
+            self._cleanup_stale_socket(target)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(target)
+            sock.listen(16)
+            return sock, None, target
+
+        host, port = target
+        if not dc.token and host not in ("127.0.0.1", "::1", "localhost"):
+            print("错误: 监听非本机地址时必须设置 daemon.token", file=sys.stderr)
+            sys.exit(1)
+
+        tls_ctx = None
+        if scheme == "tls":
+            if not dc.tls_cert:
+                print("错误: tls:// 监听需要设置 daemon.tls_cert / daemon.tls_key", file=sys.stderr)
+                sys.exit(1)
+            import ssl
+
+            tls_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            tls_ctx.load_cert_chain(dc.tls_cert, dc.tls_key or None)
+
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        sock = socket.create_server((host, port), family=family, backlog=16)
+        return sock, tls_ctx, None
+
+    def _open_capture(self) -> None:
+        """打开常驻录音输入流；失败时只打印警告，daemon 照常提供转写。"""
+        try:
+            from voxy.capture import CaptureService
+
+            capture = CaptureService(self._config.audio, self._config.daemon.capture_preroll)
+            capture.open()
+        except Exception as e:
+            print(f"  常驻录音不可用: {e}", file=sys.stderr, flush=True)
+            return
+        self._capture = capture
+        print(f"  常驻录音: {self._config.audio.device}"
+              f" (pre-roll {self._config.daemon.capture_preroll:g} 秒)", file=sys.stderr, flush=True)
+
+    def run(self) -> None:
+        """启动守护进程主循环。"""
+        sock, tls_ctx, sock_path = self._listen()
+
+        # 信号处理
+        def _shutdown(signum, frame):
+            print("\n  收到停止信号，正在关闭...", file=sys.stderr, flush=True)
+            self._running = False
+
+        signal.signal(signal.SIGTERM, _shutdown)
+        signal.signal(signal.SIGINT, _shutdown)
+
+        listen = sock_path or self._config.daemon.listen
+        auth = "token" if self._config.daemon.token else "无"
+        print(f"Voxy 守护进程已启动，监听: {listen} (认证: {auth})", file=sys.stderr, flush=True)
+        print(f"  STT 引擎: {self._engines.default} (默认)", file=sys.stderr, flush=True)
+        others = [n for n in self._config.daemon.engines if n != self._engines.default]
+        if others:
+            print(f"  其他引擎: {', '.join(others)}", file=sys.stderr, flush=True)
+        if self._config.daemon.memory_budget_mb > 0:
+            print(f"  内存预算: {self._config.daemon.memory_budget_mb} MB",
+                  file=sys.stderr, flush=True)
+        print(f"  空闲超时: {self._config.daemon.offload_timeout} 分钟移至内存,"
+              f" {self._config.daemon.idle_timeout} 分钟卸载", file=sys.stderr, flush=True)
+        print(f"  队列容量: {self._config.daemon.queue_size}", file=sys.stderr, flush=True)
+        dc = self._config.daemon
+        if dc.batch_window_ms > 0 and dc.batch_max_items > 1:
+            print(f"  批处理: {dc.batch_window_ms} ms 窗口, 最多 {dc.batch_max_items} 条"
+                  f" / {dc.batch_max_seconds:g} 秒音频", file=sys.stderr, flush=True)
+
+        if self._config.daemon.capture:
+            self._open_capture()
+        if self._config.llm.enabled:
+            # 润色用的连接与 litellm 导入常驻，首次润色无需等待
+            from voxy.processor import prewarm
+
+            prewarm(self._config.llm)
+            print(f"  AI 润色: {self._config.llm.provider}", file=sys.stderr, flush=True)
+        http = None
+        if dc.metrics_port > 0:
             try:
-                os.unlink(sock_path)
-            except FileNotFoundError:
-                pass
-            self._unload_engine()
+                http = serve_http(self.metrics, dc.metrics_port)
+            except OSError as e:
+                print(f"  指标端点不可用: {e}", file=sys.stderr, flush=True)
+
+        try:
+            self.serve(sock, tls_ctx)
+        finally:
+            if http is not None:
+                http.shutdown()
+            self._polisher.shutdown(wait=False, cancel_futures=True)
+            if self._capture is not None:
+                self._capture.close()
+            if sock_path is not None:
+                try:
+                    os.unlink(sock_path)
+                except FileNotFoundError:
+                    pass
+            self._engines.unload_all()
             print("Voxy 守护进程已停止", file=sys.stderr, flush=True)
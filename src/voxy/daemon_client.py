@@ -1,106 +1,398 @@
-"""Daemon 客户端 - 通过 Unix socket 与守护进程通信"""
+"""Daemon 客户端 - 通过 Unix socket / TCP 与守护进程通信"""
 
-import json
+import itertools
+import queue
 import socket
-import struct
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
 
-import numpy as np
+from voxy.config import DaemonConfig
+from voxy.protocol import (
+    PROTOCOL_VERSION,
+    connect,
+    encode_audio,
+    recv_message,
+    send_message,
+)
 
-from voxy.daemon import get_socket_path
+if TYPE_CHECKING:
+    import numpy as np
 
+    from voxy.timing import Trace
 
-def _send_command(cmd: str) -> dict:
-    """发送特殊命令到 daemon，返回响应。"""
-    sock_path = get_socket_path()
-    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    sock.settimeout(5.0)
-    try:
-        sock.connect(sock_path)
-        header = json.dumps({"cmd": cmd}).encode("utf-8")
-        sock.sendall(struct.pack(">I", len(header)) + header)
-        sock.shutdown(socket.SHUT_WR)
-
-        resp_len_bytes = sock.recv(4)
-        if len(resp_len_bytes) < 4:
-            raise ConnectionError("响应不完整")
-        resp_len = struct.unpack(">I", resp_len_bytes)[0]
-
-        resp_bytes = bytearray()
-        while len(resp_bytes) < resp_len:
-            chunk = sock.recv(resp_len - len(resp_bytes))
-            if not chunk:
-                break
-            resp_bytes.extend(chunk)
-
-        return json.loads(resp_bytes.decode("utf-8"))
-    finally:
+
+def polish_result(resp: dict) -> dict | None:
+    """取出响应中的 daemon 润色结果：{"polished": ...} 或 {"polish_error": ...}，未润色为 None。"""
+    fields = {k: resp[k] for k in ("polished", "polish_error") if k in resp}
+    return fields or None
+
+
+class DaemonClient:
+    """长连接 daemon 客户端：一个连接上复用多个请求。
+
+    每个请求带自增 id，后台读线程按 id 把响应分发给等待者，
+    因此多个线程可以同时在同一连接上发起请求。连接断开后
+    下一次请求自动重连，适合热键监听器、GUI 等常驻调用方。
+
+    地址取 config.connect（为空则用 config.listen，都为空则为默认 Unix socket），
+    配置了 token 时连接建立后先完成认证。
+    """
+
+    def __init__(self, config: DaemonConfig | None = None, timeout: float = 60.0,
+                 connect_timeout: float = 5.0):
+        self._config = config or DaemonConfig()
+        self._timeout = timeout
+        self._connect_timeout = connect_timeout
+        self._sock: socket.socket | None = None
+        self._ids = itertools.count(1)
+        self._pending: dict[int, Future] = {}
+        self._lock = threading.Lock()       # 保护 _sock / _pending
+        self._send_lock = threading.Lock()  # 串行化写入，保证消息不交错
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _connect(self) -> socket.socket:
+        """返回当前连接，未连接时建立新连接并启动读线程。调用方须持有 _lock。"""
+        if self._sock is not None:
+            return self._sock
+        dc = self._config
+        sock = connect(dc.connect or dc.listen, timeout=self._connect_timeout, tls_ca=dc.tls_ca)
+        if dc.token:
+            try:
+                send_message(sock, {"cmd": "auth", "token": dc.token})
+                resp = recv_message(sock)
+            except Exception:
+                sock.close()
+                raise
+            if not resp.get("ok"):
+                sock.close()
+                raise PermissionError(resp.get("error", "认证失败"))
+        # 读线程阻塞等待响应；超时由各请求的 Future 控制
+        sock.settimeout(None)
+        self._sock = sock
+        threading.Thread(target=self._read_loop, args=(sock,), daemon=True).start()
+        return sock
+
+    def _read_loop(self, sock: socket.socket) -> None:
+        error: Exception = ConnectionError("守护进程关闭了连接")
+        try:
+            while True:
+                resp = recv_message(sock, allow_eof=True)
+                if resp is None:
+                    break
+                with self._lock:
+                    future = self._pending.pop(resp.get("id"), None)
+                if future is not None:
+                    future.set_result(resp)
+        except Exception as e:
+            error = e
+        self._drop(sock, error)
+
+    def _drop(self, sock: socket.socket, error: Exception) -> None:
+        """连接失效：让该连接上所有等待中的请求失败。"""
+        with self._lock:
+            if self._sock is not sock:
+                return
+            self._sock = None
+            pending, self._pending = self._pending, {}
         sock.close()
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _start(self, header: dict, payload=None) -> tuple[socket.socket, int, Future]:
+        """发送请求，返回 (所用连接, 请求 id, 等待响应的 Future)。"""
+        for attempt in range(2):
+            with self._lock:
+                sock = self._connect()
+                req_id = next(self._ids)
+                future: Future = Future()
+                self._pending[req_id] = future
+            try:
+                self._send(sock, {**header, "id": req_id}, payload)
+                return sock, req_id, future
+            except OSError as e:
+                self._drop(sock, e)
+                # 池中连接可能已被 daemon 重启断开，重连重试一次
+                if attempt:
+                    raise
+        raise AssertionError("unreachable")
+
+    def _send(self, sock: socket.socket, header: dict, payload=None) -> None:
+        with self._send_lock:
+            send_message(sock, header, payload)
+
+    def request(self, header: dict, payload=None, timeout: float | None = None) -> dict:
+        """发送请求并等待响应。
+
+        Raises:
+            Exception: 连接失败或等待超时
+        """
+        _, req_id, future = self._start(header, payload)
+        return self._wait(req_id, future, timeout)
+
+    def _wait(self, req_id: int, future: Future, timeout: float | None = None) -> dict:
+        """等待 _start 发出的请求的响应。超时后不再跟踪该 id，迟到的响应由读线程丢弃。"""
+        try:
+            return future.result(timeout=timeout or self._timeout)
+        except TimeoutError:
+            with self._lock:
+                self._pending.pop(req_id, None)
+            raise
+
+    def ping(self) -> bool:
+        return self.request({"cmd": "ping"}, timeout=5.0).get("ok", False)
+
+    def status(self) -> dict:
+        return self.request({"cmd": "status"}, timeout=5.0)
+
+    def metrics(self) -> str:
+        """Prometheus 文本格式的运行指标。"""
+        return self.request({"cmd": "metrics"}, timeout=5.0).get("metrics", "")
+
+    def prepare(self, engine: str = "") -> str:
+        """通知 daemon 即将转写，提前加载/恢复模型。返回当前驻留层级。"""
+        header = {"cmd": "prepare"}
+        if engine:
+            header["engine"] = engine
+        return self.request(header, timeout=5.0).get("tier", "")
+
+    def start_capture(self, until_silence: bool = True, engine: str = "",
+                      polish: bool = False) -> Future:
+        """让 daemon 用常驻输入流开始录音。
+
+        返回的 Future 在录音结束并转写完成后得到响应 dict（含 text）。
+        polish=True 时 daemon 接着润色，响应另含 polished 或 polish_error。
+        """
+        header = {"cmd": "start_capture", "until_silence": until_silence}
+        if engine:
+            header["engine"] = engine
+        if polish:
+            header["polish"] = True
+        return self._start(header)[2]
+
+    def polish(self, text: str, timeout: float | None = None) -> str:
+        """由 daemon 润色一段文本。
+
+        Raises:
+            Exception: daemon 不可用或润色失败时抛出
+        """
+        resp = self.request({"cmd": "polish", "text": text}, timeout=timeout)
+        if not resp.get("ok"):
+            raise RuntimeError(resp.get("error", "未知错误"))
+        if "polish_error" in resp:
+            raise RuntimeError(resp["polish_error"])
+        return resp.get("polished", text)
+
+    def stop_capture(self) -> bool:
+        """结束 daemon 正在进行的录音，返回是否确有录音被结束。"""
+        return self.request({"cmd": "stop_capture"}, timeout=5.0).get("stopped", False)
+
+    def noise_floor(self, device: str, floor: float | None = None) -> float | None:
+        """读取（floor=None）或缓存某个录音设备的噪音底。"""
+        header = {"cmd": "noise_floor", "device": device}
+        if floor is not None:
+            header["floor"] = floor
+        return self.request(header, timeout=2.0).get("floor")
+
+    def shutdown(self) -> bool:
+        return self.request({"cmd": "shutdown"}, timeout=5.0).get("ok", False)
+
+    def transcribe(self, audio: "np.ndarray", sample_rate: int = 16000,
+                   dtype: str = "float32", engine: str = "",
+                   trace: "Trace | None" = None) -> str:
+        """转写一段音频。engine 为 daemon 中的引擎名，空则使用默认引擎。
+        给出 trace 时并入 daemon 返回的分阶段耗时。
+
+        Raises:
+            Exception: daemon 不可用或转写失败时抛出
+        """
+        payload = encode_audio(audio, dtype)
+        header = {
+            "v": PROTOCOL_VERSION,
+            "sample_rate": sample_rate,
+            "dtype": dtype,
+            "length": len(payload),
+        }
+        if engine:
+            header["engine"] = engine
+        resp = self.request(header, payload)
+        if not resp.get("ok"):
+            raise RuntimeError(resp.get("error", "未知错误"))
+        if trace is not None:
+            trace.merge(resp.get("timings"))
+        return resp.get("text", "")
+
+    def open_stream(self, sample_rate: int = 16000, dtype: str = "float32",
+                    engine: str = "", trace: "Trace | None" = None,
+                    polish: bool = False) -> "DaemonStream":
+        """在本连接上开始一次流式转写。"""
+        return DaemonStream(sample_rate, dtype, client=self, engine=engine, trace=trace,
+                            polish=polish)
 
+    def close(self) -> None:
+        with self._lock:
+            sock = self._sock
+        if sock is not None:
+            self._drop(sock, ConnectionError("客户端已关闭"))
 
-def daemon_ping() -> bool:
+
+class DaemonStream:
+    """流式转写：录音开始时连接 daemon，边录边发送音频帧。
+
+    send() 可在 sounddevice 回调中调用，只入队不阻塞；
+    后台线程负责编码并以 stream_chunk 消息写入连接。
+    polish=True 时 daemon 转写后接着润色，finish() 之后结果在 polish_result 中。
+
+    Raises:
+        Exception: daemon 不可用时构造即抛出
+    """
+
+    def __init__(self, sample_rate: int = 16000, dtype: str = "float32",
+                 client: DaemonClient | None = None, config: DaemonConfig | None = None,
+                 engine: str = "", trace: "Trace | None" = None, polish: bool = False):
+        self._dtype = dtype
+        self._trace = trace
+        self.polish_result: dict | None = None
+        self._owns_client = client is None
+        self._client = client or DaemonClient(config)
+        header = {
+            "cmd": "stream_start",
+            "v": PROTOCOL_VERSION,
+            "sample_rate": sample_rate,
+            "dtype": dtype,
+        }
+        if engine:
+            header["engine"] = engine
+        if polish:
+            header["polish"] = True
+        try:
+            self._sock, self._id, self._future = self._client._start(header)
+        except Exception:
+            self.close()
+            raise
+
+        self._queue: queue.SimpleQueue["np.ndarray | None"] = queue.SimpleQueue()
+        self._error: Exception | None = None
+        self._sender = threading.Thread(target=self._send_loop, daemon=True)
+        self._sender.start()
+
+    def _send_loop(self) -> None:
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            try:
+                payload = encode_audio(chunk, self._dtype)
+                self._client._send(self._sock, {
+                    "cmd": "stream_chunk",
+                    "id": self._id,
+                    "length": len(payload),
+                }, payload)
+            except Exception as e:
+                self._error = e
+                return
+
+    def send(self, chunk: "np.ndarray") -> None:
+        """追加一段音频（float32 单声道）。chunk 入队后不可再被调用方修改。"""
+        if self._error is None and chunk.size:
+            self._queue.put(chunk)
+
+    def noise_floor(self, device: str, floor: float | None = None) -> float | None:
+        """在本连接上读取（floor=None）或缓存噪音底，失败返回 None。
+
+        只用于 Unix socket：噪音底属于本机麦克风，经 TCP 连接同一 daemon 的
+        多台机器不能共用 daemon 中的同一条缓存。
+        """
+        if self._sock.family != socket.AF_UNIX:
+            return None
+        try:
+            return self._client.noise_floor(device, floor)
+        except Exception:
+            return None
+
+    def finish(self) -> str:
+        """结束发送并等待转写结果。
+
+        Raises:
+            Exception: 发送失败或转写失败时抛出
+        """
+        try:
+            self._queue.put(None)
+            self._sender.join()
+            if self._error is not None and not self._future.done():
+                raise self._error
+
+            if not self._future.done():
+                self._client._send(self._sock, {"cmd": "stream_end", "id": self._id})
+
+            resp = self._client._wait(self._id, self._future)
+            if not resp.get("ok"):
+                raise RuntimeError(resp.get("error", "未知错误"))
+            if self._trace is not None:
+                self._trace.merge(resp.get("timings"))
+            self.polish_result = polish_result(resp)
+            return resp.get("text", "")
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._owns_client:
+            self._client.close()
+
+
+def daemon_ping(config: DaemonConfig | None = None) -> bool:
     """检测 daemon 是否可用。"""
     try:
-        resp = _send_command("ping")
-        return resp.get("ok", False)
+        with DaemonClient(config) as client:
+            return client.ping()
     except Exception:
         return False
 
 
-def daemon_status() -> dict | None:
+def daemon_status(config: DaemonConfig | None = None) -> dict | None:
     """获取 daemon 状态信息，不可用时返回 None。"""
     try:
-        return _send_command("status")
+        with DaemonClient(config) as client:
+            resp = client.status()
+        return resp if resp.get("ok") else None
     except Exception:
         return None
 
 
-def daemon_shutdown() -> bool:
+def daemon_metrics(config: DaemonConfig | None = None) -> str | None:
+    """获取 daemon 运行指标 (Prometheus 文本格式)，不可用时返回 None。"""
+    try:
+        with DaemonClient(config) as client:
+            return client.metrics()
+    except Exception:
+        return None
+
+
+def daemon_shutdown(config: DaemonConfig | None = None) -> bool:
     """通知 daemon 关闭。"""
     try:
-        resp = _send_command("shutdown")
-        return resp.get("ok", False)
+        with DaemonClient(config) as client:
+            return client.shutdown()
     except Exception:
         return False
 
 
-def transcribe_via_daemon(audio: np.ndarray, sample_rate: int = 16000) -> str:
-    """通过 daemon 进行语音转写。
+def transcribe_via_daemon(audio: "np.ndarray", sample_rate: int = 16000,
+                          dtype: str = "float32", config: DaemonConfig | None = None,
+                          engine: str = "", trace: "Trace | None" = None) -> str:
+    """通过 daemon 进行语音转写（一次性连接）。
+
+    float32 音频零拷贝发送；dtype="int16" 时体积减半（适合网络传输）。
 
     Raises:
         Exception: daemon 不可用或转写失败时抛出
     """
-    sock_path = get_socket_path()
-    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    sock.settimeout(60.0)  # 转写可能耗时（首次加载模型）
-    try:
-        sock.connect(sock_path)
-
-        # 发送 header
-        header = json.dumps({"sample_rate": sample_rate}).encode("utf-8")
-        sock.sendall(struct.pack(">I", len(header)) + header)
-
-        # 发送音频数据
-        sock.sendall(audio.astype(np.float32).tobytes())
-        sock.shutdown(socket.SHUT_WR)
-
-        # 接收响应
-        resp_len_bytes = sock.recv(4)
-        if len(resp_len_bytes) < 4:
-            raise ConnectionError("响应不完整")
-        resp_len = struct.unpack(">I", resp_len_bytes)[0]
-
-        resp_bytes = bytearray()
-        while len(resp_bytes) < resp_len:
-            chunk = sock.recv(resp_len - len(resp_bytes))
-            if not chunk:
-                break
-            resp_bytes.extend(chunk)
-
-        resp = json.loads(resp_bytes.decode("utf-8"))
-
-        if not resp.get("ok"):
-            raise RuntimeError(resp.get("error", "未知错误"))
-
-        return resp.get("text", "")
-    finally:
-        sock.close()
+    with DaemonClient(config) as client:
+        return client.transcribe(audio, sample_rate=sample_rate, dtype=dtype, engine=engine,
+                                 trace=trace)
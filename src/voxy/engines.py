@@ -0,0 +1,237 @@
+"""STT 引擎注册表 - daemon 内按名称管理多个引擎的加载、降级与淘汰"""
+
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import asdict, replace
+
+import numpy as np
+
+from voxy.config import Config, STTConfig, _deep_merge, build_stt_config
+from voxy.stt import STTEngine, create_stt
+
+# 模型驻留层级：显存（可直接推理）→ 内存（快速恢复）→ 未加载
+TIER_LOADED = "loaded"
+TIER_OFFLOADED = "offloaded"
+TIER_UNLOADED = "unloaded"
+
+BACKENDS = ("sensevoice", "whisper", "cloud")
+
+_MB = 1024 * 1024
+
+
+class UnknownEngineError(ValueError):
+    """请求的引擎名既不是内置后端，也不在 [daemon.engines] 中。"""
+
+
+def engine_config(config: Config, name: str | None = None) -> tuple[str, STTConfig, int]:
+    """按名称解析引擎配置。
+
+    name 为空时取 [stt].backend；[daemon.engines.<name>] 中的条目深度合并到
+    [stt] 之上（可带 memory_mb 声明占用）；内置后端名只替换 backend。
+
+    Returns:
+        (引擎名, STTConfig, 声明的内存占用 MB，未声明为 0)
+
+    Raises:
+        UnknownEngineError: 未知的引擎名
+    """
+    name = name or config.stt.backend
+    overrides = config.daemon.engines.get(name)
+    if overrides is not None:
+        overrides = dict(overrides)
+        memory_mb = int(overrides.pop("memory_mb", 0))
+        return name, build_stt_config(_deep_merge(asdict(config.stt), overrides)), memory_mb
+    if name in BACKENDS:
+        return name, replace(config.stt, backend=name), 0
+    available = sorted(set(BACKENDS) | set(config.daemon.engines))
+    raise UnknownEngineError(f"未知的 STT 引擎: {name}，可用: {' / '.join(available)}")
+
+
+def _memory_usage() -> int:
+    """当前进程的显存 (torch) + 常驻内存字节数，用于估算模型占用。"""
+    total = 0
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        try:
+            if torch.cuda.is_available():
+                total += torch.cuda.memory_allocated()
+        except Exception:
+            pass
+    try:
+        with open("/proc/self/statm") as f:
+            total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    return total
+
+
+class EngineSlot:
+    """一个具名引擎及其驻留状态。"""
+
+    def __init__(self, name: str, stt_config: STTConfig, declared_mb: int = 0):
+        self.name = name
+        self.stt_config = stt_config
+        self.engine: STTEngine | None = None
+        self.tier = TIER_UNLOADED
+        self.last_active = time.monotonic()
+        self.declared = declared_mb > 0
+        self.footprint = declared_mb * _MB  # 字节；未声明时在首次加载后测得
+        self.loads = 0
+        self.load_seconds = 0.0
+
+
+class EngineRegistry:
+    """按名称懒加载多个 STT 引擎，空闲逐级降级，超出内存预算时按 LRU 卸载。
+
+    加载/卸载/推理只在 daemon 推理线程中进行；状态查询可在任意线程。
+    on_event(引擎名, 事件, 耗时秒) 在 load / restore / offload / unload 后调用，用于统计指标。
+    """
+
+    def __init__(self, config: Config,
+                 factory: Callable[[STTConfig], STTEngine] = create_stt,
+                 on_event: Callable[[str, str, float], None] | None = None):
+        self._config = config
+        self._factory = factory
+        self._on_event = on_event or (lambda name, event, seconds: None)
+        self._budget = config.daemon.memory_budget_mb * _MB
+        self._slots: dict[str, EngineSlot] = {}
+        self._lock = threading.Lock()
+        self.default = self.resolve(None)
+        for name in config.daemon.engines:
+            self.resolve(name)
+
+    def resolve(self, name: str | None) -> str:
+        """校验引擎名并返回规范名，首次出现时登记。
+
+        Raises:
+            UnknownEngineError: 未知的引擎名
+        """
+        if name and name in self._slots:
+            return name
+        name, stt_config, declared_mb = engine_config(self._config, name)
+        with self._lock:
+            if name not in self._slots:
+                self._slots[name] = EngineSlot(name, stt_config, declared_mb)
+        return name
+
+    def stt_config(self, name: str) -> STTConfig:
+        return self._slots[name].stt_config
+
+    def tier(self, name: str) -> str:
+        with self._lock:
+            return self._slots[name].tier
+
+    def _set_tier(self, slot: EngineSlot, tier: str) -> None:
+        with self._lock:
+            slot.tier = tier
+
+    def touch(self, name: str) -> None:
+        with self._lock:
+            self._slots[name].last_active = time.monotonic()
+
+    def ensure(self, name: str) -> STTEngine:
+        """确保引擎处于可推理状态，必要时先按 LRU 腾出预算。"""
+        slot = self._slots[name]
+        if slot.tier == TIER_LOADED and slot.engine is not None:
+            return slot.engine
+
+        start = time.monotonic()
+        if slot.tier == TIER_OFFLOADED and slot.engine is not None:
+            # 权重还在内存中，搬回设备即可
+            slot.engine.restore()
+            self._set_tier(slot, TIER_LOADED)
+            seconds = time.monotonic() - start
+            print(f"  [{name}] 模型已从内存恢复 ({seconds:.2f}s)", file=sys.stderr, flush=True)
+            self._on_event(name, "restore", seconds)
+            return slot.engine
+
+        self._make_room(slot)
+        before = _memory_usage()
+        if slot.engine is None:
+            slot.engine = self._factory(slot.stt_config)
+        # 触发懒加载：用一小段静音做推理
+        dummy = np.zeros(1600, dtype=np.float32)
+        slot.engine.transcribe(dummy, sample_rate=self._config.audio.sample_rate)
+        if not slot.declared:
+            slot.footprint = max(0, _memory_usage() - before)
+        slot.loads += 1
+        slot.load_seconds = time.monotonic() - start
+        self._set_tier(slot, TIER_LOADED)
+        print(f"  [{name}] 模型加载完成 ({slot.load_seconds:.2f}s,"
+              f" ~{slot.footprint / _MB:.0f} MB)", file=sys.stderr, flush=True)
+        self._on_event(name, "load", slot.load_seconds)
+        # 实测占用可能超出预期，加载后再检查一次
+        self._make_room(slot)
+        return slot.engine
+
+    def _make_room(self, keep: EngineSlot) -> None:
+        """驻留引擎总占用超出预算时，按最久未用顺序卸载其他引擎。"""
+        if self._budget <= 0:
+            return
+        while True:
+            others = [s for s in self._slots.values()
+                      if s is not keep and s.tier != TIER_UNLOADED]
+            used = keep.footprint + sum(s.footprint for s in others)
+            if used <= self._budget or not others:
+                return
+            victim = min(others, key=lambda s: s.last_active)
+            print(f"  [{victim.name}] 超出内存预算，卸载", file=sys.stderr, flush=True)
+            self.unload(victim.name)
+
+    def offload(self, name: str) -> None:
+        """把引擎权重移到内存，释放显存但保留快速恢复能力。"""
+        slot = self._slots[name]
+        if slot.engine is None or slot.tier != TIER_LOADED:
+            return
+        if slot.engine.offload():
+            print(f"  [{name}] 模型已移至内存，释放显存", file=sys.stderr, flush=True)
+            self._set_tier(slot, TIER_OFFLOADED)
+            self._on_event(name, "offload", 0.0)
+
+    def unload(self, name: str) -> None:
+        """卸载引擎释放显存和内存。"""
+        slot = self._slots[name]
+        if slot.engine is not None and slot.tier != TIER_UNLOADED:
+            print(f"  [{name}] 卸载模型...", file=sys.stderr, flush=True)
+            slot.engine.unload()
+            self._on_event(name, "unload", 0.0)
+        self._set_tier(slot, TIER_UNLOADED)
+        slot.engine = None
+
+    def unload_all(self) -> None:
+        for name in list(self._slots):
+            self.unload(name)
+
+    def check_idle(self, offload_timeout: float, idle_timeout: float) -> None:
+        """按各引擎空闲时长逐级降级：offload_timeout 秒后移到内存，idle_timeout 秒后卸载。"""
+        now = time.monotonic()
+        for slot in list(self._slots.values()):
+            idle = now - slot.last_active
+            if slot.tier == TIER_UNLOADED:
+                continue
+            if idle >= idle_timeout:
+                print(f"  [{slot.name}] 空闲超时", file=sys.stderr, flush=True)
+                self.unload(slot.name)
+            elif slot.tier == TIER_LOADED and 0 < offload_timeout <= idle:
+                self.offload(slot.name)
+
+    def snapshot(self) -> list[dict]:
+        """各引擎状态，用于 status 命令。"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": s.name,
+                    "backend": s.stt_config.backend,
+                    "tier": s.tier,
+                    "idle_seconds": round(now - s.last_active, 1),
+                    "memory_mb": round(s.footprint / _MB, 1) if s.tier != TIER_UNLOADED else 0.0,
+                    "loads": s.loads,
+                    "last_load_seconds": round(s.load_seconds, 2),
+                    "default": s.name == self.default,
+                }
+                for s in self._slots.values()
+            ]
@@ -0,0 +1,187 @@
+"""快速启动的瘦客户端 - 只用标准库，让 daemon 常驻录音并转写
+
+热键每按一次都会启动新进程，解释器启动和模块导入直接计入端到端延迟。
+本模块不导入 click / numpy / voxy.config，只从配置文件读取 [daemon]、
+[output]、[commands]、[llm] 中用到的键，通过 daemon 的常驻录音 (daemon.capture)
+完成录音和转写，开启 llm.daemon 时由 daemon 接着润色。daemon 不可用、未开启
+常驻录音，或开启了 AI 润色但不在 daemon 中润色时，回退到完整的 voxy record。
+
+用法：
+    voxy-trigger              # 开始录音，说完自动结束，输出转写结果
+    voxy-trigger --toggle     # 正在录音则结束，否则开始（按一次开始、再按一次结束）
+    python -m voxy.fast -o stdout
+"""
+
+import argparse
+import os
+import sys
+import threading
+import tomllib
+
+from voxy.protocol import connect, recv_message, send_message
+
+# 与 voxy.config.CONFIG_PATH 相同；不用 pathlib，它的导入开销就有十几毫秒
+CONFIG_PATH = os.path.expanduser("~/.config/voxy/config.toml")
+
+
+def _load_config() -> dict:
+    """只解析 TOML，不构建 dataclass；文件不存在时返回空配置。"""
+    try:
+        with open(CONFIG_PATH, "rb") as f:
+            return tomllib.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class _Conn:
+    """到 daemon 的单个连接，请求按 id 区分响应。"""
+
+    def __init__(self, daemon: dict):
+        address = daemon.get("connect") or daemon.get("listen", "")
+        self._sock = connect(address, timeout=2.0, tls_ca=daemon.get("tls_ca", ""))
+        self._send_lock = threading.Lock()
+        self._next_id = 0
+        token = daemon.get("token", "")
+        if token:
+            resp = self.request({"cmd": "auth", "token": token})
+            if not resp.get("ok"):
+                raise PermissionError(resp.get("error", "认证失败"))
+        self._sock.settimeout(None)
+
+    def send(self, header: dict) -> int:
+        with self._send_lock:
+            self._next_id += 1
+            send_message(self._sock, {**header, "id": self._next_id})
+            return self._next_id
+
+    def wait(self, req_id: int) -> dict:
+        """读取响应直到拿到 req_id 对应的那条。"""
+        while True:
+            resp = recv_message(self._sock)
+            if resp.get("id") == req_id:
+                return resp
+
+    def request(self, header: dict) -> dict:
+        return self.wait(self.send(header))
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+def _fallback(args: argparse.Namespace) -> int:
+    """回退到完整 CLI 的 voxy record（替换当前进程）。"""
+    argv = [sys.executable, "-m", "voxy", "record"]
+    if args.output:
+        argv += ["-o", args.output]
+    if args.engine:
+        argv += ["-e", args.engine]
+    os.execv(sys.executable, argv)
+    return 1  # 不会执行到这里
+
+
+def _capture(conn: _Conn, engine: str, polish: bool = False) -> dict:
+    """发送 start_capture 并等待转写结果；终端里按 Enter 提前结束。"""
+    header = {"cmd": "start_capture", "until_silence": True}
+    if engine:
+        header["engine"] = engine
+    if polish:
+        header["polish"] = True
+    req_id = conn.send(header)
+
+    if sys.stdin.isatty():
+        def wait_for_enter():
+            try:
+                input()
+                conn.send({"cmd": "stop_capture"})
+            except (EOFError, OSError):
+                pass
+
+        threading.Thread(target=wait_for_enter, daemon=True).start()
+    print("  录音中... (说完自动结束)", file=sys.stderr, flush=True)
+    return conn.wait(req_id)
+
+
+def _emit(text: str, mode: str, commands: dict, polished: str = "") -> None:
+    """命令匹配（按原文），未匹配时输出润色结果或原文。"""
+    command_map = commands.get("map", {})
+    if command_map:
+        from voxy.commands import match_command
+
+        result = match_command(text, command_map, commands.get("fuzzy_threshold", 0.0))
+        if result:
+            trigger, action = result
+            print(f"  命令匹配: {trigger} → {action}", file=sys.stderr)
+            print(f"CMD:{action}")
+            return
+
+    from voxy.output import output_text
+
+    output_text(polished or text, mode)
+    if polished:
+        # 输出之后再导入 CLI，不计入出字延迟
+        from voxy.cli import _append_history
+
+        _append_history(text, polished)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="voxy-trigger", description="通过 daemon 常驻录音快速听写")
+    parser.add_argument("-o", "--output", choices=["clipboard", "stdout", "type"],
+                        help="输出方式 (默认使用配置文件设置)")
+    parser.add_argument("-e", "--engine", default="", help="STT 引擎名")
+    parser.add_argument("--toggle", action="store_true",
+                        help="daemon 正在录音时结束录音，否则开始录音")
+    args = parser.parse_args(argv)
+
+    config = _load_config()
+    daemon = config.get("daemon", {})
+    llm = config.get("llm", {})
+    polish = bool(llm.get("enabled", False))
+    if polish and not llm.get("daemon", False):
+        return _fallback(args)  # 本进程润色需要完整 CLI
+    try:
+        conn = _Conn(daemon)
+    except (PermissionError, ValueError) as e:  # 认证失败 / 地址或协议错误
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    except OSError:
+        return _fallback(args)
+
+    try:
+        if args.toggle and conn.request({"cmd": "stop_capture"}).get("stopped"):
+            return 0  # 结束了另一个 voxy-trigger 发起的录音，结果由它输出
+        resp = _capture(conn, args.engine, polish)
+    except OSError as e:
+        print(f"守护进程连接中断: {e}", file=sys.stderr)
+        return 1
+    except ValueError as e:  # ProtocolError 等
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    if resp.get("capture") is False:
+        return _fallback(args)
+    if not resp.get("ok"):
+        print(f"转写失败: {resp.get('error', '未知错误')}", file=sys.stderr)
+        return 1
+
+    text = resp.get("text", "")
+    if not text.strip():
+        print("未识别到文字。", file=sys.stderr)
+        return 1
+    print(f"  原始转写: {text}", file=sys.stderr)
+    if "polish_error" in resp:
+        print(f"AI 润色失败 (使用原始文本): {resp['polish_error']}", file=sys.stderr)
+
+    mode = args.output or config.get("output", {}).get("mode", "clipboard")
+    try:
+        _emit(text, mode, config.get("commands", {}), resp.get("polished", ""))
+    except Exception as e:
+        print(f"输出失败: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
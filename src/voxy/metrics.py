@@ -0,0 +1,210 @@
+"""daemon 运行指标 - Prometheus 文本格式的计数器 / 仪表 / 直方图
+
+只依赖标准库。指标通过 daemon 的 metrics 命令 (voxy daemon metrics) 读取，
+设置 daemon.metrics_port 后同时在 127.0.0.1:<port>/metrics 提供 HTTP 抓取。
+"""
+
+import math
+import sys
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+
+# 推理 / 模型加载耗时的直方图分桶 (秒)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 实时率 (推理耗时 / 音频时长) 分桶
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(k, "")) for k in self.labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines += self._samples()
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        """指标的样本行（已持有锁时调用）。"""
+        ...
+
+
+class Counter(_Metric):
+    """只增不减的计数。"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}"
+                for k, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """当前值，抓取时调用 fn 读取（无标签）。"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        super().__init__(name, help)
+        self._fn = fn
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name} {_format_value(self._fn())}"]
+
+
+class Histogram(_Metric):
+    """分桶累计直方图，另有 _sum 与 _count。"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            counts = self._counts.get(self._key(labels))
+            return counts[-1] if counts else 0
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key in sorted(self._counts):
+            counts = self._counts[key]
+            for bound, n in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {n}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """一组指标，render() 输出 Prometheus 文本格式。"""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+class DaemonMetrics(Registry):
+    """STT daemon 的全部指标。"""
+
+    def __init__(self, queue_depth: Callable[[], float] = lambda: 0):
+        super().__init__()
+        self.requests = self.register(Counter(
+            "voxy_requests_total", "转写请求数 (流式转写按分段计)", ("engine",)))
+        self.errors = self.register(Counter(
+            "voxy_request_errors_total", "转写失败的请求数", ("engine",)))
+        self.busy = self.register(Counter(
+            "voxy_busy_rejections_total", "推理队列已满被拒绝的请求数"))
+        self.audio_seconds = self.register(Counter(
+            "voxy_audio_seconds_total", "已转写的音频时长 (秒)", ("engine",)))
+        self.bytes_received = self.register(Counter(
+            "voxy_received_bytes_total", "收到的音频字节数"))
+        self.inference = self.register(Histogram(
+            "voxy_inference_seconds", "每个 batch 的推理耗时 (秒)", ("engine",)))
+        self.rtf = self.register(Histogram(
+            "voxy_real_time_factor", "推理耗时 / 音频时长", ("backend",), RTF_BUCKETS))
+        self.model_loads = self.register(Counter(
+            "voxy_model_loads_total", "模型加载次数", ("engine",)))
+        self.model_load_seconds = self.register(Histogram(
+            "voxy_model_load_seconds", "模型加载耗时 (秒)", ("engine",)))
+        self.model_events = self.register(Counter(
+            "voxy_model_tier_changes_total", "模型驻留层级变化 (offload / restore / unload)",
+            ("engine", "event")))
+        self.polish = self.register(Histogram(
+            "voxy_polish_seconds", "daemon 内 AI 润色耗时 (秒)"))
+        self.polish_errors = self.register(Counter(
+            "voxy_polish_errors_total", "daemon 内 AI 润色失败次数"))
+        self.register(Gauge("voxy_queue_depth", "推理队列中等待的任务数", queue_depth))
+
+
+def serve_http(registry: Registry, port: int, host: str = "127.0.0.1"):
+    """在后台线程提供 GET /metrics，返回 HTTP server（shutdown() 停止）。"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"  指标: http://{host}:{server.server_address[1]}/metrics", file=sys.stderr, flush=True)
+    return server
@@ -4,6 +4,7 @@ import os
 import shutil
 import subprocess
 import sys
+from collections.abc import Iterable
 
 
 def _is_wayland() -> bool:
@@ -56,3 +57,46 @@ def output_text(text: str, mode: str) -> None:
         print("  已输入到焦点窗口。", file=sys.stderr)
     else:
         raise ValueError(f"未知的输出模式: {mode}，支持: clipboard / stdout / type")
+
+
+# 逐句输入时的断句字符：在这些字符之后把已生成的文本交给输入法
+_SENTENCE_END = "。！？；…!?;.\n"
+
+
+def _split_sentences(buffer: str) -> tuple[str, str]:
+    """在最后一个断句字符处切开，返回 (完整句子部分, 剩余部分)。"""
+    cut = max(buffer.rfind(c) for c in _SENTENCE_END) + 1
+    return buffer[:cut], buffer[cut:]
+
+
+def output_stream(pieces: Iterable[str], mode: str) -> str:
+    """边生成边输出流式文本，返回完整文本。
+
+    stdout 逐段写出；type 攒到句末再模拟输入，避免每个 token 启动一次
+    wtype/xdotool；clipboard 需要完整文本，结束后一次复制。
+    """
+    if mode not in ("clipboard", "stdout", "type"):
+        raise ValueError(f"未知的输出模式: {mode}，支持: clipboard / stdout / type")
+
+    parts: list[str] = []
+    if mode == "stdout":
+        for piece in pieces:
+            parts.append(piece)
+            sys.stdout.write(piece)
+            sys.stdout.flush()
+        sys.stdout.write("\n")
+        sys.stdout.flush()
+    elif mode == "type":
+        pending = ""
+        for piece in pieces:
+            parts.append(piece)
+            done, pending = _split_sentences(pending + piece)
+            if done:
+                _type_text(done)
+        _type_text(pending + "\n")
+        print("  已输入到焦点窗口。", file=sys.stderr)
+    else:
+        parts.extend(pieces)
+        _copy_to_clipboard("".join(parts) + "\n")
+        print("  已复制到剪贴板。", file=sys.stderr)
+    return "".join(parts)
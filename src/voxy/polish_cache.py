@@ -0,0 +1,130 @@
+"""润色结果缓存 - 内存 LRU + sqlite 持久化
+
+常说的短语（"好的"、"收到，马上处理"）不必每次都请求 LLM。缓存键是
+(规范化原文, provider, 提示词版本, custom_terms) 的哈希，修改提示词模板
+或自定义词典后旧条目不再命中，按 TTL / 条数自然淘汰。
+
+内存层供 daemon 等常驻进程使用；磁盘层让短命的 CLI 进程之间也能共享。
+只依赖标准库。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from voxy.prompts import PROMPT_VERSION
+
+CACHE_PATH = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "voxy" / "polish.sqlite"
+
+# 内存层条目数
+MEMORY_ENTRIES = 256
+
+
+def normalize(text: str) -> str:
+    """去掉首尾空白，连续空白折叠为一个空格。"""
+    return " ".join(text.split())
+
+
+def cache_key(raw_text: str, provider: str, custom_terms: dict[str, str] | None = None) -> str:
+    payload = json.dumps(
+        [normalize(raw_text), provider, PROMPT_VERSION, sorted((custom_terms or {}).items())],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PolishCache:
+    """两级缓存。磁盘层超过 max_entries 条时按最近使用时间淘汰，超过 ttl 秒的条目视为过期。
+
+    path 为空时只用内存层。可在多个线程间共享，多个进程可同时读写同一文件。
+    """
+
+    def __init__(self, path: str | Path = "", max_entries: int = 5000, ttl: float = 30 * 86400,
+                 memory_entries: int = MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if path:
+            path = Path(path).expanduser()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), timeout=5, check_same_thread=False,
+                                       isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS polish ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                "created REAL NOT NULL, used REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                value, created = hit
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    return value
+                del self._memory[key]
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT value, created FROM polish WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if now - created > self.ttl:
+                self._db.execute("DELETE FROM polish WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE polish SET used = ? WHERE key = ?", (now, key))
+            self._remember(key, value, created)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO polish (key, value, created, used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._db.execute(
+                "DELETE FROM polish WHERE created < ? OR key IN "
+                "(SELECT key FROM polish ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (now - self.ttl, self.max_entries),
+            )
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._db is None:
+                return len(self._memory)
+            return self._db.execute("SELECT COUNT(*) FROM polish").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM polish")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -1,138 +1,797 @@
-"""AI 文本处理模块"""
+"""AI 文本处理模块
 
+每个模型是一个 Provider（Ollama 直连或 litellm），各自带 Transport：代理、
+超时与重试作为参数传给每次调用，不修改进程环境变量，可多线程并发使用。
+HTTP 连接按 (api_base, proxy, trust_env) 在进程内复用（keep-alive，装了 h2
+时启用 HTTP/2），润色请求不再每次重新握手。录音开始时 prewarm() 在后台
+建立连接、导入 litellm，与用户说话重叠。process_text_stream() 边生成边
+产出文本，配合 output.output_stream() 逐句输出。润色结果按
+(原文, provider, 提示词版本, custom_terms) 缓存，命中时不发请求。
+llm.hedge 开启时同时请求 provider 与 long_provider，取先返回的合格结果。
+超过 llm.chunk_chars 的长文本按句切段并行润色，按原顺序拼接。
+"""
+
+import importlib.util
+import json
 import os
+import queue
+import re
+import socket
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field, replace
+from functools import cached_property, lru_cache
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
 
 from voxy.config import LLMConfig
 from voxy.prompts import format_prompt
 
-
-def _process_ollama(system_prompt: str, user_prompt: str, provider: str,
-                    api_base: str, api_key: str = "", proxy: str = "") -> str:
-    """直接调用 Ollama API，跳过 litellm 中间层。支持本地和云端。"""
+if TYPE_CHECKING:
     import httpx
-    from urllib.parse import urlparse
 
-    # provider 格式: "ollama/model_name"
-    model = provider.split("/", 1)[1]
+    from voxy.polish_cache import PolishCache
+
+_clients: dict[tuple[str, str, bool], "httpx.Client"] = {}
+# 竞速 (llm.hedge) 专用的空闲连接，按 Provider 分组
+_race_clients: dict["Provider", list["_RaceClient"]] = {}
+_clients_lock = threading.Lock()
+_litellm = None
+_litellm_lock = threading.Lock()
+_cache: "PolishCache | None" = None
+_cache_lock = threading.Lock()
 
-    headers = {}
-    if api_key:
-        headers["Authorization"] = f"Bearer {api_key}"
 
-    # 本地地址不走代理；云端地址使用配置的代理或环境变量
+def _is_local(api_base: str) -> bool:
     host = urlparse(api_base).hostname or ""
-    is_local = host in ("localhost", "127.0.0.1", "::1")
-
-    # 云端模型 (如 :cloud) 响应较慢，需要更长超时
-    timeout = 180.0 if ":cloud" in model else 60.0
-    client_kwargs: dict = {"timeout": timeout}
-    if is_local:
-        client_kwargs["trust_env"] = False
-    elif proxy:
-        client_kwargs["proxy"] = proxy
-
-    with httpx.Client(**client_kwargs) as client:
-        resp = client.post(
-            f"{api_base}/api/chat",
-            headers=headers,
-            json={
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                "stream": False,
-                "think": False,
-                "options": {"temperature": 0.3},
-            },
-        )
-    resp.raise_for_status()
-    return resp.json()["message"]["content"]
+    return host in ("localhost", "127.0.0.1", "::1")
+
 
+def get_client(api_base: str, proxy: str = "") -> "httpx.Client":
+    """返回复用的 httpx.Client，按 (api_base, proxy, trust_env) 区分。
 
-def _process_litellm(system_prompt: str, user_prompt: str, provider: str,
-                     api_base: str, api_key: str, proxy: str) -> str:
-    """通过 litellm 调用（云端模型等非 ollama 场景）。"""
-    import logging
+    本地地址不走代理；云端地址使用配置的代理，未配置时读取环境变量。
+    超时按请求指定，不区分客户端。
+    """
+    import httpx
 
-    os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "true")
+    local = _is_local(api_base)
+    key = (api_base, "" if local else proxy, not local)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            kwargs: dict = {
+                "trust_env": key[2],
+                "limits": httpx.Limits(max_keepalive_connections=8, keepalive_expiry=300),
+                "http2": importlib.util.find_spec("h2") is not None,
+            }
+            if key[1]:
+                kwargs["proxy"] = key[1]
+            client = _clients[key] = httpx.Client(**kwargs)
+        return client
 
-    import litellm
 
-    litellm.suppress_debug_info = True
-    litellm.drop_params = True
-    logging.getLogger("LiteLLM").setLevel(logging.CRITICAL)
-    logging.getLogger("litellm").setLevel(logging.CRITICAL)
+def close_clients() -> None:
+    """关闭所有复用的连接。"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        clients += [rc for idle in _race_clients.values() for rc in idle]
+        _race_clients.clear()
+    for client in clients:
+        client.close()
 
-    kwargs = {}
-    if api_base and "localhost" not in api_base and "127.0.0.1" not in api_base:
-        kwargs["api_base"] = api_base
-    if api_key:
-        kwargs["api_key"] = api_key
 
-    # 设置代理（SOCKS5 等）
-    old_proxy = os.environ.get("HTTPS_PROXY")
-    old_all_proxy = os.environ.get("ALL_PROXY")
-    if proxy:
-        os.environ["HTTPS_PROXY"] = proxy
-        os.environ["ALL_PROXY"] = proxy
+class _RaceClient:
+    """竞速中一路独占的 httpx.Client，最多一条连接，记录该连接的 socket。
 
-    try:
-        response = litellm.completion(
-            model=provider,
-            messages=[
+    关闭 httpx 响应只会 close() socket，读取线程阻塞在 recv 上（例如还在等
+    首个 token）时连接并不会断开；abort() 直接 shutdown()，对端立即看到断开。
+    abort 之后这一路不再发起请求（包括重试），用完即关闭，不放回空闲列表。
+    """
+
+    def __init__(self):
+        self._http: "httpx.Client | None" = None
+        self._sock: socket.socket | None = None
+        self._lock = threading.Lock()
+        self._aborted = False
+        self._busy = False
+
+    def client(self, api_base: str, proxy: str) -> "httpx.Client":
+        if self._http is None:
+            import httpx
+
+            local = _is_local(api_base)
+            kwargs: dict = {
+                "trust_env": not local,
+                "limits": httpx.Limits(max_connections=1, keepalive_expiry=300),
+                "http2": importlib.util.find_spec("h2") is not None,
+                "event_hooks": {"request": [self._attach]},
+            }
+            if proxy and not local:
+                kwargs["proxy"] = proxy
+            self._http = httpx.Client(**kwargs)
+        return self._http
+
+    def _attach(self, request: "httpx.Request") -> None:
+        if self._aborted:
+            raise RuntimeError("竞速已结束")
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event: str, info: dict) -> None:
+        # 新建连接时记下 socket（经代理时是到代理的连接）
+        if event.endswith("connect_tcp.complete"):
+            with self._lock:
+                self._sock = info["return_value"].get_extra_info("socket")
+                if self._aborted:
+                    self._shutdown()
+
+    def _shutdown(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def abort(self) -> None:
+        """断开这一路的连接。已归还的客户端不受影响。"""
+        with self._lock:
+            if self._busy:
+                self._aborted = True
+                self._shutdown()
+
+    def close(self) -> None:
+        if self._http is not None:
+            self._http.close()
+
+
+def _checkout_race_client(provider: "Provider") -> _RaceClient:
+    with _clients_lock:
+        idle = _race_clients.get(provider)
+        rc = idle.pop() if idle else _RaceClient()
+    rc._busy = True
+    return rc
+
+
+def _race_provider(provider: "Provider", rc: _RaceClient) -> "Provider":
+    """provider 的副本，请求走 rc 的独占连接。"""
+    return replace(provider, transport=replace(provider.transport, race=rc))
+
+
+def _release_race_client(provider: "Provider", rc: _RaceClient) -> None:
+    with rc._lock:
+        rc._busy = False
+        aborted = rc._aborted
+    if aborted:
+        rc.close()
+        return
+    with _clients_lock:
+        _race_clients.setdefault(provider, []).append(rc)
+
+
+def get_cache(config: LLMConfig) -> "PolishCache | None":
+    """返回进程内共享的润色缓存，llm.cache 关闭时返回 None。"""
+    global _cache
+    if not config.cache:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            from voxy.polish_cache import CACHE_PATH, PolishCache
+
+            _cache = PolishCache(CACHE_PATH, max_entries=config.cache_size,
+                                 ttl=config.cache_ttl_days * 86400)
+        return _cache
+
+
+def _get_litellm():
+    """导入并配置 litellm（每个进程只做一次）。"""
+    global _litellm
+    with _litellm_lock:
+        if _litellm is None:
+            import logging
+
+            os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "true")
+
+            import litellm
+
+            litellm.suppress_debug_info = True
+            litellm.drop_params = True
+            logging.getLogger("LiteLLM").setLevel(logging.CRITICAL)
+            logging.getLogger("litellm").setLevel(logging.CRITICAL)
+            _litellm = litellm
+        return _litellm
+
+
+# ── Provider 与传输配置 ────────────────────────────────────
+
+# 重试前的等待（秒），之后每次翻倍
+_RETRY_BACKOFF_S = 0.2
+
+
+def _retryable(exc: Exception) -> bool:
+    """连接失败、超时、限流 (429) 和服务端错误 (5xx) 可以重试。"""
+    import httpx
+
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    elif isinstance(exc, httpx.TransportError):
+        return True
+    else:
+        # openai / litellm 的异常带 status_code，连接类异常没有
+        status = getattr(exc, "status_code", None)
+        if not isinstance(status, int):
+            return type(exc).__name__ in ("APIConnectionError", "APITimeoutError", "Timeout")
+    return status == 429 or status >= 500
+
+
+@dataclass(frozen=True)
+class Transport:
+    """一个 provider 的传输配置：代理、超时、重试。
+
+    只作为参数传给各次调用，不修改 HTTPS_PROXY 等进程环境变量，多个线程可以
+    同时使用不同代理。连接取自 get_client 的连接池。
+    """
+
+    proxy: str = ""
+    timeout: float = 60.0
+    retries: int = 1
+    # 竞速中的一路使用独占连接而不是连接池
+    race: _RaceClient | None = field(default=None, compare=False, repr=False)
+
+    def client(self, api_base: str) -> "httpx.Client":
+        if self.race is not None:
+            return self.race.client(api_base, self.proxy)
+        return get_client(api_base, self.proxy)
+
+    def call(self, fn: Callable[[], str]) -> str:
+        """调用 fn，可重试的错误最多重试 retries 次。"""
+        for attempt in range(self.retries + 1):
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.retries or not _retryable(e):
+                    raise
+            time.sleep(_RETRY_BACKOFF_S * 2 ** attempt)
+        raise AssertionError("unreachable")
+
+    def stream(self, open_stream: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """流式调用：只在产出第一段之前失败时重试，之后的错误直接抛出。"""
+        for attempt in range(self.retries + 1):
+            started = False
+            pieces = open_stream()
+            try:
+                for piece in pieces:
+                    started = True
+                    yield piece
+                return
+            except Exception as e:
+                if started or attempt >= self.retries or not _retryable(e):
+                    raise
+            finally:
+                pieces.close()
+            time.sleep(_RETRY_BACKOFF_S * 2 ** attempt)
+
+
+@dataclass(frozen=True)
+class Provider(ABC):
+    """一个润色模型：provider 字符串（如 "ollama/qwen2.5:3b"、"gemini/gemini-2.5-flash"）、
+    地址、密钥与传输配置。不可变，可在线程间共享。"""
+
+    name: str
+    api_base: str = ""
+    api_key: str = ""
+    transport: Transport = field(default_factory=Transport)
+    keep_alive: str = ""
+
+    @abstractmethod
+    def complete(self, system_prompt: str, user_prompt: str) -> str:
+        """一次性返回完整回复。"""
+        ...
+
+    @abstractmethod
+    def stream(self, system_prompt: str, user_prompt: str) -> Iterator[str]:
+        """逐段返回回复文本。"""
+        ...
+
+    def warm(self) -> None:
+        """预先建立连接 / 完成导入。"""
+
+
+class OllamaProvider(Provider):
+    """直接调用 Ollama API，跳过 litellm 中间层。支持本地和云端。
+
+    keep_alive 非空时让 Ollama 在请求后保持模型驻留（如 "30m"，"-1" 为常驻）。
+    """
+
+    def _request(self, system_prompt: str, user_prompt: str,
+                 stream: bool) -> tuple[str, dict, dict]:
+        """返回 (url, headers, body)。"""
+        headers = {}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        body = {
+            # provider 格式: "ollama/model_name"
+            "model": self.name.split("/", 1)[1],
+            "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
             ],
-            temperature=0.3,
-            max_tokens=2048,
-            **kwargs,
+            "stream": stream,
+            "think": False,
+            "options": {"temperature": 0.3},
+        }
+        if self.keep_alive:
+            body["keep_alive"] = self.keep_alive
+        return f"{self.api_base}/api/chat", headers, body
+
+    def complete(self, system_prompt: str, user_prompt: str) -> str:
+        url, headers, body = self._request(system_prompt, user_prompt, stream=False)
+
+        def _post() -> str:
+            resp = self.transport.client(self.api_base).post(
+                url, headers=headers, json=body, timeout=self.transport.timeout,
+            )
+            resp.raise_for_status()
+            return resp.json()["message"]["content"]
+
+        return self.transport.call(_post)
+
+    def stream(self, system_prompt: str, user_prompt: str) -> Iterator[str]:
+        """响应为逐行 JSON，每行带一段增量文本。"""
+        url, headers, body = self._request(system_prompt, user_prompt, stream=True)
+
+        def _open() -> Iterator[str]:
+            with self.transport.client(self.api_base).stream(
+                "POST", url, headers=headers, json=body, timeout=self.transport.timeout,
+            ) as resp:
+                resp.raise_for_status()
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(data["error"])
+                    # 读完整个响应（最后一行 done=true），连接才能放回连接池复用
+                    piece = data.get("message", {}).get("content", "")
+                    if piece:
+                        yield piece
+
+        return self.transport.stream(_open)
+
+    def warm(self) -> None:
+        # 建立并保持到 Ollama 的连接
+        self.transport.client(self.api_base).get(f"{self.api_base}/api/version", timeout=3.0)
+
+
+class LiteLLMProvider(Provider):
+    """通过 litellm 调用（云端模型等非 ollama 场景）。
+
+    代理通过每次调用传入的 client 生效：OpenAI 兼容的后端用 openai SDK 客户端，
+    其余后端用 litellm 的 HTTPHandler，底层都是连接池中带代理的 httpx.Client。
+    """
+
+    @property
+    def _api_base(self) -> str:
+        # 默认配置的 api_base 指向本地 Ollama，对云端 provider 无意义
+        return "" if _is_local(self.api_base) else self.api_base
+
+    @cached_property
+    def _client(self):
+        litellm = _get_litellm()
+        _, backend, dynamic_key, dynamic_base = litellm.get_llm_provider(
+            self.name, api_base=self._api_base or None, api_key=self.api_key or None,
         )
-    finally:
-        if proxy:
-            if old_proxy is None:
-                os.environ.pop("HTTPS_PROXY", None)
-            else:
-                os.environ["HTTPS_PROXY"] = old_proxy
-            if old_all_proxy is None:
-                os.environ.pop("ALL_PROXY", None)
-            else:
-                os.environ["ALL_PROXY"] = old_all_proxy
-
-    return response.choices[0].message.content
-
-
-def _call_llm(system_prompt: str, user_prompt: str, provider: str,
-              api_base: str, api_key: str, proxy: str) -> str:
-    """根据 provider 类型选择调用方式。"""
-    if provider.startswith("ollama/"):
-        return _process_ollama(system_prompt, user_prompt, provider, api_base, api_key, proxy)
-    else:
-        return _process_litellm(system_prompt, user_prompt, provider, api_base, api_key, proxy)
+        base = self._api_base or dynamic_base or ""
+        http = self.transport.client(base or f"https://{backend}")
+        if backend == "openai" or backend in litellm.openai_compatible_providers:
+            import openai
+
+            env_key = os.environ.get("OPENAI_API_KEY", "") if backend == "openai" else ""
+            return openai.OpenAI(
+                api_key=self.api_key or dynamic_key or env_key,
+                base_url=base or None,
+                http_client=http,
+                max_retries=0,  # 重试由 Transport 负责
+                timeout=self.transport.timeout,
+            )
+        from litellm.llms.custom_httpx.http_handler import HTTPHandler
+
+        return HTTPHandler(client=http, timeout=self.transport.timeout)
+
+    def _kwargs(self, system_prompt: str, user_prompt: str) -> dict:
+        kwargs = {
+            "model": self.name,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "temperature": 0.3,
+            "max_tokens": 2048,
+            "timeout": self.transport.timeout,
+            "client": self._client,
+        }
+        if self._api_base:
+            kwargs["api_base"] = self._api_base
+        if self.api_key:
+            kwargs["api_key"] = self.api_key
+        return kwargs
+
+    def complete(self, system_prompt: str, user_prompt: str) -> str:
+        litellm = _get_litellm()
+        kwargs = self._kwargs(system_prompt, user_prompt)
+        return self.transport.call(
+            lambda: litellm.completion(**kwargs).choices[0].message.content
+        )
+
+    def stream(self, system_prompt: str, user_prompt: str) -> Iterator[str]:
+        """产出每个 chunk 的增量文本。"""
+        litellm = _get_litellm()
+        kwargs = self._kwargs(system_prompt, user_prompt)
+
+        def _open() -> Iterator[str]:
+            for chunk in litellm.completion(**kwargs, stream=True):
+                piece = chunk.choices[0].delta.content if chunk.choices else None
+                if piece:
+                    yield piece
+
+        return self.transport.stream(_open)
+
+    def warm(self) -> None:
+        _get_litellm()
+        self._client
+
+
+@lru_cache(maxsize=16)
+def make_provider(name: str, api_base: str = "", api_key: str = "", proxy: str = "",
+                  keep_alive: str = "", timeout: float = 0, retries: int = 1) -> Provider:
+    """按 provider 字符串创建 Provider。相同参数返回同一实例（复用其客户端）。
+
+    timeout 为 0 时自动选择：本地 Ollama 模型 60 秒，云端模型（含 Ollama :cloud）180 秒。
+    """
+    ollama = name.startswith("ollama/")
+    if not timeout:
+        # 云端模型响应较慢，需要更长超时
+        timeout = 60.0 if ollama and ":cloud" not in name else 180.0
+    cls = OllamaProvider if ollama else LiteLLMProvider
+    return cls(name, api_base, api_key, Transport(proxy, timeout, retries), keep_alive)
+
+
+def _providers(config: LLMConfig) -> list[Provider]:
+    """[短文本模型] 或 [短文本模型, 长文本模型]。"""
+    providers = [make_provider(config.provider, config.api_base, config.api_key, config.proxy,
+                               config.keep_alive, config.timeout, config.retries)]
+    if config.long_provider:
+        providers.append(make_provider(
+            config.long_provider, config.long_api_base, config.long_api_key, config.long_proxy,
+            config.keep_alive, config.timeout, config.retries,
+        ))
+    return providers
+
+
+def _select_provider(raw_text: str, config: LLMConfig) -> Provider:
+    """按文本长度选择模型。"""
+    providers = _providers(config)
+    # 长文本且配置了大模型 → 切换到大模型
+    if len(providers) > 1 and len(raw_text) > config.long_threshold:
+        return providers[1]
+    return providers[0]
+
+
+def prewarm(config: LLMConfig) -> threading.Thread:
+    """后台预热润色用到的连接 / litellm 导入，返回预热线程。"""
+    providers = _providers(config)
+    hedge = config.hedge and bool(config.long_provider)
+
+    def _run():
+        for provider in providers:
+            try:
+                provider.warm()
+                if hedge:
+                    # 竞速用独占连接，同样预先建立
+                    rc = _checkout_race_client(provider)
+                    try:
+                        _race_provider(provider, rc).warm()
+                    finally:
+                        _release_race_client(provider, rc)
+            except Exception as e:
+                print(f"  LLM 预热失败: {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _strip_stream(pieces: Iterator[str]) -> Iterator[str]:
+    """流式版的 str.strip()：丢弃开头空白，末尾空白等后续有内容时才产出。"""
+    started = False
+    held = ""
+    for piece in pieces:
+        if not started:
+            piece = piece.lstrip()
+            if not piece:
+                continue
+            started = True
+        body = piece.rstrip()
+        if body:
+            yield held + body
+            held = piece[len(body):]
+        else:
+            held += piece
 
 
 def process_text(raw_text: str, config: LLMConfig) -> str:
     """用 LLM 润色语音转写文本。短文本用本地模型，长文本用大模型。"""
     if not raw_text.strip():
         return raw_text
+    if config.hedge and config.long_provider:
+        return _process_hedged(raw_text, config)
 
-    system_prompt, user_prompt = format_prompt(raw_text, config.custom_terms)
+    provider = _select_provider(raw_text, config)
+    cache = get_cache(config)
+    if cache is not None:
+        from voxy.polish_cache import cache_key
 
-    # 长文本且配置了大模型 → 切换到大模型
-    use_long = (config.long_provider
-                and len(raw_text) > config.long_threshold)
-
-    if use_long:
-        provider = config.long_provider
-        api_base = config.long_api_base
-        api_key = config.long_api_key
-        proxy = config.long_proxy
+        key = cache_key(raw_text, provider.name, config.custom_terms)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    if _chunked(raw_text, config):
+        result = "".join(_iter_chunked(raw_text, config, provider)).strip()
+    else:
+        system_prompt, user_prompt = format_prompt(raw_text, config.custom_terms)
+        result = provider.complete(system_prompt, user_prompt)
+        result = result.strip() if result else ""
+    if not result:
+        return raw_text
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+
+def process_text_stream(raw_text: str, config: LLMConfig) -> Iterator[str]:
+    """流式润色：边生成边产出增量文本（首尾空白已去除）。
+
+    空文本不产出任何内容。模型选择与 process_text 相同。
+    """
+    if not raw_text.strip():
+        return
+    if config.hedge and config.long_provider:
+        # 竞速需要完整结果才能判断是否合格，整段产出
+        yield _process_hedged(raw_text, config)
+        return
+    provider = _select_provider(raw_text, config)
+    cache = get_cache(config)
+    if cache is not None:
+        from voxy.polish_cache import cache_key
+
+        key = cache_key(raw_text, provider.name, config.custom_terms)
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    if _chunked(raw_text, config):
+        # 各段并行润色，按顺序逐段产出
+        pieces = _iter_chunked(raw_text, config, provider)
     else:
-        provider = config.provider
-        api_base = config.api_base
-        api_key = config.api_key
-        proxy = config.proxy
+        system_prompt, user_prompt = format_prompt(raw_text, config.custom_terms)
+        pieces = provider.stream(system_prompt, user_prompt)
+    parts = []
+    for piece in _strip_stream(pieces):
+        parts.append(piece)
+        yield piece
+    # 完整生成后才写入缓存，中途失败的结果不缓存
+    if cache is not None and parts:
+        cache.put(key, "".join(parts))
+
+
+# ── 分段润色 (llm.chunk_chars) ─────────────────────────────
+
+# 英文句点后须跟空白，避免切开 "3.12"
+_SENTENCE_RE = re.compile(r".+?(?:[。！？!?；;…\n]+|\.(?=\s|$)|$)", re.S)
+_CLAUSE_RE = re.compile(r".+?(?:[，,、：:]+|$)", re.S)
+# 每段附带的上文长度（字）
+_CONTEXT_CHARS = 60
+
 
-    result = _call_llm(system_prompt, user_prompt, provider, api_base, api_key, proxy)
+def _pieces(text: str, pattern: re.Pattern, max_chars: int) -> list[str]:
+    """按 pattern 切成小块，超过 max_chars 的块先按分句再硬切。"""
+    out: list[str] = []
+    for piece in pattern.findall(text):
+        if len(piece) <= max_chars:
+            out.append(piece)
+        elif pattern is _SENTENCE_RE:
+            out.extend(_pieces(piece, _CLAUSE_RE, max_chars))
+        else:
+            out.extend(piece[i:i + max_chars] for i in range(0, len(piece), max_chars))
+    return out
 
-    return result.strip() if result else raw_text
+
+def split_chunks(text: str, max_chars: int) -> list[str]:
+    """在句子边界把文本切成不超过 max_chars 字的段，段内句子保持原样。
+
+    "".join(split_chunks(text, n)) == text。单句超长时退而在逗号处切，再不行硬切。
+    """
+    chunks: list[str] = []
+    current = ""
+    for piece in _pieces(text, _SENTENCE_RE, max_chars):
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _joiner(raw_chunk: str, left: str, right: str) -> str:
+    """相邻两段润色结果之间的分隔：原文此处换行则换行，两侧都是英文数字则加空格。"""
+    if raw_chunk.rstrip(" \t").endswith("\n"):
+        return "\n"
+    if left and right and left[-1].isascii() and right[0].isascii():
+        return " "
+    return ""
+
+
+def _chunked(raw_text: str, config: LLMConfig) -> bool:
+    return config.chunk_chars > 0 and len(raw_text) > config.chunk_chars
+
+
+def _polish_chunk(chunk: str, context: str, config: LLMConfig, provider: Provider) -> str:
+    system_prompt, user_prompt = format_prompt(chunk.strip(), config.custom_terms, context)
+    try:
+        result = (provider.complete(system_prompt, user_prompt) or "").strip()
+    except Exception as e:
+        print(f"  分段润色失败 (该段使用原始文本): {e}", file=sys.stderr)
+        result = ""
+    return result or chunk.strip()
+
+
+def _iter_chunked(raw_text: str, config: LLMConfig, provider: Provider) -> Iterator[str]:
+    """切段后最多 chunk_parallel 路并行润色，按原顺序产出（含段间分隔）。
+
+    每段附带上一段原文的结尾作为上文。单段失败时该段保留原文。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    chunks = split_chunks(raw_text, config.chunk_chars)
+    executor = ThreadPoolExecutor(max_workers=max(1, config.chunk_parallel),
+                                  thread_name_prefix="voxy-polish")
+    try:
+        futures = [
+            executor.submit(_polish_chunk, chunk,
+                            chunks[i - 1].strip()[-_CONTEXT_CHARS:] if i else "", config, provider)
+            for i, chunk in enumerate(chunks)
+        ]
+        previous = ""
+        for i, future in enumerate(futures):
+            text = future.result()
+            if i:
+                yield _joiner(chunks[i - 1], previous, text)
+            yield text
+            previous = text
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# ── 竞速润色 (llm.hedge) ──────────────────────────────────
+
+
+def _acceptable(raw_text: str, result: str) -> bool:
+    """粗略判断结果是否可用：非空，且没有比原文长出太多（模型在解释而不是编辑）。"""
+    return 0 < len(result) <= 2 * len(raw_text) + 20
+
+
+def _race_one(slot: int, system_prompt: str, user_prompt: str, raw_text: str,
+              provider: Provider, rc: _RaceClient, cancel: threading.Event,
+              results: queue.Queue) -> None:
+    """竞速中的一路：经 rc 的独占连接流式读取。cancel 置位后退出；
+    协调线程对 rc 调用 abort() 时连接被断开，阻塞中的读取随即出错返回。"""
+    start = time.perf_counter()
+    outcome: dict = {"provider": provider.name}
+    parts: list[str] = []
+    pieces = _race_provider(provider, rc).stream(system_prompt, user_prompt)
+    try:
+        for piece in pieces:
+            if cancel.is_set():
+                outcome["cancelled"] = True
+                break
+            parts.append(piece)
+    except Exception as e:
+        if cancel.is_set():
+            outcome["cancelled"] = True
+        else:
+            outcome["error"] = str(e)
+    finally:
+        pieces.close()
+        _release_race_client(provider, rc)
+    text = "".join(parts).strip()
+    outcome["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    outcome["ok"] = ("error" not in outcome and "cancelled" not in outcome
+                     and _acceptable(raw_text, text))
+    outcome["chars"] = len(text)
+    results.put((slot, outcome, text))
+
+
+def _log_hedge(path: str, record: dict) -> None:
+    from voxy.timing import append_jsonl
+
+    try:
+        append_jsonl(path, record)
+    except OSError as e:
+        print(f"  写入竞速记录失败: {e}", file=sys.stderr)
+
+
+def _process_hedged(raw_text: str, config: LLMConfig) -> str:
+    """同时请求 provider 与 long_provider，返回先到的合格结果，取消另一路。
+
+    hedge_budget_ms 内没有合格结果时抛出 TimeoutError（调用方回退到原文）。
+    每次竞速的结果写入 hedge_log，用于据实调整 long_threshold。
+    """
+    providers = _providers(config)
+    names = [p.name for p in providers]
+    cache = get_cache(config)
+    if cache is not None:
+        from voxy.polish_cache import cache_key
+
+        for name in names:
+            cached = cache.get(cache_key(raw_text, name, config.custom_terms))
+            if cached is not None:
+                return cached
+
+    system_prompt, user_prompt = format_prompt(raw_text, config.custom_terms)
+    cancel = threading.Event()
+    results: queue.Queue = queue.Queue()
+    slots = [_checkout_race_client(provider) for provider in providers]
+    for i, (provider, rc) in enumerate(zip(providers, slots)):
+        threading.Thread(
+            target=_race_one,
+            args=(i, system_prompt, user_prompt, raw_text, provider, rc, cancel, results),
+            daemon=True,
+        ).start()
+
+    start = time.perf_counter()
+    deadline = start + config.hedge_budget_ms / 1000
+    # 按竞速位置记录：provider 与 long_provider 相同时名字会重复
+    outcomes: dict[int, dict] = {}
+    winner = None
+    while len(outcomes) < len(providers):
+        try:
+            slot, outcome, text = results.get(timeout=max(0.0, deadline - time.perf_counter()))
+        except queue.Empty:
+            break
+        outcomes[slot] = outcome
+        if outcome["ok"]:
+            winner = (outcome["provider"], text)
+            break
+    cancel.set()
+    for i, rc in enumerate(slots):
+        if i not in outcomes:
+            rc.abort()
+
+    elapsed = round((time.perf_counter() - start) * 1000, 1)
+    if config.hedge_log:
+        for i, name in enumerate(names):
+            # 尚未返回的一路记为 pending，ms 为截至决出胜负时已等待的时间
+            outcomes.setdefault(i, {"provider": name, "pending": True, "ms": elapsed})
+        _log_hedge(config.hedge_log, {
+            "ts": round(time.time(), 3),
+            "chars": len(raw_text),
+            "threshold": config.long_threshold,
+            "winner": winner[0] if winner else None,
+            "ms": elapsed,
+            "outcomes": [outcomes[i] for i in range(len(names))],
+        })
+
+    if winner is None:
+        errors = "; ".join(f"{o['provider']}: {o['error']}" for o in outcomes.values() if o.get("error"))
+        raise TimeoutError(
+            f"{config.hedge_budget_ms} ms 内没有合格的润色结果" + (f" ({errors})" if errors else "")
+        )
+    name, text = winner
+    if cache is not None:
+        cache.put(cache_key(raw_text, name, config.custom_terms), text)
+    return text
@@ -1,5 +1,8 @@
 """LLM 提示词模板"""
 
+import hashlib
+from functools import lru_cache
+
 SYSTEM_PROMPT = """\
 你是语音转写校对编辑器。将语音识别的口语文本转为规范的书面语。
 
@@ -29,6 +32,14 @@ SYSTEM_PROMPT = """\
 
 USER_PROMPT_TEMPLATE = "输入：{text}\n输出："
 
+# 分段润色时附带上一段的结尾，帮助模型衔接语境
+CONTEXT_TEMPLATE = "上文（仅供参考，不要输出）：{context}\n"
+
+# 提示词版本：修改模板后润色缓存自动失效
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT + USER_PROMPT_TEMPLATE + CONTEXT_TEMPLATE).encode("utf-8")
+).hexdigest()[:16]
+
 
 def _build_terms_section(custom_terms: dict[str, str]) -> str:
     """将自定义词典构建为提示词片段。"""
@@ -38,14 +49,26 @@ def _build_terms_section(custom_terms: dict[str, str]) -> str:
     return f"\n自定义纠正词典（优先级最高）：{mappings}\n"
 
 
+@lru_cache(maxsize=8)
+def _system_prompt(terms: tuple[tuple[str, str], ...]) -> str:
+    """按自定义词典生成 system prompt。结果缓存，词典不变时每次返回同一字符串。"""
+    if not terms:
+        return SYSTEM_PROMPT
+    return SYSTEM_PROMPT.replace(
+        "只输出编辑后的文本",
+        _build_terms_section(dict(terms)) + "只输出编辑后的文本",
+    )
+
+
 def format_prompt(
-    raw_text: str, custom_terms: dict[str, str] | None = None
+    raw_text: str, custom_terms: dict[str, str] | None = None, context: str = ""
 ) -> tuple[str, str]:
-    """返回 (system_prompt, user_prompt) 元组。"""
-    system = SYSTEM_PROMPT
-    if custom_terms:
-        system = system.replace(
-            "只输出编辑后的文本",
-            _build_terms_section(custom_terms) + "只输出编辑后的文本",
-        )
-    return system, USER_PROMPT_TEMPLATE.format(text=raw_text)
+    """返回 (system_prompt, user_prompt) 元组。context 为分段润色时的上文。
+
+    system prompt 只取决于词典，放在最前面且保持不变，便于模型复用前缀缓存。
+    """
+    system = _system_prompt(tuple((custom_terms or {}).items()))
+    user = USER_PROMPT_TEMPLATE.format(text=raw_text)
+    if context:
+        user = CONTEXT_TEMPLATE.format(context=context) + user
+    return system, user
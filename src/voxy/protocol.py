@@ -0,0 +1,239 @@
+"""Daemon 通信协议 - 长度前缀 JSON header + 二进制音频 payload
+
+消息格式：[4 bytes 长度][JSON header][payload]
+
+header 中 "v" 为协议版本，"id" 为请求 ID（响应原样带回，用于同一连接上
+多路复用），"length" 为紧随其后的 payload 字节数，"dtype" 声明音频编码
+（float32 / int16 PCM）。一个连接可以连续发送任意多条消息。
+
+v1 客户端不带 length，以关闭写端 (EOF) 表示音频结束，服务端仍兼容。
+
+传输层支持 Unix socket（默认）、tcp://host:port 和 tls://host:port，
+帧格式完全相同。设置了 token 时，连接上的第一条消息必须是 auth。
+
+本模块只在编解码音频时才导入 numpy，控制命令（ping/status/录音控制）只用标准库。
+"""
+
+import json
+import os
+import socket
+import struct
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+PROTOCOL_VERSION = 3
+
+# 音频编码 → numpy dtype 名
+AUDIO_DTYPES = {
+    "float32": "float32",
+    "int16": "int16",
+}
+
+_LEN = struct.Struct(">I")
+
+# JSON header 上限。长度前缀在认证之前就会被读取，不设上限时一个 4 字节的包
+# 就能让对端按声明长度分配内存
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class ProtocolError(ValueError):
+    """协议格式错误（未知编码、长度不合法等）。"""
+
+
+def get_socket_path() -> str:
+    """返回默认的 daemon Unix socket 路径。"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR", f"/run/user/{os.getuid()}")
+    sock_dir = os.path.join(runtime_dir, "voxy")
+    os.makedirs(sock_dir, exist_ok=True)
+    return os.path.join(sock_dir, "stt.sock")
+
+
+def parse_address(address: str) -> tuple[str, str | tuple[str, int]]:
+    """解析 daemon 地址。
+
+    "" → 默认 Unix socket；unix:///path → Unix socket；
+    tcp://host:port / tls://host:port → TCP（tls 额外启用 TLS）。
+
+    Returns:
+        (scheme, Unix 路径或 (host, port))
+    """
+    if not address:
+        return "unix", get_socket_path()
+    scheme, sep, rest = address.partition("://")
+    if not sep:
+        raise ValueError(f"无效的 daemon 地址: {address}，格式: unix:///path / tcp://host:port")
+    if scheme == "unix":
+        return "unix", rest
+    if scheme in ("tcp", "tls"):
+        host, _, port = rest.rpartition(":")
+        host = host.strip("[]")  # IPv6: tcp://[::1]:7700
+        if not host or not port.isdigit():
+            raise ValueError(f"无效的 daemon 地址: {address}，格式: {scheme}://host:port")
+        return scheme, (host, int(port))
+    raise ValueError(f"不支持的 daemon 地址协议: {scheme}，支持: unix / tcp / tls")
+
+
+def connect(address: str = "", timeout: float = 5.0, tls_ca: str = "") -> socket.socket:
+    """按地址建立到 daemon 的连接。tls:// 时校验服务端证书（tls_ca 为自签 CA 路径）。"""
+    scheme, target = parse_address(address)
+    if scheme == "unix":
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(target)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    sock = socket.create_connection(target, timeout=timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if scheme == "tls":
+        import ssl
+
+        ctx = ssl.create_default_context(cafile=tls_ca or None)
+        try:
+            sock = ctx.wrap_socket(sock, server_hostname=target[0])
+        except Exception:
+            sock.close()
+            raise
+    return sock
+
+
+def recv_exact(sock: socket.socket, n: int) -> bytes:
+    """从 socket 精确读取 n 字节。"""
+    buf = bytearray(n)
+    recv_into_exact(sock, memoryview(buf))
+    return bytes(buf)
+
+
+def recv_into_exact(sock: socket.socket, view: memoryview) -> None:
+    """把数据直接读入预分配的缓冲区，直到填满。"""
+    got = 0
+    total = len(view)
+    while got < total:
+        n = sock.recv_into(view[got:])
+        if n == 0:
+            raise ConnectionError("连接中断")
+        got += n
+
+
+def sendmsg_all(sock: socket.socket, buffers: list) -> None:
+    """scatter-gather 发送多个缓冲区，处理部分发送，不拼接不复制。
+
+    TLS socket 不支持 sendmsg，退化为逐个 sendall（同样不复制）。
+    """
+    views = [memoryview(b).cast("B") for b in buffers]
+    views = [v for v in views if len(v)]
+    if _is_tls(sock):
+        for v in views:
+            sock.sendall(v)
+        return
+    while views:
+        sent = sock.sendmsg(views)
+        while sent:
+            if sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+
+def _is_tls(sock: socket.socket) -> bool:
+    # 避免为 Unix socket 导入 ssl 模块
+    return type(sock).__name__ == "SSLSocket"
+
+
+def send_message(sock: socket.socket, header: dict, payload=None) -> None:
+    """发送 [4 bytes 长度][JSON header][payload]。payload 为任意 buffer 对象。"""
+    body = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    buffers = [_LEN.pack(len(body)), body]
+    if payload is not None:
+        buffers.append(payload)
+    sendmsg_all(sock, buffers)
+
+
+def recv_message(sock: socket.socket, allow_eof: bool = False,
+                 max_length: int = MAX_HEADER_BYTES) -> dict | None:
+    """读取 [4 bytes 长度][JSON header]，不读取 payload。
+
+    allow_eof=True 时，对端在消息边界处关闭连接返回 None 而不是抛出异常。
+    header 超过 max_length 字节时抛出 ProtocolError，不分配缓冲区。
+    """
+    prefix = bytearray(4)
+    view = memoryview(prefix)
+    n = sock.recv_into(view)
+    if n == 0:
+        if allow_eof:
+            return None
+        raise ConnectionError("连接中断")
+    recv_into_exact(sock, view[n:])
+    length = _LEN.unpack(prefix)[0]
+    if length > max_length:
+        raise ProtocolError(f"header 长度 {length} 超过上限 {max_length}")
+    return json.loads(recv_exact(sock, length).decode("utf-8"))
+
+
+def _np_dtype(dtype: str) -> "np.dtype":
+    import numpy as np
+
+    name = AUDIO_DTYPES.get(dtype)
+    if name is None:
+        raise ProtocolError(f"不支持的音频编码: {dtype}，支持: {' / '.join(AUDIO_DTYPES)}")
+    return np.dtype(name)
+
+
+def encode_audio(audio: "np.ndarray", dtype: str = "float32") -> memoryview:
+    """把 float32 音频编码为指定 dtype 的字节视图。
+
+    float32 且内存连续时零拷贝；int16 需要一次转换（体积减半）。
+    """
+    import numpy as np
+
+    if dtype == "float32":
+        arr = np.ascontiguousarray(audio, dtype=np.float32)
+    elif dtype == "int16":
+        arr = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    else:
+        raise ProtocolError(f"不支持的音频编码: {dtype}，支持: {' / '.join(AUDIO_DTYPES)}")
+    return memoryview(arr).cast("B")
+
+
+def max_audio_bytes(seconds: float, sample_rate: int, dtype: str = "float32") -> int:
+    """给定时长内音频帧的最大字节数，用作 recv_audio 的 max_bytes。"""
+    return int(seconds * sample_rate) * _np_dtype(dtype).itemsize
+
+
+def recv_audio(sock: socket.socket, nbytes: int, dtype: str = "float32",
+               max_bytes: int | None = None) -> "np.ndarray":
+    """按 header 声明的长度把音频读入预分配数组，返回 float32 数组。
+
+    max_bytes 不为 None 时，超过它的帧在分配前即抛出 ProtocolError。
+    """
+    import numpy as np
+
+    np_dtype = _np_dtype(dtype)
+    if nbytes < 0 or nbytes % np_dtype.itemsize:
+        raise ProtocolError(f"音频长度 {nbytes} 不是 {dtype} 样本大小的整数倍")
+    if max_bytes is not None and nbytes > max_bytes:
+        raise ProtocolError(f"音频长度 {nbytes} 超过上限 {max_bytes}")
+
+    arr = np.empty(nbytes // np_dtype.itemsize, dtype=np_dtype)
+    recv_into_exact(sock, memoryview(arr).cast("B"))
+    if np_dtype == np.int16:
+        return arr.astype(np.float32) / 32768.0
+    return arr
+
+
+def decode_audio(data: bytes, dtype: str = "float32") -> "np.ndarray":
+    """把已读取的字节解码为 float32 数组（v1 EOF 模式使用）。"""
+    import numpy as np
+
+    np_dtype = _np_dtype(dtype)
+    arr = np.frombuffer(data, dtype=np_dtype)
+    if np_dtype == np.int16:
+        return arr.astype(np.float32) / 32768.0
+    return arr
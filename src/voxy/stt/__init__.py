@@ -1,17 +1,19 @@
 """STT 引擎基类 + 工厂函数"""
 
 from abc import ABC, abstractmethod
-
-import numpy as np
+from typing import TYPE_CHECKING
 
 from voxy.config import STTConfig
 
+if TYPE_CHECKING:
+    import numpy as np
+
 
 class STTEngine(ABC):
     """语音识别引擎抽象基类。"""
 
     @abstractmethod
-    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+    def transcribe(self, audio: "np.ndarray", sample_rate: int = 16000) -> str:
         """将音频转为文字。
 
         Args:
@@ -23,22 +25,45 @@ class STTEngine(ABC):
         """
         ...
 
+    def transcribe_batch(self, audios: list["np.ndarray"], sample_rate: int = 16000) -> list[str]:
+        """批量转写，返回与输入一一对应的文字列表。
+
+        默认逐条调用 transcribe()；支持批量推理的后端应覆盖此方法。
+        """
+        return [self.transcribe(audio, sample_rate=sample_rate) for audio in audios]
+
+    def offload(self) -> bool:
+        """把模型权重从 GPU 移到内存，释放显存但可快速恢复。
+
+        Returns:
+            是否成功移出；不支持或本就在 CPU 上时返回 False
+        """
+        return False
+
+    def restore(self) -> None:
+        """把 offload() 移出的权重搬回推理设备。"""
+
     def unload(self) -> None:
         """卸载模型，释放显存。子类可覆盖。"""
 
 
 def create_stt(config: STTConfig) -> STTEngine:
-    """根据配置创建 STT 引擎。"""
+    """根据配置创建 STT 引擎。max_segment_seconds > 0 时外包一层长录音分段。"""
     backend = config.backend.lower()
 
     if backend == "whisper":
         from voxy.stt.local_whisper import WhisperSTT
-        return WhisperSTT(config)
+        engine = WhisperSTT(config)
     elif backend == "sensevoice":
         from voxy.stt.local_sense import SenseVoiceSTT
-        return SenseVoiceSTT(config)
+        engine = SenseVoiceSTT(config)
     elif backend == "cloud":
         from voxy.stt.cloud import CloudSTT
-        return CloudSTT(config)
+        engine = CloudSTT(config)
     else:
         raise ValueError(f"未知的 STT 后端: {backend}，支持: whisper / sensevoice / cloud")
+
+    if config.max_segment_seconds > 0:
+        from voxy.stt.segment import SegmentedSTT
+        engine = SegmentedSTT(engine, config.max_segment_seconds, config.segment_batch_size)
+    return engine
@@ -10,6 +10,10 @@ from voxy.config import STTConfig
 from voxy.stt import STTEngine
 
 
+# 批量转写时的最大并发请求数
+_MAX_PARALLEL = 4
+
+
 class CloudSTT(STTEngine):
     """基于 OpenAI Whisper API 的云端语音识别。"""
 
@@ -54,3 +58,12 @@ class CloudSTT(STTEngine):
 
         response = client.audio.transcriptions.create(**kwargs)
         return response.text.strip()
+
+    def transcribe_batch(self, audios: list[np.ndarray], sample_rate: int = 16000) -> list[str]:
+        """云端请求瓶颈在网络往返，分段并发提交。"""
+        if len(audios) <= 1:
+            return super().transcribe_batch(audios, sample_rate=sample_rate)
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(_MAX_PARALLEL, len(audios))) as pool:
+            return list(pool.map(lambda a: self.transcribe(a, sample_rate=sample_rate), audios))
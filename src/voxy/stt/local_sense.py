@@ -61,7 +61,7 @@ class SenseVoiceSTT(STTEngine):
             sys.stderr = stderr_backup
             logging.disable(logging.NOTSET)
 
-    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+    def _generate(self, audio, **kwargs) -> list[dict]:
         self._load_model()
 
         language = self._config.language
@@ -75,16 +75,18 @@ class SenseVoiceSTT(STTEngine):
         stderr_backup = sys.stderr
         sys.stderr = io.StringIO()
         try:
-            result = self._model.generate(
+            return self._model.generate(
                 input=audio,
                 cache={},
                 language=language,
                 use_itn=True,
-                batch_size_s=0,
-            )
+                **kwargs,
+            ) or []
         finally:
             sys.stderr = stderr_backup
 
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        result = self._generate(audio, batch_size_s=0)
         if not result:
             return ""
 
@@ -92,6 +94,36 @@ class SenseVoiceSTT(STTEngine):
         text = rich_transcription_postprocess(text)
         return text
 
+    def transcribe_batch(self, audios: list[np.ndarray], sample_rate: int = 16000) -> list[str]:
+        if not audios:
+            return []
+        # 列表输入 + batch_size 让 funasr 把多条音频 pad 成一个 batch 推理
+        result = self._generate(list(audios), batch_size=len(audios))
+        if len(result) != len(audios):
+            raise RuntimeError(f"批量转写结果数量不匹配: {len(result)} != {len(audios)}")
+        return [rich_transcription_postprocess(r.get("text", "")) for r in result]
+
+    def offload(self) -> bool:
+        sc = self._config.sensevoice
+        if self._model is None or not sc.device.startswith("cuda"):
+            return False
+        # AutoModel.model 是 torch 模块，kwargs["device"] 决定输入数据搬到哪
+        self._model.model.to("cpu")
+        self._model.kwargs["device"] = "cpu"
+        try:
+            import torch
+            torch.cuda.empty_cache()
+        except Exception:
+            pass
+        return True
+
+    def restore(self) -> None:
+        if self._model is None:
+            return
+        device = self._config.sensevoice.device
+        self._model.model.to(device)
+        self._model.kwargs["device"] = device
+
     def unload(self) -> None:
         if self._model is not None:
             del self._model
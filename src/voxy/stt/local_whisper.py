@@ -48,6 +48,17 @@ class WhisperSTT(STTEngine):
         text = "".join(seg.text for seg in segments).strip()
         return text
 
+    def offload(self) -> bool:
+        if self._model is None or self._config.whisper.device == "cpu":
+            return False
+        # CTranslate2 支持把权重卸到内存，load_model() 时再搬回 GPU
+        self._model.model.unload_model(to_cpu=True)
+        return True
+
+    def restore(self) -> None:
+        if self._model is not None and not self._model.model.model_is_loaded:
+            self._model.model.load_model()
+
     def unload(self) -> None:
         if self._model is not None:
             del self._model
@@ -0,0 +1,131 @@
+"""长录音分段转写 - 在说话停顿处切分，分批解码后按顺序拼接"""
+
+import numpy as np
+
+from voxy.stt import STTEngine
+
+FRAME_S = 0.02       # 能量分析帧长
+MIN_PAUSE_S = 0.3    # 停顿至少 N 秒才算断句点
+
+
+def find_pause(audio: np.ndarray, sample_rate: int, force: bool = False) -> int | None:
+    """在音频中寻找最后一个说话停顿，返回切分点（样本下标）。
+
+    停顿 = 连续低能量帧：低于噪音底（10 分位数）的 2 倍，且明显低于说话音量（90 分位数）。
+    force=True 时找不到停顿也会在最安静的帧处切分。
+    """
+    frame = max(1, int(sample_rate * FRAME_S))
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return None
+
+    energy = np.abs(audio[: n_frames * frame].reshape(n_frames, frame)).mean(axis=1)
+    low, high = np.percentile(energy, [10, 90])
+    threshold = min(max(float(low) * 2, 1e-4), float(high) * 0.3)
+    quiet = energy < threshold
+
+    min_run = max(1, int(MIN_PAUSE_S / FRAME_S))
+    run_end = None
+    run_len = 0
+    # 从后往前找最后一段足够长的停顿
+    for i in range(n_frames - 1, -1, -1):
+        if quiet[i]:
+            if run_len == 0:
+                run_end = i
+            run_len += 1
+        else:
+            if run_len >= min_run:
+                break
+            run_len = 0
+    if run_len >= min_run and run_end is not None:
+        # 切在停顿中间，两侧各留一点静音
+        mid = run_end - run_len // 2
+        return (mid + 1) * frame
+
+    if force:
+        return (int(np.argmin(energy)) + 1) * frame
+    return None
+
+
+def join_texts(parts: list[str]) -> str:
+    """拼接分段转写结果：英文单词之间补空格，中文直接相连。"""
+    result = ""
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        if result and result[-1].isascii() and result[-1].isalnum() \
+                and part[0].isascii() and part[0].isalnum():
+            result += " "
+        result += part
+    return result
+
+
+def split_segments(audio: np.ndarray, sample_rate: int, max_seconds: float) -> list[np.ndarray]:
+    """把音频切成不超过 max_seconds 的分段（原数组的视图，不复制）。
+
+    每段尽量切在窗口内最后一个停顿处；整段没有停顿时切在最安静的帧。
+    """
+    max_len = int(max_seconds * sample_rate)
+    if max_len <= 0 or len(audio) <= max_len:
+        return [audio]
+
+    segments = []
+    pos = 0
+    while len(audio) - pos > max_len:
+        split = find_pause(audio[pos:pos + max_len], sample_rate, force=True)
+        if not split or split >= max_len:
+            split = max_len
+        segments.append(audio[pos:pos + split])
+        pos += split
+    segments.append(audio[pos:])
+    return segments
+
+
+class SegmentedSTT(STTEngine):
+    """在任意 STTEngine 前加一层分段：长录音按停顿切成有上限的分段，
+    每批最多 batch_size 段调用 transcribe_batch，显存占用与录音总长无关。
+    """
+
+    def __init__(self, engine: STTEngine, max_seconds: float, batch_size: int = 4):
+        self.engine = engine
+        self._max_seconds = max_seconds
+        self._batch_size = max(1, batch_size)
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        return self.transcribe_batch([audio], sample_rate=sample_rate)[0]
+
+    def transcribe_batch(self, audios: list[np.ndarray], sample_rate: int = 16000) -> list[str]:
+        # 所有输入的分段摊平后统一分批，再按来源拼回
+        owners: list[int] = []
+        segments: list[np.ndarray] = []
+        for i, audio in enumerate(audios):
+            parts = split_segments(audio, sample_rate, self._max_seconds)
+            owners.extend([i] * len(parts))
+            segments.extend(parts)
+
+        if len(segments) == len(audios):
+            # 都不需要切分，保持原有调用方式
+            if len(audios) == 1:
+                return [self.engine.transcribe(audios[0], sample_rate=sample_rate)]
+            return self.engine.transcribe_batch(audios, sample_rate=sample_rate)
+
+        texts: list[str] = []
+        for start in range(0, len(segments), self._batch_size):
+            texts.extend(self.engine.transcribe_batch(
+                segments[start:start + self._batch_size], sample_rate=sample_rate
+            ))
+
+        parts_by_audio: list[list[str]] = [[] for _ in audios]
+        for owner, text in zip(owners, texts):
+            parts_by_audio[owner].append(text)
+        return [join_texts(parts) for parts in parts_by_audio]
+
+    def offload(self) -> bool:
+        return self.engine.offload()
+
+    def restore(self) -> None:
+        self.engine.restore()
+
+    def unload(self) -> None:
+        self.engine.unload()
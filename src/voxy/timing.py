@@ -0,0 +1,95 @@
+"""分阶段耗时追踪 - 录音 → 转写 → 润色 → 输出 每一步的单调时钟耗时
+
+只依赖标准库。一次听写对应一个 Trace：本进程各阶段用 span() 计时，
+daemon 在响应中返回的分阶段耗时 (timings) 用 merge() 并入。结束后可
+打印到终端 (record --timings)，或按行追加到 JSONL 文件 (timings.log)，
+再用 voxy timings 统计各阶段的 p50 / p95。
+"""
+
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+
+
+class Trace:
+    """一次听写的分阶段耗时（毫秒）。同名阶段多次计时会累加。"""
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self.spans: dict[str, float] = {}
+        self.fields: dict = {}
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, ms: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + ms
+
+    def merge(self, timings: dict | None, prefix: str = "daemon.") -> None:
+        """并入 daemon 响应中的 timings（{阶段_ms: 耗时}）。"""
+        for key, value in (timings or {}).items():
+            if isinstance(value, (int, float)):
+                self.add(prefix + key.removesuffix("_ms"), float(value))
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def to_record(self) -> dict:
+        return {
+            "ts": round(time.time(), 3),
+            "total_ms": round(self.total_ms, 1),
+            "spans": {k: round(v, 1) for k, v in self.spans.items()},
+            **self.fields,
+        }
+
+    def format(self) -> str:
+        parts = [f"{name} {ms:.0f}ms" for name, ms in self.spans.items()]
+        return " | ".join(parts + [f"总计 {self.total_ms:.0f}ms"])
+
+
+def append_jsonl(path: str, record: dict) -> None:
+    """追加一行 JSON。单次 write 写入整行，多个进程同时追加也不会交错。"""
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """最近秩法求分位数，q 取 0-100。"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def summarize(records: list[dict]) -> dict[str, dict[str, float]]:
+    """按阶段统计 {阶段: {count, p50, p95, max}}，total 为整次听写。"""
+    samples: dict[str, list[float]] = {}
+    for rec in records:
+        for name, ms in rec.get("spans", {}).items():
+            samples.setdefault(name, []).append(ms)
+        if "total_ms" in rec:
+            samples.setdefault("total", []).append(rec["total_ms"])
+    return {
+        name: {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": max(values),
+        }
+        for name, values in samples.items()
+    }
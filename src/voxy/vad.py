@@ -0,0 +1,177 @@
+"""语音活动检测 (VAD) - 帧级特征 + 自适应噪音底 + hangover / pre-roll
+
+音频按 20ms 帧判断是否为语音：每块音频一次性用 NumPy 计算全部帧的
+能量、过零率和频谱平坦度。录音端点检测 (record) 和 daemon 流式分段
+都基于同一套逐帧判定。
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+FRAME_S = 0.02
+
+
+def frame_features(audio: np.ndarray, frame: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """计算每帧的 (平均幅度, 过零率, 频谱平坦度)。audio 长度须为 frame 的整数倍。"""
+    frames = audio.reshape(-1, frame)
+    energy = np.abs(frames).mean(axis=1)
+    signs = np.signbit(frames)
+    zcr = (signs[:, 1:] != signs[:, :-1]).mean(axis=1)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2 + 1e-12
+    flatness = np.exp(np.log(power).mean(axis=1)) / power.mean(axis=1)
+    return energy, zcr, flatness
+
+
+class NoiseFloorTracker:
+    """持续估计环境噪音底：最近 window 秒内帧能量的 10 分位数。
+
+    说话时词间停顿的帧仍是低能量，分位数不会被语音抬高；背景噪音变化后
+    约 window 秒内跟上。initial 为上次录音缓存的噪音底，历史不足 1 秒时使用。
+    """
+
+    PERCENTILE = 10
+    MIN_FLOOR = 1e-4
+    MAX_FLOOR = 0.05  # 持续的大音量是说话而不是背景噪音
+
+    def __init__(self, sample_rate: int, initial: float | None = None, window: float = 5.0):
+        self._history = np.zeros(max(1, int(window / FRAME_S)), dtype=np.float32)
+        self._pos = 0
+        self._count = 0
+        self._warmup = int(1.0 / FRAME_S)
+        self._initial = initial
+        self.floor = self._clamp(initial) if initial else None
+
+    def _clamp(self, floor: float) -> float:
+        return min(max(floor, self.MIN_FLOOR), self.MAX_FLOOR)
+
+    def update(self, energy: np.ndarray) -> float:
+        """输入一批帧能量，返回更新后的噪音底。"""
+        if energy.size == 0:
+            return self.floor or self.MIN_FLOOR
+        # 写入环形历史
+        size = len(self._history)
+        energy = energy[-size:]
+        idx = (self._pos + np.arange(len(energy))) % size
+        self._history[idx] = energy
+        self._pos = (self._pos + len(energy)) % size
+        self._count = min(self._count + len(energy), size)
+
+        if self._initial is not None and self._count < self._warmup:
+            return self.floor
+        self.floor = self._clamp(float(np.percentile(self._history[: self._count], self.PERCENTILE)))
+        return self.floor
+
+
+class VoiceDetector(ABC):
+    """逐帧语音检测器。有状态：不足一帧的尾部样本留到下一块。"""
+
+    def __init__(self, sample_rate: int):
+        self.frame = max(1, int(sample_rate * FRAME_S))
+        self._rest = np.zeros(0, dtype=np.float32)
+
+    def detect(self, block: np.ndarray) -> np.ndarray:
+        """输入任意长度的音频块，返回本块凑成的完整帧是否为语音（bool 数组）。"""
+        if self._rest.size:
+            block = np.concatenate([self._rest, block])
+        n = len(block) // self.frame
+        self._rest = block[n * self.frame:].copy()
+        if n == 0:
+            return np.zeros(0, dtype=bool)
+        return self._classify(block[: n * self.frame])
+
+    @abstractmethod
+    def _classify(self, frames: np.ndarray) -> np.ndarray:
+        """对整数帧长度的音频逐帧判定。"""
+        ...
+
+
+class EnergyVAD(VoiceDetector):
+    """能量相对噪音底 + 过零率 + 频谱平坦度的逐帧判定，带 hangover。
+
+    - 能量须高于噪音底的 ENERGY_RATIO 倍
+    - 过零率过低的是低频嗡嗡声（电源、风扇），不是语音
+    - 频谱平坦度接近白噪音的是宽带噪声，不是语音
+    - 语音帧之后 hangover 秒内仍视为语音，避免词尾和清辅音被截断
+    """
+
+    ENERGY_RATIO = 2.0
+    MIN_ZCR = 0.01
+    MAX_FLATNESS = 0.45
+
+    def __init__(self, sample_rate: int, noise: NoiseFloorTracker | None = None,
+                 hangover: float = 0.2):
+        super().__init__(sample_rate)
+        self.noise = noise or NoiseFloorTracker(sample_rate)
+        self._hangover = int(hangover / FRAME_S)
+        self._last = -(10 ** 9)  # 上一个语音帧相对本块起点的位置
+
+    def _classify(self, frames: np.ndarray) -> np.ndarray:
+        energy, zcr, flatness = frame_features(frames, self.frame)
+        floor = self.noise.update(energy)
+        raw = (energy > floor * self.ENERGY_RATIO) & (zcr > self.MIN_ZCR) \
+            & (flatness < self.MAX_FLATNESS)
+
+        n = len(raw)
+        pos = np.arange(n)
+        last = np.maximum.accumulate(np.where(raw, pos, -(10 ** 9)))
+        last = np.maximum(last, self._last)
+        self._last = int(last[-1]) - n
+        return pos - last <= self._hangover
+
+
+VAD_BACKENDS = {"energy": EnergyVAD}
+
+
+def create_vad(name: str, sample_rate: int,
+               noise: NoiseFloorTracker | None = None) -> VoiceDetector:
+    """按名称创建 VAD。"""
+    cls = VAD_BACKENDS.get(name.lower())
+    if cls is None:
+        raise ValueError(f"未知的 VAD: {name}，支持: {' / '.join(VAD_BACKENDS)}")
+    return cls(sample_rate, noise=noise)
+
+
+class Endpointer:
+    """根据逐帧判定做端点检测：连续 min_speech 秒语音才算开始说话，
+    之后连续 silence 秒非语音即结束。记录语音起止位置，裁剪时保留 pre-roll。
+    """
+
+    def __init__(self, frame: int, sample_rate: int, silence: float,
+                 min_speech: float = 0.06, preroll: float = 0.3):
+        self._frame = frame
+        self._max_silent = max(1, int(silence / FRAME_S))
+        self._min_speech = max(1, int(min_speech / FRAME_S))
+        self._preroll = int(preroll * sample_rate)
+        self._frames = 0
+        self._speech_run = 0
+        self._silent_run = 0
+        self.speech_start: int | None = None  # 首个语音帧（帧下标）
+        self.speech_end = 0                   # 最后一个语音帧之后（帧下标）
+
+    @property
+    def has_speech(self) -> bool:
+        return self.speech_start is not None
+
+    def update(self, flags: np.ndarray) -> bool:
+        """输入逐帧判定，返回是否检测到说话结束。"""
+        for is_speech in flags:
+            self._frames += 1
+            if is_speech:
+                self._speech_run += 1
+                self._silent_run = 0
+                self.speech_end = self._frames
+                if self.speech_start is None and self._speech_run >= self._min_speech:
+                    self.speech_start = self._frames - self._speech_run
+            else:
+                self._speech_run = 0
+                self._silent_run += 1
+        return self.has_speech and self._silent_run >= self._max_silent
+
+    def bounds(self, total: int) -> tuple[int, int]:
+        """语音所在的样本区间（两端各留 pre-roll），未检测到语音时返回全部。"""
+        if self.speech_start is None:
+            return 0, total
+        start = max(0, self.speech_start * self._frame - self._preroll)
+        end = min(total, self.speech_end * self._frame + self._preroll)
+        return start, end
@@ -0,0 +1,50 @@
+"""daemon 相关测试共用的 fixture"""
+
+import socket
+import threading
+
+import pytest
+
+from voxy.config import Config, DaemonConfig
+from voxy.daemon import DaemonServer
+from voxy.stt import STTEngine
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def _make(engine: STTEngine, start_worker: bool = True, **daemon_kwargs) -> DaemonServer:
+        server = DaemonServer(Config(daemon=DaemonConfig(**daemon_kwargs)),
+                              engine_factory=lambda stt_config: engine)
+        # 跳过预热推理，直接视为已加载
+        slot = server._engines._slots[server._engines.default]
+        slot.engine = engine
+        slot.tier = "loaded"
+        if start_worker:
+            server._running = True
+            threading.Thread(target=server._inference_worker, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield _make
+    for server in servers:
+        server._running = False
+
+
+@pytest.fixture
+def serve(make_server, tmp_path, monkeypatch):
+    """在临时 Unix socket 上运行完整的 accept 循环。"""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+
+    def _serve(engine: STTEngine, **daemon_kwargs) -> DaemonServer:
+        from voxy.daemon import get_socket_path
+
+        server = make_server(engine, start_worker=False, **daemon_kwargs)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(get_socket_path())
+        sock.listen(16)
+        threading.Thread(target=server.serve, args=(sock,), daemon=True).start()
+        return server
+
+    return _serve
@@ -0,0 +1,26 @@
+"""测试共用的假引擎与合成音频"""
+
+import numpy as np
+
+from voxy.stt import STTEngine
+
+
+class FakeSTT(STTEngine):
+    """记录每次转写的音频长度。"""
+
+    def __init__(self):
+        self.calls: list[int] = []
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        self.calls.append(len(audio))
+        return f"seg{len(self.calls)}"
+
+
+def speech(seconds: float, sr: int = 16000) -> np.ndarray:
+    """220 Hz 正弦波，能量足以被 VAD 判为说话。"""
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds: float, sr: int = 16000) -> np.ndarray:
+    return np.full(int(seconds * sr), 0.001, dtype=np.float32)
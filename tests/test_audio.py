@@ -1,5 +1,7 @@
 """audio.py 测试"""
 
+import sys
+import threading
 from unittest.mock import patch, MagicMock
 
 import numpy as np
@@ -12,7 +14,8 @@ def test_list_devices():
         {"name": "Test Speaker", "max_input_channels": 0, "max_output_channels": 2},
     ]
 
-    with patch("voxy.audio.sd") as mock_sd:
+    mock_sd = MagicMock()
+    with patch.dict(sys.modules, {"sounddevice": mock_sd}):
         mock_sd.query_devices.return_value = mock_devices
         mock_sd.default.device = (0, 1)
 
@@ -26,7 +29,8 @@ def test_list_devices():
 
 def test_list_devices_empty():
     """没有输入设备时的提示。"""
-    with patch("voxy.audio.sd") as mock_sd:
+    mock_sd = MagicMock()
+    with patch.dict(sys.modules, {"sounddevice": mock_sd}):
         mock_sd.query_devices.return_value = [
             {"name": "Speaker", "max_input_channels": 0, "max_output_channels": 2},
         ]
@@ -35,3 +39,61 @@ def test_list_devices_empty():
         from voxy.audio import list_devices
         result = list_devices()
         assert "未找到" in result
+
+
+def test_audio_buffer_grows_in_place():
+    """缓冲区倍增扩容，已返回的视图内容不变。"""
+    from voxy.audio import AudioBuffer
+
+    buf = AudioBuffer(4)
+    first = buf.write(np.arange(3, dtype=np.float32))
+    second = buf.write(np.arange(3, 8, dtype=np.float32))
+
+    assert len(buf) == 8
+    np.testing.assert_array_equal(buf.view(), np.arange(8, dtype=np.float32))
+    np.testing.assert_array_equal(first, [0, 1, 2])
+    np.testing.assert_array_equal(second, [3, 4, 5, 6, 7])
+    assert np.shares_memory(second, buf.view())
+
+
+def test_audio_buffer_max_samples():
+    """达到上限后丢弃多余样本并标记 full。"""
+    from voxy.audio import AudioBuffer
+
+    buf = AudioBuffer(100, max_samples=5)
+    assert len(buf.write(np.ones(4, dtype=np.float32))) == 4
+    assert not buf.full
+    assert len(buf.write(np.ones(4, dtype=np.float32))) == 1
+    assert buf.full
+    assert buf.write(np.ones(4, dtype=np.float32)).size == 0
+    assert len(buf.view()) == 5
+
+
+def test_record_stops_at_max_duration():
+    """录音回调写入缓冲区，达到 max_duration 自动停止，返回零拷贝视图。"""
+    from voxy.config import AudioConfig
+
+    def fake_stream(callback=None, blocksize=0, **kwargs):
+        stream = MagicMock()
+
+        def _enter():
+            for _ in range(10):  # 10 × 40ms 的音频块，上限只有 0.3 秒
+                callback(np.full((blocksize, 1), 0.5, dtype=np.float32), blocksize, None, None)
+            return stream
+
+        stream.__enter__.side_effect = _enter
+        return stream
+
+    chunks = []
+    mock_sd = MagicMock()
+    with patch.dict(sys.modules, {"sounddevice": mock_sd}), \
+            patch("builtins.input", side_effect=lambda: threading.Event().wait(5)):
+        mock_sd.InputStream.side_effect = fake_stream
+
+        from voxy.audio import record
+        audio = record(AudioConfig(max_duration=0.3), on_chunk=chunks.append)
+
+    assert audio.dtype == np.float32
+    assert len(audio) == int(0.3 * 16000)
+    assert len(chunks) == 8  # 最后一块只写入一半
+    assert np.shares_memory(chunks[0], audio)
@@ -0,0 +1,56 @@
+"""bench.py 测试：桩引擎跑通整个流程"""
+
+import json
+import wave
+
+import numpy as np
+import pytest
+
+from voxy import bench
+from voxy.config import Config
+from voxy.engines import UnknownEngineError
+
+
+def test_stub_run_reports_all_sections():
+    corpus = bench.synthetic_corpus(16000, (1.0, 2.0))
+    report = bench.run(Config(), ["sensevoice"], corpus, repeat=1, clients=[1, 2], stub=True)
+    json.dumps(report)  # 可序列化
+
+    entry = report["engines"]["sensevoice"]
+    assert entry["backend"] == "stub"
+    assert entry["direct"]["requests"] == 2
+    assert 0.04 < entry["direct"]["rtf"] < 0.5
+    assert entry["direct"]["peak_rss_mb"] > 0
+
+    concurrency = entry["daemon"]["concurrency"]
+    assert [c["clients"] for c in concurrency] == [1, 2]
+    assert concurrency[1]["requests"] == 4 and concurrency[1]["errors"] == 0
+    assert entry["daemon"]["metrics"]["model_loads"] == 1
+
+    components = report["components"]
+    assert components["vad_x_realtime"] > 1
+    assert components["protocol_float32_mb_per_s"] > 0
+    assert "[sensevoice] (stub)" in bench.format_report(report)
+
+
+def test_load_wav_resamples_to_mono(tmp_path):
+    path = tmp_path / "a.wav"
+    stereo = (np.ones((8000, 2)) * 16384).astype("<i2")
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(stereo.tobytes())
+
+    corpus = bench.load_corpus(str(tmp_path), 16000)
+    name, audio = corpus[0]
+    assert name == "a.wav"
+    assert len(audio) == 16000
+    assert np.allclose(audio, 0.5)
+
+
+def test_unknown_engine_rejected():
+    # 桩引擎也会校验引擎名
+    with pytest.raises(UnknownEngineError, match="nope"):
+        bench.run(Config(), ["nope"], bench.synthetic_corpus(16000, (0.5,)), stub=True,
+                  daemon=False)
@@ -0,0 +1,84 @@
+"""capture.py 测试"""
+
+import threading
+
+import numpy as np
+
+from voxy.capture import CaptureService, _Ring
+from voxy.config import AudioConfig
+
+SR = 16000
+BLOCK = 640
+
+
+def _speech(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SR)) / SR
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _silence(seconds: float) -> np.ndarray:
+    return np.full(int(seconds * SR), 0.001, dtype=np.float32)
+
+
+def _play(service: CaptureService, audio: np.ndarray) -> None:
+    """模拟 PortAudio 按块调用回调。"""
+    for i in range(0, len(audio), BLOCK):
+        block = audio[i:i + BLOCK]
+        service._callback(block.reshape(-1, 1), len(block), None, None)
+
+
+def _start(service: CaptureService, until_silence: bool = True):
+    chunks: list[np.ndarray] = []
+    ended = threading.Event()
+    service.start(chunks.append, ended.set, until_silence=until_silence)
+    return chunks, ended
+
+
+def test_ring_keeps_latest():
+    ring = _Ring(5)
+    ring.write(np.arange(3, dtype=np.float32))
+    ring.write(np.arange(3, 7, dtype=np.float32))
+    np.testing.assert_array_equal(ring.snapshot(), [2, 3, 4, 5, 6])
+    assert ring.snapshot().size == 0  # 取出后清空
+    ring.write(np.arange(10, dtype=np.float32))
+    np.testing.assert_array_equal(ring.snapshot(), [5, 6, 7, 8, 9])
+
+
+def test_capture_includes_preroll_and_stops():
+    service = CaptureService(AudioConfig(), preroll=0.2)
+    _play(service, _silence(1.0))
+    chunks, ended = _start(service, until_silence=False)
+    assert service.active
+    _play(service, _speech(0.4))
+    assert service.stop()
+
+    assert ended.wait(2)
+    assert not service.active
+    audio = np.concatenate(chunks)
+    assert len(audio) == int(0.6 * SR)  # pre-roll + 录音
+    assert np.abs(audio[: int(0.2 * SR)]).max() < 0.01
+
+
+def test_capture_ends_on_silence():
+    service = CaptureService(AudioConfig(silence_duration=0.3), preroll=0.1)
+    _play(service, _silence(1.0))
+    chunks, ended = _start(service)
+    _play(service, np.concatenate([_speech(0.5), _silence(1.0)]))
+
+    assert ended.wait(2)
+    assert not service.active
+    assert len(np.concatenate(chunks)) < int(1.4 * SR)
+    # 结束后的音频回到 pre-roll 缓冲区
+    assert service.stop() is False
+
+
+def test_capture_rejects_second_session():
+    service = CaptureService(AudioConfig())
+    _start(service)
+    try:
+        _start(service)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("应当拒绝第二个录音")
+    service.stop()
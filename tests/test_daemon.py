@@ -0,0 +1,605 @@
+"""daemon.py 测试"""
+
+import json
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from voxy.config import Config, DaemonConfig
+from voxy.daemon import DaemonServer
+from voxy.daemon_client import DaemonClient, daemon_status, transcribe_via_daemon
+from voxy.protocol import encode_audio, max_audio_bytes, recv_message, send_message
+from voxy.stt import STTEngine
+
+from fakes import FakeSTT, silence, speech
+
+
+class SlowSTT(STTEngine):
+    """阻塞到 release 被 set，模拟长时间推理。"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        self.started.set()
+        self.release.wait(timeout=5)
+        return "done"
+
+
+def _request(server: DaemonServer, header: dict, payload: bytes = b"") -> dict:
+    """通过 socketpair 发送一次请求并读取响应。"""
+    client, conn = socket.socketpair()
+    t = threading.Thread(target=server._handle_connection, args=(conn,), daemon=True)
+    t.start()
+    body = json.dumps(header).encode()
+    client.sendall(struct.pack(">I", len(body)) + body + payload)
+    client.shutdown(socket.SHUT_WR)
+    try:
+        return _read_response(client)
+    finally:
+        client.close()
+
+
+def _read_response(sock: socket.socket) -> dict:
+    length = struct.unpack(">I", sock.recv(4))[0]
+    data = b""
+    while len(data) < length:
+        data += sock.recv(length - len(data))
+    return json.loads(data)
+
+
+def test_stream_transcribes_segments_while_receiving(serve):
+    engine = FakeSTT()
+    serve(engine)
+
+    audio = np.concatenate([speech(3), silence(0.5), speech(2)])
+    with DaemonClient() as client:
+        stream = client.open_stream(sample_rate=16000)
+        for i in range(0, len(audio), 1600):
+            stream.send(audio[i:i + 1600])
+        text = stream.finish()
+
+    assert text == "seg1 seg2"
+    # 第一段在停顿处切出，两段合计等于全部音频
+    assert len(engine.calls) == 2
+    assert sum(engine.calls) == len(audio)
+
+
+def test_transcribe_request(make_server):
+    server = make_server(FakeSTT())
+    resp = _request(server, {"sample_rate": 16000}, np.zeros(1600, np.float32).tobytes())
+    # 响应带回 daemon 端的分阶段耗时
+    assert set(resp.pop("timings")) == {"queue_ms", "load_ms", "infer_ms"}
+    assert resp == {"ok": True, "text": "seg1"}
+
+
+def test_transcribe_request_v2_int16(make_server):
+    engine = FakeSTT()
+    server = make_server(engine)
+    client, conn = socket.socketpair()
+    threading.Thread(target=server._handle_connection, args=(conn,), daemon=True).start()
+
+    payload = encode_audio(np.zeros(3200, np.float32), "int16")
+    send_message(client, {"v": 2, "sample_rate": 16000, "dtype": "int16",
+                          "length": len(payload)}, payload)
+    # v2 以 length 界定音频，无需关闭写端
+    resp = recv_message(client)
+    resp.pop("timings")
+    assert resp == {"ok": True, "text": "seg1"}
+    assert engine.calls == [3200]
+    client.close()
+
+
+def test_status_answers_during_inference(make_server):
+    engine = SlowSTT()
+    server = make_server(engine)
+
+    result = {}
+    t = threading.Thread(
+        target=lambda: result.update(_request(server, {}, np.zeros(1600, np.float32).tobytes()))
+    )
+    t.start()
+    assert engine.started.wait(timeout=5)
+
+    status = _request(server, {"cmd": "status"})
+    assert status["ok"] and status["busy"]
+
+    engine.release.set()
+    t.join(timeout=5)
+    assert result["ok"] and result["text"] == "done"
+    # 推理阻塞期间的耗时计入 infer
+    assert result["timings"]["infer_ms"] > 0
+
+
+def test_queue_full_returns_busy(make_server):
+    engine = SlowSTT()
+    server = make_server(engine, queue_size=1)
+    audio = np.zeros(1600, np.float32).tobytes()
+
+    threads = [threading.Thread(target=_request, args=(server, {}, audio)) for _ in range(2)]
+    threads[0].start()
+    assert engine.started.wait(timeout=5)
+    threads[1].start()  # 占满队列
+    while server._jobs.qsize() < 1:
+        time.sleep(0.01)
+
+    resp = _request(server, {}, audio)
+    assert resp["ok"] is False
+    assert resp["busy"] is True
+
+    engine.release.set()
+    for t in threads:
+        t.join(timeout=5)
+
+
+class BatchSTT(STTEngine):
+    """第一次调用阻塞，之后记录每次 batch 的大小。"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.batches: list[int] = []
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        self.started.set()
+        self.release.wait(timeout=5)
+        self.batches.append(1)
+        return f"len{len(audio)}"
+
+    def transcribe_batch(self, audios, sample_rate=16000):
+        self.batches.append(len(audios))
+        return [f"len{len(a)}" for a in audios]
+
+
+def test_concurrent_requests_are_batched(make_server):
+    engine = BatchSTT()
+    server = make_server(engine, batch_window_ms=50, batch_max_items=8)
+
+    # 第一个请求占住推理线程，期间到达的请求在队列中积累
+    first = server._submit(np.zeros(100, np.float32), 16000)
+    assert engine.started.wait(timeout=5)
+    futures = [server._submit(np.zeros(n, np.float32), 16000) for n in (200, 300, 400)]
+
+    engine.release.set()
+    assert first.result(timeout=5) == "len100"
+    assert [f.result(timeout=5) for f in futures] == ["len200", "len300", "len400"]
+    assert engine.batches == [1, 3]
+
+
+def test_batch_respects_max_seconds(make_server):
+    engine = BatchSTT()
+    server = make_server(engine, batch_window_ms=50, batch_max_seconds=1.5)
+
+    first = server._submit(np.zeros(100, np.float32), 16000)
+    assert engine.started.wait(timeout=5)
+    futures = [server._submit(np.zeros(16000, np.float32), 16000) for _ in range(3)]
+
+    engine.release.set()
+    first.result(timeout=5)
+    for f in futures:
+        assert f.result(timeout=5) == "len16000"
+    # 每条 1 秒，上限 1.5 秒 → 每批只能放一条
+    assert engine.batches == [1, 1, 1, 1]
+
+
+def test_keepalive_connection_reused(serve):
+    serve(FakeSTT())
+    with DaemonClient() as client:
+        assert client.ping()
+        sock = client._sock
+        assert client.transcribe(np.zeros(100, np.float32)) == "seg1"
+        assert client.status()["ok"]
+        assert client.transcribe(np.zeros(100, np.float32), dtype="int16") == "seg2"
+        assert client._sock is sock
+
+
+def test_requests_multiplexed_on_one_connection(serve):
+    engine = SlowSTT()
+    serve(engine)
+    with DaemonClient() as client:
+        result = {}
+        t = threading.Thread(
+            target=lambda: result.update(text=client.transcribe(np.zeros(100, np.float32)))
+        )
+        t.start()
+        assert engine.started.wait(timeout=5)
+        # 同一连接上的 status 不必等待前一个转写完成
+        assert client.status()["busy"] is True
+        engine.release.set()
+        t.join(timeout=5)
+        assert result == {"text": "done"}
+
+
+def test_request_timeout_forgets_pending(serve):
+    engine = SlowSTT()
+    serve(engine)
+    with DaemonClient() as client:
+        payload = encode_audio(np.zeros(100, np.float32))
+        with pytest.raises(TimeoutError):
+            client.request({"v": 3, "length": len(payload)}, payload, timeout=0.1)
+        assert client._pending == {}
+        engine.release.set()
+        assert client.ping()  # 迟到的响应被丢弃，连接仍可用
+
+
+def test_stream_timeout_forgets_pending(serve):
+    """共享连接上的流式转写超时后同样不再跟踪该请求。"""
+    engine = SlowSTT()
+    serve(engine)
+    with DaemonClient(timeout=0.1) as client:
+        stream = client.open_stream(sample_rate=16000)
+        stream.send(speech(1))
+        with pytest.raises(TimeoutError):
+            stream.finish()
+        assert client._pending == {}
+        engine.release.set()
+        assert client.ping()
+
+
+def test_client_reconnects_after_daemon_restart(serve):
+    serve(FakeSTT())
+    with DaemonClient() as client:
+        assert client.ping()
+        client._sock.close()  # 模拟连接被断开
+        assert client.ping()
+
+
+def test_one_shot_helpers(serve):
+    serve(FakeSTT())
+    assert transcribe_via_daemon(np.zeros(100, np.float32)) == "seg1"
+    assert daemon_status()["ok"]
+
+
+def test_stream_timings_merged_into_trace(serve):
+    from voxy.timing import Trace
+
+    serve(FakeSTT())
+    trace = Trace()
+    audio = np.concatenate([speech(3), silence(0.5), speech(2)])
+    with DaemonClient() as client:
+        stream = client.open_stream(sample_rate=16000, trace=trace)
+        for i in range(0, len(audio), 1600):
+            stream.send(audio[i:i + 1600])
+        assert stream.finish() == "seg1 seg2"
+    # 各分段的耗时相加
+    assert trace.spans["daemon.segments"] == 2
+    assert {"daemon.queue", "daemon.load", "daemon.infer"} <= set(trace.spans)
+
+
+@pytest.fixture
+def fake_polish(monkeypatch):
+    """daemon 中的润色替换为本地函数：加书名号，"失败" 触发异常。"""
+    import voxy.processor
+
+    def process_text(text, config):
+        if "失败" in text:
+            raise RuntimeError("模型不可用")
+        return f"《{text}》"
+
+    monkeypatch.setattr(voxy.processor, "process_text", process_text)
+
+
+def test_transcribe_and_polish(make_server, fake_polish):
+    server = make_server(FakeSTT())
+    server._config.llm.enabled = True
+    resp = _request(server, {"sample_rate": 16000, "polish": True},
+                    np.zeros(1600, np.float32).tobytes())
+    assert set(resp.pop("timings")) == {"queue_ms", "load_ms", "infer_ms", "polish_ms"}
+    assert resp == {"ok": True, "text": "seg1", "polished": "《seg1》"}
+    assert server.metrics.polish.count() == 1
+
+
+def test_queued_polish_answered_on_shutdown(make_server, monkeypatch):
+    """关闭时被取消的排队润色仍以原文完成，连接不会卡在 drain()。"""
+    import voxy.processor
+
+    release = threading.Event()
+    monkeypatch.setattr(voxy.processor, "process_text",
+                        lambda text, config: release.wait(5) and f"《{text}》")
+    server = make_server(FakeSTT())
+    server._config.llm.enabled = True
+    raw: Future = Future()
+    raw.set_result("原文")
+    futures = [server._polish_after(raw) for _ in range(5)]  # 4 个润色线程占满，第 5 个排队
+    server._polisher.shutdown(wait=False, cancel_futures=True)
+    assert futures[4].result(timeout=1) == "原文"
+    assert "polished" not in futures[4].fields
+    release.set()
+    assert futures[0].result(timeout=5) == "原文"
+    assert futures[0].fields["polished"] == "《原文》"
+
+
+def test_polish_command(serve, fake_polish):
+    server = serve(FakeSTT())
+    with DaemonClient() as client:
+        with pytest.raises(RuntimeError, match="未启用"):
+            client.polish("好的")
+        server._config.llm.enabled = True
+        assert client.polish("好的") == "《好的》"
+        with pytest.raises(RuntimeError, match="模型不可用"):
+            client.polish("失败")
+    assert server.metrics.polish_errors.value() == 2
+
+
+def test_stream_with_polish(serve, fake_polish):
+    server = serve(FakeSTT())
+    server._config.llm.enabled = True
+    with DaemonClient() as client:
+        stream = client.open_stream(sample_rate=16000, polish=True)
+        stream.send(speech(1))
+        assert stream.finish() == "seg1"
+        assert stream.polish_result == {"polished": "《seg1》"}
+
+        plain = client.open_stream(sample_rate=16000)
+        plain.send(speech(1))
+        assert plain.finish() == "seg2"
+        assert plain.polish_result is None
+
+
+@pytest.fixture
+def serve_tcp(make_server):
+    """在 127.0.0.1 随机端口上运行 accept 循环，返回客户端配置。"""
+
+    def _serve(engine: STTEngine, token: str = "", tls_ctx=None) -> DaemonConfig:
+        server = make_server(engine, start_worker=False, token=token)
+        sock = socket.create_server(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        threading.Thread(target=server.serve, args=(sock, tls_ctx), daemon=True).start()
+        scheme = "tls" if tls_ctx else "tcp"
+        return DaemonConfig(connect=f"{scheme}://127.0.0.1:{port}", token=token)
+
+    return _serve
+
+
+def test_tcp_with_token(serve_tcp):
+    config = serve_tcp(FakeSTT(), token="secret")
+    with DaemonClient(config) as client:
+        assert client.ping()
+        assert client.transcribe(np.zeros(100, np.float32), dtype="int16") == "seg1"
+
+
+def test_tcp_rejects_wrong_token(serve_tcp):
+    config = serve_tcp(FakeSTT(), token="secret")
+    config.token = "wrong"
+    with pytest.raises(PermissionError):
+        DaemonClient(config).ping()
+    config.token = ""
+    assert daemon_status(config) is None
+
+
+def test_tcp_oversized_prefix_rejected_before_auth(serve_tcp, monkeypatch):
+    from voxy import protocol
+
+    sizes = []
+    real = protocol.recv_exact
+    monkeypatch.setattr(protocol, "recv_exact", lambda sock, n: (sizes.append(n), real(sock, n))[1])
+    config = serve_tcp(FakeSTT(), token="secret")
+    host, port = config.connect.removeprefix("tcp://").split(":")
+    with socket.create_connection((host, int(port)), timeout=5) as sock:
+        sock.sendall(struct.pack(">I", 0xFFFFFFFF))
+        assert sock.recv(1) == b""  # 未认证，直接断开
+    assert sizes == []
+
+
+def test_oversized_audio_frame_rejected():
+    server = DaemonServer(Config())
+    n = max_audio_bytes(server._config.audio.max_duration, 16000) + 4
+    resp = _request(server, {"v": 3, "id": 1, "length": n, "sample_rate": 16000})
+    assert not resp["ok"]
+    assert "上限" in resp["error"]
+
+
+def test_tls(serve_tcp, tmp_path):
+    import shutil
+    import ssl
+    import subprocess
+
+    if not shutil.which("openssl"):
+        pytest.skip("需要 openssl 生成测试证书")
+    cert, key = tmp_path / "cert.pem", tmp_path / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+         "-keyout", str(key), "-out", str(cert)],
+        check=True, capture_output=True,
+    )
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert, key)
+
+    config = serve_tcp(FakeSTT(), token="secret", tls_ctx=ctx)
+    config.tls_ca = str(cert)
+    with DaemonClient(config) as client:
+        assert client.status()["ok"]
+        assert client.transcribe(np.zeros(100, np.float32)) == "seg1"
+
+
+class TieredSTT(FakeSTT):
+    """支持 offload/restore 的假引擎，记录层级切换。"""
+
+    def __init__(self):
+        super().__init__()
+        self.events: list[str] = []
+
+    def offload(self) -> bool:
+        self.events.append("offload")
+        return True
+
+    def restore(self) -> None:
+        self.events.append("restore")
+
+    def unload(self) -> None:
+        self.events.append("unload")
+
+
+def test_idle_tiers(make_server):
+    engine = TieredSTT()
+    server = make_server(engine, start_worker=False)
+    server._offload_timeout = 60
+    server._idle_timeout = 600
+
+    registry = server._engines
+    name = registry.default
+    slot = registry._slots[name]
+
+    slot.last_active = time.monotonic() - 120
+    server._check_idle()
+    assert registry.tier(name) == "offloaded"
+    assert server._status()["model_loaded"] is True
+
+    # 从内存恢复，不重新加载
+    assert registry.ensure(name) is engine
+    assert registry.tier(name) == "loaded"
+    assert engine.events == ["offload", "restore"]
+    assert engine.calls == []
+
+    slot.last_active = time.monotonic() - 900
+    server._check_idle()
+    assert registry.tier(name) == "unloaded"
+    assert slot.engine is None
+    assert engine.events[-1] == "unload"
+
+
+def test_prepare_preloads_model(make_server):
+    engine = FakeSTT()
+    server = make_server(engine)
+    server._engines.unload(server._engines.default)
+
+    resp = _request(server, {"cmd": "prepare"})
+    assert resp["ok"] is True
+    deadline = time.monotonic() + 5
+    while server._status()["tier"] != "loaded" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server._status()["tier"] == "loaded"
+    assert engine.calls == [1600]  # 一次静音预热推理
+
+
+def test_request_selects_engine():
+    class BackendSTT(STTEngine):
+        def __init__(self, backend: str):
+            self.backend = backend
+
+        def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+            return self.backend
+
+    config = Config(daemon=DaemonConfig(engines={"fast": {"backend": "whisper"}}))
+    server = DaemonServer(config, engine_factory=lambda c: BackendSTT(c.backend))
+    server._running = True
+    threading.Thread(target=server._inference_worker, daemon=True).start()
+    try:
+        audio = bytes(encode_audio(speech(0.5)))
+        header = {"v": 3, "sample_rate": 16000, "length": len(audio)}
+        assert _request(server, header, audio)["text"] == "sensevoice"
+        assert _request(server, {**header, "engine": "fast"}, audio)["text"] == "whisper"
+
+        resp = _request(server, {**header, "engine": "nope"}, audio)
+        assert resp["ok"] is False
+        assert "nope" in resp["error"]
+
+        engines = {e["name"]: e for e in server._status()["engines"]}
+        assert engines["fast"]["tier"] == "loaded"
+        assert engines["fast"]["loads"] == 1
+        assert server._status()["engine"] == "sensevoice"
+    finally:
+        server._running = False
+
+
+def test_noise_floor_cache(serve):
+    serve(FakeSTT())
+    with DaemonClient() as client:
+        stream = client.open_stream(sample_rate=16000)
+        assert stream.noise_floor("mic@16000") is None
+        assert stream.noise_floor("mic@16000", 0.003) == 0.003
+        assert stream.noise_floor("mic@16000") == 0.003
+        assert stream.noise_floor("other@16000") is None
+        assert stream.finish() == ""
+
+
+def test_noise_floor_not_shared_over_tcp(serve_tcp):
+    """经 TCP 连接的客户端不读写 daemon 中的噪音底缓存。"""
+    config = serve_tcp(FakeSTT())
+    with DaemonClient(config) as client:
+        stream = client.open_stream(sample_rate=16000)
+        assert stream.noise_floor("default@16000", 0.003) is None
+        assert client.noise_floor("default@16000") is None
+        stream.finish()
+
+
+@pytest.mark.parametrize("block", [100, 640, 1600])
+def test_stream_session_cuts_at_pauses(block):
+    """停顿按新增帧增量跟踪：小块喂入时也在够长的停顿处切分。"""
+    from voxy.daemon import _StreamSession
+
+    audio = np.concatenate([speech(2), silence(0.2), speech(2), silence(0.6), speech(4),
+                            silence(0.5), speech(1)])
+    segments = []
+
+    def submit(segment):
+        segments.append(segment.size / 16000)
+        future = Future()
+        future.set_result("")
+        return future
+
+    session = _StreamSession(submit, 16000)
+    for i in range(0, len(audio), block):
+        session.feed(audio[i:i + block])
+    session.finish()
+    # 0.2 秒的短停顿不切，0.6 / 0.5 秒的停顿处各切一次
+    assert len(segments) == 3
+    assert 4.2 <= segments[0] <= 4.6
+    assert 4.2 <= segments[1] <= 4.6
+
+
+def test_stream_skips_silent_segments(serve):
+    engine = FakeSTT()
+    serve(engine)
+
+    audio = np.concatenate([silence(4), speech(1), silence(4)])
+    with DaemonClient() as client:
+        stream = client.open_stream(sample_rate=16000)
+        for i in range(0, len(audio), 1600):
+            stream.send(audio[i:i + 1600])
+        assert stream.finish() == "seg1"
+
+    # 只有含语音的一段送去推理，前导静音裁剪到 pre-roll
+    assert len(engine.calls) == 1
+    assert engine.calls[0] < 3 * 16000
+
+
+def test_capture_commands(serve):
+    from voxy.capture import CaptureService
+
+    engine = FakeSTT()
+    server = serve(engine)
+    server._capture = CaptureService(Config().audio, preroll=0.1)
+    with DaemonClient() as client:
+        future = client.start_capture(until_silence=False)
+        deadline = time.monotonic() + 5
+        while not server._capture.active and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        audio = speech(1.0)
+        for i in range(0, len(audio), 640):
+            block = audio[i:i + 640]
+            server._capture._callback(block.reshape(-1, 1), len(block), None, None)
+        assert client.status()["capturing"] is True
+        assert client.stop_capture() is True
+
+        resp = future.result(timeout=5)
+        timings = resp.pop("timings")
+        assert resp == {"ok": True, "text": "seg1", "id": 1}
+        assert timings["segments"] == 1 and timings["capture_ms"] > 0
+    assert sum(engine.calls) >= len(audio)
+
+
+def test_capture_disabled(serve):
+    serve(FakeSTT())
+    with DaemonClient() as client:
+        resp = client.start_capture().result(timeout=5)
+    assert resp["ok"] is False
+    assert resp["capture"] is False
@@ -0,0 +1,87 @@
+"""engines.py 测试"""
+
+import time
+
+import numpy as np
+import pytest
+
+from voxy.config import Config, DaemonConfig, STTConfig
+from voxy.engines import EngineRegistry, UnknownEngineError, engine_config
+from voxy.stt import STTEngine
+
+
+class NamedSTT(STTEngine):
+    """返回自身后端名，记录 unload。"""
+
+    def __init__(self, stt_config: STTConfig, events: list):
+        self.backend = stt_config.backend
+        self.events = events
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        return self.backend
+
+    def unload(self) -> None:
+        self.events.append(("unload", self.backend))
+
+
+def _registry(**daemon_kwargs) -> tuple[EngineRegistry, list]:
+    events: list = []
+    config = Config(daemon=DaemonConfig(**daemon_kwargs))
+    return EngineRegistry(config, lambda c: NamedSTT(c, events)), events
+
+
+def test_engine_config_resolution():
+    config = Config(daemon=DaemonConfig(engines={
+        "fast": {"backend": "whisper", "whisper": {"model": "tiny"}, "memory_mb": 300},
+    }))
+    name, stt, memory_mb = engine_config(config)
+    assert (name, stt.backend, memory_mb) == ("sensevoice", "sensevoice", 0)
+
+    name, stt, memory_mb = engine_config(config, "fast")
+    assert stt.backend == "whisper"
+    assert stt.whisper.model == "tiny"
+    assert stt.whisper.device == config.stt.whisper.device  # 未覆盖的字段沿用 [stt]
+    assert memory_mb == 300
+
+    assert engine_config(config, "cloud")[1].backend == "cloud"
+    with pytest.raises(UnknownEngineError):
+        engine_config(config, "nope")
+
+
+def test_registry_lists_configured_engines():
+    registry, _ = _registry(engines={"fast": {"backend": "whisper"}})
+    names = [e["name"] for e in registry.snapshot()]
+    assert names == ["sensevoice", "fast"]
+    assert all(e["tier"] == "unloaded" for e in registry.snapshot())
+
+
+def test_registry_evicts_lru_over_budget():
+    registry, events = _registry(memory_budget_mb=1000, engines={
+        "a": {"backend": "whisper", "memory_mb": 600},
+        "b": {"backend": "cloud", "memory_mb": 600},
+        "c": {"backend": "sensevoice", "memory_mb": 300},
+    })
+    assert registry.ensure("a").transcribe(np.zeros(1)) == "whisper"
+    registry.touch("a")
+    registry.ensure("c")
+    registry._slots["a"].last_active = time.monotonic() - 10  # a 最久未用
+
+    registry.ensure("b")
+    assert events == [("unload", "whisper")]
+    assert registry.tier("a") == "unloaded"
+    assert registry.tier("b") == "loaded"
+    assert registry.tier("c") == "loaded"
+    loaded = {e["name"]: e["memory_mb"] for e in registry.snapshot() if e["tier"] == "loaded"}
+    assert loaded == {"b": 600.0, "c": 300.0}
+
+
+def test_registry_unlimited_budget_keeps_all():
+    registry, events = _registry(engines={
+        "a": {"backend": "whisper", "memory_mb": 6000},
+        "b": {"backend": "cloud", "memory_mb": 6000},
+    })
+    registry.ensure("a")
+    registry.ensure("b")
+    assert events == []
+    registry.unload_all()
+    assert sorted(events) == [("unload", "cloud"), ("unload", "whisper")]
@@ -0,0 +1,139 @@
+"""fast.py 测试"""
+
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import voxy
+from voxy.config import Config
+
+from fakes import FakeSTT, speech
+
+# voxy.fast 及其依赖的累计导入耗时上限（微秒）
+IMPORT_BUDGET_US = 60_000
+HEAVY_MODULES = {"numpy", "click", "voxy.config", "voxy.daemon_client", "sounddevice"}
+
+
+def _importtime(module: str) -> dict[str, int]:
+    """在新解释器中导入 module，返回 {模块名: 累计导入耗时 us}。"""
+    src = os.path.dirname(os.path.dirname(voxy.__file__))
+    env = {**os.environ, "PYTHONPATH": src}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    result = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        result[name.strip()] = int(cumulative)
+    return result
+
+
+def test_fast_import_budget():
+    """瘦客户端不得导入重量级模块，导入耗时不得超出预算。"""
+    times = _importtime("voxy.fast")
+    assert not HEAVY_MODULES & set(times), f"导入了重量级模块: {HEAVY_MODULES & set(times)}"
+    # 多测几次取最小值，减少机器抖动的影响
+    best = min(_importtime("voxy.fast")["voxy.fast"] for _ in range(3))
+    assert best < IMPORT_BUDGET_US, f"voxy.fast 导入耗时 {best} us 超出预算 {IMPORT_BUDGET_US} us"
+
+
+def _dictate(server, audio) -> int:
+    """运行 voxy-trigger，向 daemon 的常驻录音喂入 audio，再按一次热键结束。"""
+    from voxy import fast
+    from voxy.capture import CaptureService
+
+    server._capture = CaptureService(Config().audio, preroll=0.1)
+    result = {}
+    t = threading.Thread(target=lambda: result.update(code=fast.main(["-o", "stdout"])))
+    t.start()
+    deadline = time.monotonic() + 5
+    while not server._capture.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    for i in range(0, len(audio), 640):
+        block = audio[i:i + 640]
+        server._capture._callback(block.reshape(-1, 1), len(block), None, None)
+
+    # 第二次按热键：结束录音，由第一个进程输出结果
+    assert fast.main(["--toggle"]) == 0
+    t.join(timeout=5)
+    return result["code"]
+
+
+def test_trigger_captures_and_toggles(serve, tmp_path, monkeypatch, capsys):
+    from voxy import fast
+
+    monkeypatch.setattr(fast, "CONFIG_PATH", tmp_path / "missing.toml")
+    engine = FakeSTT()
+    server = serve(engine)
+    audio = speech(1.0)
+
+    assert _dictate(server, audio) == 0
+    assert capsys.readouterr().out == "seg1\n"
+    assert sum(engine.calls) >= len(audio)
+
+
+def test_trigger_outputs_daemon_polish(serve, tmp_path, monkeypatch, capsys):
+    import voxy.cli
+    import voxy.processor
+    from voxy import fast
+
+    config_path = tmp_path / "config.toml"
+    config_path.write_text("[llm]\nenabled = true\ndaemon = true\n", encoding="utf-8")
+    monkeypatch.setattr(fast, "CONFIG_PATH", str(config_path))
+    monkeypatch.setattr(voxy.cli, "HISTORY_PATH", tmp_path / "history.json")
+    monkeypatch.setattr(voxy.processor, "process_text", lambda text, config: f"《{text}》")
+    server = serve(FakeSTT())
+    server._config.llm.enabled = True
+
+    assert _dictate(server, speech(1.0)) == 0
+    assert capsys.readouterr().out == "《seg1》\n"
+    assert "《seg1》" in (tmp_path / "history.json").read_text(encoding="utf-8")
+
+
+def test_trigger_falls_back_for_local_polish(tmp_path, monkeypatch):
+    from voxy import fast
+
+    config_path = tmp_path / "config.toml"
+    config_path.write_text("[llm]\nenabled = true\n", encoding="utf-8")
+    monkeypatch.setattr(fast, "CONFIG_PATH", str(config_path))
+    monkeypatch.setattr(fast, "_fallback", lambda args: 7)
+    assert fast.main(["-o", "stdout"]) == 7
+
+
+def test_trigger_reports_bad_address(tmp_path, monkeypatch, capsys):
+    from voxy import fast
+
+    config_path = tmp_path / "config.toml"
+    config_path.write_text('[daemon]\nconnect = "http://nowhere"\n', encoding="utf-8")
+    monkeypatch.setattr(fast, "CONFIG_PATH", str(config_path))
+    assert fast.main(["-o", "stdout"]) == 1
+    assert "错误: " in capsys.readouterr().err
+
+
+def test_trigger_reports_protocol_error(tmp_path, monkeypatch, capsys):
+    from voxy import fast
+
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def _garbage():
+        conn, _ = server.accept()
+        with conn:
+            conn.sendall(struct.pack(">I", 0xFFFFFFFF))  # 超长 header
+            conn.recv(1)
+
+    threading.Thread(target=_garbage, daemon=True).start()
+    config_path = tmp_path / "config.toml"
+    config_path.write_text(f'[daemon]\nconnect = "tcp://127.0.0.1:{server.getsockname()[1]}"\n',
+                           encoding="utf-8")
+    monkeypatch.setattr(fast, "CONFIG_PATH", str(config_path))
+    assert fast.main(["-o", "stdout"]) == 1
+    assert "错误: " in capsys.readouterr().err
+    server.close()
@@ -0,0 +1,51 @@
+"""控制类命令的导入测试：不应加载 numpy 等重量级模块"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import voxy
+
+HEAVY_MODULES = ["numpy", "sounddevice", "litellm", "httpx", "voxy.daemon"]
+
+PROBE = """
+import sys
+from voxy.cli import main
+try:
+    main(sys.argv[1:], standalone_mode=False)
+except BaseException:
+    pass
+print("LOADED:" + ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def _loaded_heavy(args: list[str], tmp_path) -> list[str]:
+    src = os.path.dirname(os.path.dirname(voxy.__file__))
+    env = {**os.environ, "PYTHONPATH": src, "XDG_RUNTIME_DIR": str(tmp_path)}
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES), *args],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    line = next(l for l in proc.stdout.splitlines() if l.startswith("LOADED:"))
+    return [m for m in line[len("LOADED:"):].split(",") if m]
+
+
+@pytest.mark.parametrize("args", [
+    ["daemon", "status"],
+    ["daemon", "stop"],
+    ["config"],
+])
+def test_control_commands_stdlib_only(args, tmp_path):
+    assert _loaded_heavy(args, tmp_path) == []
+
+
+def test_daemon_client_no_numpy(tmp_path):
+    src = os.path.dirname(os.path.dirname(voxy.__file__))
+    proc = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, voxy.daemon_client, voxy.stt; print('numpy' in sys.modules)"],
+        capture_output=True, text=True, env={**os.environ, "PYTHONPATH": src}, check=True,
+    )
+    assert proc.stdout.strip() == "False"
@@ -0,0 +1,95 @@
+"""metrics.py 测试"""
+
+import urllib.request
+
+import numpy as np
+
+from voxy.daemon_client import DaemonClient
+from voxy.metrics import Counter, DaemonMetrics, Histogram, Registry, serve_http
+from voxy.stt import STTEngine
+
+
+class EchoSTT(STTEngine):
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        return "ok"
+
+
+class FailSTT(STTEngine):
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        raise RuntimeError("boom")
+
+
+def test_counter_and_histogram_render():
+    registry = Registry()
+    c = registry.register(Counter("x_total", "计数", ("engine",)))
+    h = registry.register(Histogram("y_seconds", "耗时", buckets=(0.1, 1.0)))
+    c.inc(engine="a")
+    c.inc(2, engine="a")
+    h.observe(0.05)
+    h.observe(0.5)
+    h.observe(5)
+
+    text = registry.render()
+    assert "# TYPE x_total counter" in text
+    assert 'x_total{engine="a"} 3' in text
+    assert 'y_seconds_bucket{le="0.1"} 1' in text
+    assert 'y_seconds_bucket{le="1"} 2' in text
+    assert 'y_seconds_bucket{le="+Inf"} 3' in text
+    assert "y_seconds_count 3" in text
+    assert "y_seconds_sum 5.55" in text
+
+
+def test_label_escaping():
+    c = Counter("z_total", "", ("name",))
+    c.inc(name='a"b')
+    assert 'z_total{name="a\\"b"} 1' in c.render()
+
+
+def test_daemon_metrics_command(serve):
+    server = serve(EchoSTT())
+    with DaemonClient() as client:
+        for _ in range(3):
+            assert client.transcribe(np.zeros(16000, np.float32)) == "ok"
+        text = client.metrics()
+
+    engine = server._engines.default
+    assert server.metrics.requests.value(engine=engine) == 3
+    assert server.metrics.audio_seconds.value(engine=engine) == 3.0
+    assert server.metrics.bytes_received.value() == 3 * 16000 * 4
+    assert f'voxy_requests_total{{engine="{engine}"}} 3' in text
+    assert "voxy_real_time_factor_count" in text
+    assert "voxy_queue_depth 0" in text
+
+
+def test_daemon_metrics_errors(serve):
+    server = serve(FailSTT())
+    with DaemonClient() as client:
+        try:
+            client.transcribe(np.zeros(160, np.float32))
+        except RuntimeError:
+            pass
+    assert server.metrics.errors.value(engine=server._engines.default) == 1
+
+
+def test_engine_events_counted(make_server):
+    server = make_server(EchoSTT(), start_worker=False)
+    name = server._engines.default
+    server._engines.unload(name)
+    server._engines.ensure(name)
+    assert server.metrics.model_loads.value(engine=name) == 1
+    assert server.metrics.model_load_seconds.count(engine=name) == 1
+    assert server.metrics.model_events.value(engine=name, event="unload") == 1
+
+
+def test_http_endpoint():
+    metrics = DaemonMetrics()
+    metrics.requests.inc(engine="e")
+    http = serve_http(metrics, 0)
+    try:
+        port = http.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+            assert resp.headers["Content-Type"].startswith("text/plain")
+            body = resp.read().decode()
+    finally:
+        http.shutdown()
+    assert 'voxy_requests_total{engine="e"} 1' in body
@@ -0,0 +1,33 @@
+"""output.py 测试"""
+
+import pytest
+
+from voxy import output
+
+
+def test_output_stream_type_by_sentence(monkeypatch):
+    """type 模式按句子输入，最后补换行。"""
+    typed: list[str] = []
+    monkeypatch.setattr(output, "_type_text", typed.append)
+
+    pieces = ["你好", "，世界", "。今天", "天气", "不错！还", "行"]
+    assert output.output_stream(iter(pieces), "type") == "你好，世界。今天天气不错！还行"
+    assert typed == ["你好，世界。", "今天天气不错！", "还行\n"]
+
+
+def test_output_stream_stdout(capsys):
+    assert output.output_stream(iter(["a", "b"]), "stdout") == "ab"
+    assert capsys.readouterr().out == "ab\n"
+
+
+def test_output_stream_clipboard(monkeypatch):
+    copied: list[str] = []
+    monkeypatch.setattr(output, "_copy_to_clipboard", copied.append)
+
+    assert output.output_stream(iter(["a", "b"]), "clipboard") == "ab"
+    assert copied == ["ab\n"]
+
+
+def test_output_stream_unknown_mode():
+    with pytest.raises(ValueError):
+        output.output_stream(iter(["a"]), "speaker")
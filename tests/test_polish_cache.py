@@ -0,0 +1,64 @@
+"""polish_cache.py 测试"""
+
+from voxy import polish_cache
+from voxy.polish_cache import PolishCache, cache_key
+
+
+def test_cache_key():
+    key = cache_key("好的", "ollama/qwen2.5:3b")
+    assert cache_key("  好的\n", "ollama/qwen2.5:3b") == key
+    assert cache_key("好的", "gemini/gemini-2.5-flash") != key
+    assert cache_key("好的", "ollama/qwen2.5:3b", {"IMAX": "Emacs"}) != key
+    assert cache_key("好的", "ollama/qwen2.5:3b", {}) == key
+
+
+def test_prompt_version_invalidates(monkeypatch):
+    key = cache_key("好的", "ollama/qwen2.5:3b")
+    monkeypatch.setattr(polish_cache, "PROMPT_VERSION", "changed")
+    assert cache_key("好的", "ollama/qwen2.5:3b") != key
+
+
+def test_memory_lru():
+    cache = PolishCache(memory_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"  # a 变为最近使用
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+
+def test_persistent(tmp_path):
+    path = tmp_path / "polish.sqlite"
+    cache = PolishCache(path)
+    cache.put("k", "收到，马上处理。")
+    cache.close()
+
+    reopened = PolishCache(path)
+    assert reopened.get("k") == "收到，马上处理。"
+    assert reopened.get("missing") is None
+    reopened.close()
+
+
+def test_disk_size_eviction(tmp_path):
+    cache = PolishCache(tmp_path / "polish.sqlite", max_entries=3, memory_entries=1)
+    for i in range(5):
+        cache.put(f"k{i}", str(i))
+    assert len(cache) == 3
+    assert cache.get("k0") is None
+    assert cache.get("k4") == "4"
+    cache.close()
+
+
+def test_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(polish_cache.time, "time", lambda: now[0])
+    cache = PolishCache(tmp_path / "polish.sqlite", ttl=60)
+    cache.put("k", "v")
+    now[0] += 30
+    assert cache.get("k") == "v"
+    now[0] += 31
+    assert cache.get("k") is None
+    assert len(cache) == 0
+    cache.close()
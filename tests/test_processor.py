@@ -1,27 +1,495 @@
 """processor.py 测试"""
 
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
 
+import pytest
+
+from voxy import processor
 from voxy.config import LLMConfig
+from voxy.polish_cache import PolishCache
+
+
+# 流式响应的增量文本，首尾带空白
+STREAM_CHUNKS = ["\n", "你好", "，", "世界。", "再见", "。", "\n"]
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    """每个测试使用独立的缓存文件，不读写 ~/.cache。"""
+    cache = PolishCache(tmp_path / "polish.sqlite")
+    monkeypatch.setattr(processor, "_cache", cache)
+    yield cache
+    cache.close()
+
+
+def _start_ollama(chunks: list[str] = STREAM_CHUNKS, delay: float = 0.0):
+    """本地桩 Ollama：/api/chat 延迟 delay 秒后返回固定文本，记录每个请求的客户端端口。"""
+    ports: list[int] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # 支持 keep-alive
+
+        def do_GET(self):
+            ports.append(self.client_address[1])
+            self._send({"version": "stub"})
+
+        def do_POST(self):
+            ports.append(self.client_address[1])
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            assert body["messages"][0]["role"] == "system"
+            time.sleep(delay)
+            if body["stream"]:
+                self._send_lines([{"message": {"content": c}, "done": False}
+                                  for c in chunks] + [{"done": True}])
+            else:
+                self._send({"message": {"content": "".join(chunks).strip()}})
+
+        def _send_lines(self, lines: list[dict]):
+            payload = "".join(json.dumps(l, ensure_ascii=False) + "\n" for l in lines).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            try:
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 竞速中输掉的一路已被客户端断开
+
+        def _send(self, data: dict):
+            payload = json.dumps(data, ensure_ascii=False).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", ports
+
+
+@pytest.fixture
+def ollama():
+    server, api_base, ports = _start_ollama()
+    yield api_base, ports
+    server.shutdown()
+    processor.close_clients()
+
+
+@pytest.fixture
+def make_ollama():
+    servers = []
+
+    def make(chunks: list[str] = STREAM_CHUNKS, delay: float = 0.0) -> str:
+        server, api_base, _ = _start_ollama(chunks, delay)
+        servers.append(server)
+        return api_base
+
+    yield make
+    for server in servers:
+        server.shutdown()
+    processor.close_clients()
+
+
+def test_process_text(ollama):
+    """测试 LLM 润色功能（Ollama 直连）。"""
+    api_base, _ = ollama
+    config = LLMConfig(provider="ollama/qwen2.5:7b", api_base=api_base)
+
+    assert processor.process_text("嗯那个你好啊世界", config) == "你好，世界。再见。"
+
+
+def test_process_text_stream(ollama):
+    """流式润色逐段产出，首尾空白被去除，中间内容不变。"""
+    api_base, ports = ollama
+    config = LLMConfig(provider="ollama/qwen2.5:7b", api_base=api_base)
+
+    pieces = list(processor.process_text_stream("嗯你好世界再见", config))
+    assert pieces == ["你好", "，", "世界。", "再见", "。"]
+    # 流式请求同样复用连接池
+    processor.process_text("第二句", config)
+    assert len(set(ports)) == 1
 
 
-def test_process_text():
-    """测试 LLM 润色功能。"""
-    config = LLMConfig(
-        provider="ollama/qwen2.5:7b",
-        api_base="http://localhost:11434",
+def test_strip_stream():
+    strip = processor._strip_stream
+    assert list(strip(iter([" ", " a", " ", "b ", " "]))) == ["a", " b"]
+    assert list(strip(iter(["  ", "\n"]))) == []
+
+
+def test_process_text_stream_empty():
+    assert list(processor.process_text_stream("  ", LLMConfig())) == []
+
+
+def test_connection_reused(ollama):
+    """连续润色复用同一个 keep-alive 连接，预热建立的连接也会被复用。"""
+    api_base, ports = ollama
+    config = LLMConfig(provider="ollama/qwen2.5:7b", api_base=api_base)
+
+    processor.prewarm(config).join(timeout=5)
+    processor.process_text("第一句", config)
+    processor.process_text("第二句", config)
+    assert len(ports) == 3
+    assert len(set(ports)) == 1
+    assert processor.get_client(api_base) is processor.get_client(api_base)
+
+
+def test_cache_hit_skips_request(ollama, cache):
+    api_base, ports = ollama
+    config = LLMConfig(provider="ollama/qwen2.5:7b", api_base=api_base)
+
+    assert processor.process_text("好的", config) == "你好，世界。再见。"
+    assert processor.process_text("  好的 ", config) == "你好，世界。再见。"
+    assert len(ports) == 1
+    # 自定义词典变化后不再命中
+    config.custom_terms = {"IMAX": "Emacs"}
+    processor.process_text("好的", config)
+    assert len(ports) == 2
+    # 关闭缓存时每次都请求
+    config.cache = False
+    processor.process_text("好的", config)
+    assert len(ports) == 3
+
+
+def test_stream_result_cached(ollama):
+    api_base, ports = ollama
+    config = LLMConfig(provider="ollama/qwen2.5:7b", api_base=api_base)
+
+    first = "".join(processor.process_text_stream("你好世界", config))
+    assert list(processor.process_text_stream("你好世界", config)) == [first]
+    assert processor.process_text("你好世界", config) == first
+    assert len(ports) == 1
+
+
+def _hedge_config(local: str, cloud: str, tmp_path, budget_ms: int = 5000) -> LLMConfig:
+    return LLMConfig(
+        provider="ollama/local", api_base=local,
+        long_provider="ollama/cloud", long_api_base=cloud,
+        hedge=True, hedge_budget_ms=budget_ms, hedge_log=str(tmp_path / "hedge.jsonl"),
     )
 
+
+def _hedge_log(tmp_path) -> list[dict]:
+    lines = (tmp_path / "hedge.jsonl").read_text(encoding="utf-8").splitlines()
+    return [json.loads(line) for line in lines]
+
+
+def test_hedge_first_wins(make_ollama, tmp_path):
+    """先返回的合格结果胜出，不等待慢的一路。"""
+    config = _hedge_config(make_ollama(["本地结果。"]),
+                           make_ollama(["云端结果。"], delay=2.0), tmp_path)
+
+    start = time.perf_counter()
+    assert processor.process_text("本地结果", config) == "本地结果。"
+    assert time.perf_counter() - start < 1.5
+    record = _hedge_log(tmp_path)[0]
+    assert record["winner"] == "ollama/local"
+    assert record["outcomes"][0]["ok"] is True
+    assert record["outcomes"][1]["pending"] is True
+
+
+def test_hedge_skips_unacceptable(make_ollama, tmp_path):
+    """先返回的结果不合格（空）时等待另一路。"""
+    config = _hedge_config(make_ollama(["  "]),
+                           make_ollama(["云端结果。"], delay=0.2), tmp_path)
+
+    assert processor.process_text("云端结果", config) == "云端结果。"
+    record = _hedge_log(tmp_path)[0]
+    assert record["winner"] == "ollama/cloud"
+    assert record["outcomes"][0] == {"provider": "ollama/local", "ms": record["outcomes"][0]["ms"],
+                                     "ok": False, "chars": 0}
+
+
+def test_hedge_disconnects_loser(make_ollama, tmp_path):
+    """胜负已分时，还在等响应的一路立即断开连接。"""
+    closed = threading.Event()
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def _hang():
+        conn, _ = server.accept()
+        with conn:
+            while conn.recv(65536):  # 读走请求后不作应答，直到客户端断开
+                pass
+            closed.set()
+
+    threading.Thread(target=_hang, daemon=True).start()
+    config = _hedge_config(make_ollama(["本地结果。"]),
+                           f"http://127.0.0.1:{server.getsockname()[1]}", tmp_path)
+    assert processor.process_text("本地结果", config) == "本地结果。"
+    assert closed.wait(2)
+    server.close()
+
+
+def test_hedge_same_provider(make_ollama, tmp_path):
+    """provider 与 long_provider 相同时两路分别记录。"""
+    api_base = make_ollama(["结果。"])
+    config = _hedge_config(api_base, api_base, tmp_path)
+    config.long_provider = config.provider
+
+    assert processor.process_text("结果", config) == "结果。"
+    outcomes = _hedge_log(tmp_path)[0]["outcomes"]
+    assert [o["provider"] for o in outcomes] == ["ollama/local", "ollama/local"]
+    assert [o.get("ok", False) for o in outcomes].count(True) == 1
+    assert [o.get("pending", False) for o in outcomes].count(True) == 1
+
+
+def test_hedge_budget(make_ollama, tmp_path):
+    config = _hedge_config(make_ollama(delay=2.0), make_ollama(delay=2.0), tmp_path,
+                           budget_ms=200)
+
+    with pytest.raises(TimeoutError):
+        processor.process_text("你好世界", config)
+    assert _hedge_log(tmp_path)[0]["winner"] is None
+
+
+LONG_TEXT = "第一句话说完了。第二句，带逗号！Python 3.12 版本。\n第四段换行了？最后一句没有标点"
+
+
+@pytest.mark.parametrize("max_chars", [5, 10, 20, 1000])
+def test_split_chunks(max_chars):
+    chunks = processor.split_chunks(LONG_TEXT, max_chars)
+    assert "".join(chunks) == LONG_TEXT
+    assert all(len(c) <= max_chars for c in chunks)
+
+
+def test_split_chunks_sentence_boundaries():
+    assert processor.split_chunks(LONG_TEXT, 20) == [
+        "第一句话说完了。第二句，带逗号！",
+        "Python 3.12 版本。\n",
+        "第四段换行了？最后一句没有标点",
+    ]
+
+
+def test_chunked_parallel(monkeypatch):
+    """各段并行润色，按原顺序拼接，后续段附带上文。"""
+    prompts: list[str] = []
+
+    def fake_complete(self, system_prompt, user_prompt):
+        prompts.append(user_prompt)
+        text = user_prompt.split("输入：", 1)[1].removesuffix("\n输出：")
+        time.sleep(0.3)
+        if "失败" in text:
+            raise RuntimeError("boom")
+        return f"【{text}】"
+
+    monkeypatch.setattr(processor.OllamaProvider, "complete", fake_complete)
+    config = LLMConfig(chunk_chars=20, chunk_parallel=4, cache=False)
+
+    start = time.perf_counter()
+    result = processor.process_text(LONG_TEXT, config)
+    assert time.perf_counter() - start < 0.6
+    assert result == ("【第一句话说完了。第二句，带逗号！】【Python 3.12 版本。】\n"
+                      "【第四段换行了？最后一句没有标点】")
+    assert sum("上文" in p for p in prompts) == 2
+    assert any("上文（仅供参考，不要输出）：Python 3.12 版本。\n输入：第四段" in p for p in prompts)
+
+    # 单段失败时该段保留原文
+    assert processor.process_text("正常的一句话。这一句会失败。",
+                                  LLMConfig(chunk_chars=8, cache=False)) == "【正常的一句话。】这一句会失败。"
+
+    # 短文本不切段
+    prompts.clear()
+    processor.process_text("短句。", config)
+    assert len(prompts) == 1 and "上文" not in prompts[0]
+
+
+def _start_proxy(tag: str):
+    """桩 HTTP 代理：不转发，直接以上游身份应答，内容标明经过哪个代理。
+
+    同时支持 Ollama (/api/chat) 与 OpenAI (/chat/completions) 格式。
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            # 经代理的请求行是完整 URL
+            assert self.path.startswith("http://upstream.invalid/")
+            time.sleep(0.02)  # 让并发请求在服务端重叠
+            text = f"via {tag}"
+            if self.path.endswith("/api/chat"):
+                data = {"message": {"role": "assistant", "content": text}, "done": True}
+            else:
+                data = {
+                    "id": "stub", "object": "chat.completion", "created": 0,
+                    "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                }
+            payload = json.dumps(data).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_concurrent_calls_use_own_proxy(monkeypatch):
+    """不同代理的润色请求并发执行，互不串用，也不修改进程环境变量。"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    for var in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy",
+                "all_proxy", "NO_PROXY", "no_proxy"):
+        monkeypatch.delenv(var, raising=False)
+    proxies = {tag: _start_proxy(tag) for tag in ("a", "b")}
+    configs = {
+        "ollama-a": LLMConfig(provider="ollama/m", api_base="http://upstream.invalid",
+                              proxy=proxies["a"][1], cache=False),
+        "ollama-b": LLMConfig(provider="ollama/m", api_base="http://upstream.invalid",
+                              proxy=proxies["b"][1], cache=False),
+        "openai-a": LLMConfig(provider="openai/gpt-4o-mini", api_base="http://upstream.invalid/v1",
+                              api_key="sk-test", proxy=proxies["a"][1], cache=False),
+        "openai-b": LLMConfig(provider="openai/gpt-4o-mini", api_base="http://upstream.invalid/v1",
+                              api_key="sk-test", proxy=proxies["b"][1], cache=False),
+    }
+    jobs = [name for name in configs for _ in range(8)]
+    processor._get_litellm()  # 导入时的一次性设置不算
+    env_before = dict(processor.os.environ)
+    try:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda n: processor.process_text("你好", configs[n]), jobs))
+    finally:
+        for server, _ in proxies.values():
+            server.shutdown()
+        processor.close_clients()
+    assert results == [f"via {name[-1]}" for name in jobs]
+    assert dict(processor.os.environ) == env_before
+
+
+def test_transport_retries():
+    """连接类错误和 5xx 按 retries 重试，其余错误直接抛出。"""
+    import httpx
+
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused")
+        return "ok"
+
+    assert processor.Transport(retries=1).call(flaky) == "ok"
+    assert len(calls) == 2
+
+    calls.clear()
+    with pytest.raises(httpx.ConnectError):
+        processor.Transport(retries=0).call(flaky)
+
+    def bad_request():
+        calls.append(1)
+        raise ValueError("bad")
+
+    calls.clear()
+    with pytest.raises(ValueError):
+        processor.Transport(retries=3).call(bad_request)
+    assert len(calls) == 1
+
+
+def test_provider_retries_server_error():
+    """Ollama 返回 503 后重试成功。"""
+    statuses = [503, 200]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            status = statuses.pop(0)
+            payload = json.dumps({"message": {"content": "好了"}}).encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        provider = processor.make_provider("ollama/m", f"http://127.0.0.1:{server.server_address[1]}")
+        assert provider.complete("system", "user") == "好了"
+        assert statuses == []
+    finally:
+        server.shutdown()
+        processor.close_clients()
+
+
+def test_make_provider():
+    local = processor.make_provider("ollama/qwen2.5:3b", "http://localhost:11434")
+    assert isinstance(local, processor.OllamaProvider)
+    assert local.transport.timeout == 60.0
+    assert processor.make_provider("ollama/qwen2.5:3b", "http://localhost:11434") is local
+    assert processor.make_provider("ollama/gpt-oss:120b-cloud:cloud").transport.timeout == 180.0
+    cloud = processor.make_provider("gemini/gemini-2.5-flash", proxy="socks5://proxy:1080",
+                                    timeout=30, retries=2)
+    assert isinstance(cloud, processor.LiteLLMProvider)
+    assert cloud.transport == processor.Transport("socks5://proxy:1080", 30, 2)
+    with pytest.raises(TypeError):
+        processor.Provider("ollama/qwen2.5:3b")  # 抽象基类
+
+
+def test_client_pool_keys():
+    local = processor.get_client("http://localhost:11434", proxy="socks5://proxy:1080")
+    assert local.trust_env is False  # 本地地址不走代理
+    assert processor.get_client("http://localhost:11434") is local
+    cloud = processor.get_client("https://api.example.com", proxy="http://proxy:8080")
+    assert cloud is not local
+    assert processor.get_client("https://api.example.com") is not cloud
+    processor.close_clients()
+
+
+def test_litellm_provider():
+    """非 ollama provider 走 litellm，litellm 只配置一次。"""
+    config = LLMConfig(provider="openai/gpt-4o-mini", api_base="", api_key="sk-test")
+
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = "你好，世界。"
 
-    with patch("litellm.completion", return_value=mock_response) as mock_completion:
-        from voxy.processor import process_text
-        result = process_text("嗯那个你好啊世界", config)
+    litellm = processor._get_litellm()  # 先按 processor 的设置导入
+    with patch.object(litellm, "completion", return_value=mock_response) as mock_completion:
+        assert processor.process_text("嗯那个你好啊世界", config) == "你好，世界。"
+        assert processor.process_text("嗯那个你好啊世界", config) == "你好，世界。"
+        assert mock_completion.call_count == 1  # 第二次命中缓存
+        assert mock_completion.call_args.kwargs["api_key"] == "sk-test"
+    assert processor._get_litellm() is litellm
+
+
+def test_litellm_stream():
+    """litellm 流式调用产出各 chunk 的 delta。"""
+    config = LLMConfig(provider="openai/gpt-4o-mini", api_base="", api_key="sk-test")
+
+    def chunk(content):
+        c = MagicMock()
+        c.choices = [MagicMock()]
+        c.choices[0].delta.content = content
+        return c
 
-        assert result == "你好，世界。"
-        mock_completion.assert_called_once()
+    litellm = processor._get_litellm()
+    chunks = [chunk("你好"), chunk(None), chunk("，世界。")]
+    with patch.object(litellm, "completion", return_value=iter(chunks)) as mock_completion:
+        assert "".join(processor.process_text_stream("嗯你好世界", config)) == "你好，世界。"
+        assert mock_completion.call_args.kwargs["stream"] is True
 
 
 def test_process_empty_text():
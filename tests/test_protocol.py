@@ -0,0 +1,111 @@
+"""protocol.py 测试"""
+
+import socket
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+from voxy.protocol import (
+    MAX_HEADER_BYTES,
+    ProtocolError,
+    encode_audio,
+    max_audio_bytes,
+    recv_audio,
+    recv_message,
+    send_message,
+)
+
+
+def test_message_roundtrip_with_payload():
+    a, b = socket.socketpair()
+    audio = np.linspace(-1, 1, 4000, dtype=np.float32)
+    payload = encode_audio(audio)
+    send_message(a, {"v": 2, "length": len(payload)}, payload)
+
+    header = recv_message(b)
+    assert header["length"] == audio.nbytes
+    np.testing.assert_array_equal(recv_audio(b, header["length"]), audio)
+    a.close()
+    b.close()
+
+
+def test_float32_encode_is_zero_copy():
+    audio = np.zeros(100, dtype=np.float32)
+    view = encode_audio(audio)
+    audio[0] = 0.5
+    assert np.frombuffer(view, dtype=np.float32)[0] == 0.5
+
+
+def test_int16_halves_payload():
+    audio = np.array([0.0, 0.5, -0.5, 1.0], dtype=np.float32)
+    view = encode_audio(audio, "int16")
+    assert len(view) == audio.nbytes // 2
+
+    a, b = socket.socketpair()
+    a.sendall(view)
+    decoded = recv_audio(b, len(view), "int16")
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, audio, atol=1e-4)
+    a.close()
+    b.close()
+
+
+def test_large_payload_partial_sends():
+    """超过 socket 缓冲区的 payload 需要多次 sendmsg。"""
+    a, b = socket.socketpair()
+    audio = np.random.default_rng(0).random(1_000_000, dtype=np.float32)
+    t = threading.Thread(target=send_message, args=(a, {"length": audio.nbytes}, encode_audio(audio)))
+    t.start()
+    header = recv_message(b)
+    received = recv_audio(b, header["length"])
+    t.join()
+    np.testing.assert_array_equal(received, audio)
+    a.close()
+    b.close()
+
+
+def test_multiple_messages_then_eof():
+    a, b = socket.socketpair()
+    send_message(a, {"id": 1, "cmd": "ping"})
+    send_message(a, {"id": 2, "cmd": "status"})
+    a.shutdown(socket.SHUT_WR)
+    assert recv_message(b, allow_eof=True)["id"] == 1
+    assert recv_message(b, allow_eof=True)["id"] == 2
+    assert recv_message(b, allow_eof=True) is None
+    with pytest.raises(ConnectionError):
+        recv_message(b)
+    a.close()
+    b.close()
+
+
+def test_unknown_dtype():
+    with pytest.raises(ProtocolError):
+        encode_audio(np.zeros(4, dtype=np.float32), "opus")
+    a, b = socket.socketpair()
+    with pytest.raises(ProtocolError):
+        recv_audio(b, 8, "opus")
+    with pytest.raises(ProtocolError):
+        recv_audio(b, 7, "int16")
+    a.close()
+    b.close()
+
+
+def test_oversized_header_rejected_before_read():
+    a, b = socket.socketpair()
+    a.sendall(struct.pack(">I", MAX_HEADER_BYTES + 1))
+    with pytest.raises(ProtocolError, match="上限"):
+        recv_message(b)
+    a.close()
+    b.close()
+
+
+def test_audio_frame_limit():
+    assert max_audio_bytes(2, 16000, "int16") == 64000
+    assert max_audio_bytes(2, 16000) == 128000
+    a, b = socket.socketpair()
+    with pytest.raises(ProtocolError, match="上限"):
+        recv_audio(b, 64002, "int16", max_bytes=64000)
+    a.close()
+    b.close()
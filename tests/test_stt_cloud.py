@@ -71,3 +71,22 @@ def test_cloud_missing_api_key():
             assert False, "应该抛出 ValueError"
         except ValueError as e:
             assert "api_key" in str(e)
+
+
+def test_cloud_transcribe_batch_parallel():
+    """批量转写并发提交，结果保持输入顺序。"""
+    import threading
+
+    config = STTConfig(backend="cloud", cloud=CloudSTTConfig(api_key="test-key"))
+    from voxy.stt.cloud import CloudSTT
+    engine = CloudSTT(config)
+
+    barrier = threading.Barrier(3, timeout=5)
+
+    def fake_transcribe(audio, sample_rate=16000):
+        barrier.wait()  # 三个请求必须同时在途
+        return f"t{len(audio)}"
+
+    with patch.object(engine, "transcribe", side_effect=fake_transcribe):
+        audios = [np.zeros(n, dtype=np.float32) for n in (1, 2, 3)]
+        assert engine.transcribe_batch(audios) == ["t1", "t2", "t3"]
@@ -0,0 +1,80 @@
+"""stt/segment.py 测试"""
+
+import numpy as np
+
+from voxy.stt import STTEngine
+from voxy.stt.segment import SegmentedSTT, find_pause, join_texts, split_segments
+
+
+def _speech(seconds: float, sr: int = 16000) -> np.ndarray:
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _silence(seconds: float, sr: int = 16000) -> np.ndarray:
+    return np.full(int(seconds * sr), 0.001, dtype=np.float32)
+
+
+class RecordingSTT(STTEngine):
+    """记录每次 transcribe_batch 的分段长度（秒）。"""
+
+    def __init__(self):
+        self.batches: list[list[float]] = []
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        return self.transcribe_batch([audio], sample_rate)[0]
+
+    def transcribe_batch(self, audios, sample_rate=16000):
+        self.batches.append([round(len(a) / sample_rate, 1) for a in audios])
+        return [f"s{len(a) // sample_rate}" for a in audios]
+
+
+def test_find_pause():
+    audio = np.concatenate([_speech(2), _silence(0.5), _speech(1)])
+    split = find_pause(audio, 16000)
+    assert split is not None
+    assert 2 * 16000 < split < 2.5 * 16000
+
+
+def test_find_pause_none_without_silence():
+    assert find_pause(_speech(3), 16000) is None
+    assert find_pause(_speech(3), 16000, force=True) is not None
+
+
+def test_join_texts():
+    assert join_texts(["你好", "世界"]) == "你好世界"
+    assert join_texts(["hello", "world"]) == "hello world"
+    assert join_texts(["你好", "", " world "]) == "你好world"
+
+
+def test_split_segments_at_pauses():
+    audio = np.concatenate([_speech(4), _silence(0.6), _speech(4), _silence(0.6), _speech(3)])
+    segments = split_segments(audio, 16000, max_seconds=6)
+    assert len(segments) == 3
+    assert all(len(s) <= 6 * 16000 for s in segments)
+    assert sum(len(s) for s in segments) == len(audio)
+    assert np.shares_memory(segments[1], audio)  # 视图，不复制
+
+
+def test_split_segments_forced_without_pause():
+    segments = split_segments(_speech(25), 16000, max_seconds=10)
+    assert all(len(s) <= 10 * 16000 for s in segments)
+    assert sum(len(s) for s in segments) == 25 * 16000
+
+
+def test_segmented_stt_batches_and_stitches():
+    inner = RecordingSTT()
+    stt = SegmentedSTT(inner, max_seconds=6, batch_size=2)
+    pieces = [_speech(4), _silence(0.6)] * 4 + [_speech(2)]
+    text = stt.transcribe(np.concatenate(pieces), 16000)
+
+    assert len(inner.batches) == 3  # 5 段，每批最多 2 段
+    assert all(len(b) <= 2 for b in inner.batches)
+    assert text.startswith("s4 s4")
+
+
+def test_segmented_stt_short_audio_passthrough():
+    inner = RecordingSTT()
+    stt = SegmentedSTT(inner, max_seconds=30)
+    assert stt.transcribe_batch([_speech(2), _speech(3)], 16000) == ["s2", "s3"]
+    assert inner.batches == [[2.0, 3.0]]
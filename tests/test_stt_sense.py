@@ -45,3 +45,32 @@ def test_sensevoice_transcribe():
         result = engine.transcribe(np.zeros(16000, dtype=np.float32))
 
         assert result == "你好世界"
+
+
+def test_sensevoice_transcribe_batch():
+    """批量转写：列表输入一次 generate，结果按顺序返回。"""
+    config = STTConfig(
+        backend="sensevoice",
+        sensevoice=SenseVoiceConfig(model="iic/SenseVoiceSmall", device="cpu"),
+    )
+
+    mock_funasr = MagicMock()
+    mock_model = MagicMock()
+    mock_model.generate.return_value = [
+        {"text": "<|zh|>第一句"},
+        {"text": "<|zh|>第二句"},
+    ]
+    mock_funasr.AutoModel.return_value = mock_model
+
+    with patch.dict(sys.modules, {"funasr": mock_funasr}):
+        if "voxy.stt.local_sense" in sys.modules:
+            del sys.modules["voxy.stt.local_sense"]
+
+        from voxy.stt.local_sense import SenseVoiceSTT
+        engine = SenseVoiceSTT(config)
+        audios = [np.zeros(16000, dtype=np.float32), np.zeros(8000, dtype=np.float32)]
+        result = engine.transcribe_batch(audios)
+
+        assert result == ["第一句", "第二句"]
+        mock_model.generate.assert_called_once()
+        assert mock_model.generate.call_args[1]["batch_size"] == 2
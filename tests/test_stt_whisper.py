@@ -64,3 +64,28 @@ def test_whisper_auto_language():
 
         call_kwargs = mock_fw.WhisperModel.return_value.transcribe.call_args
         assert call_kwargs[1]["language"] is None
+
+
+def test_whisper_offload_restore():
+    """GPU 模型可以卸到内存再恢复；CPU 模型不做 offload。"""
+    mock_fw = _make_mock_faster_whisper()
+    ct2_model = mock_fw.WhisperModel.return_value.model
+    ct2_model.model_is_loaded = False
+
+    with patch.dict(sys.modules, {"faster_whisper": mock_fw}):
+        if "voxy.stt.local_whisper" in sys.modules:
+            del sys.modules["voxy.stt.local_whisper"]
+
+        from voxy.stt.local_whisper import WhisperSTT
+
+        engine = WhisperSTT(STTConfig(whisper=WhisperConfig(device="cuda")))
+        assert engine.offload() is False  # 尚未加载
+        engine._load_model()
+        assert engine.offload() is True
+        ct2_model.unload_model.assert_called_once_with(to_cpu=True)
+        engine.restore()
+        ct2_model.load_model.assert_called_once()
+
+        cpu_engine = WhisperSTT(STTConfig(whisper=WhisperConfig(device="cpu")))
+        cpu_engine._load_model()
+        assert cpu_engine.offload() is False
@@ -0,0 +1,59 @@
+"""timing.py 测试"""
+
+import json
+import time
+
+from voxy.timing import Trace, append_jsonl, percentile, summarize
+
+
+def test_spans_accumulate():
+    trace = Trace()
+    with trace.span("record"):
+        time.sleep(0.01)
+    trace.add("output", 2.0)
+    trace.add("output", 3.0)
+    assert trace.spans["record"] >= 10
+    assert trace.spans["output"] == 5.0
+    assert trace.total_ms >= trace.spans["record"]
+
+
+def test_span_records_on_exception():
+    trace = Trace()
+    try:
+        with trace.span("polish"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert "polish" in trace.spans
+
+
+def test_merge_daemon_timings():
+    trace = Trace()
+    trace.merge({"queue_ms": 1.5, "infer_ms": 40.0, "segments": 2, "bad": "x"})
+    assert trace.spans == {"daemon.queue": 1.5, "daemon.infer": 40.0, "daemon.segments": 2.0}
+    trace.merge(None)
+
+
+def test_jsonl_sink_and_summary(tmp_path):
+    path = tmp_path / "sub" / "timings.jsonl"
+    for ms in [10, 20, 30, 40, 100]:
+        trace = Trace()
+        trace.add("transcribe", ms)
+        trace.fields["path"] = "stream"
+        append_jsonl(str(path), trace.to_record())
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 5
+    assert records[0]["path"] == "stream"
+
+    stats = summarize(records)
+    assert stats["transcribe"] == {"count": 5, "p50": 30, "p95": 100, "max": 100}
+    assert stats["total"]["count"] == 5
+
+
+def test_percentile():
+    assert percentile([], 50) == 0.0
+    assert percentile([5.0], 95) == 5.0
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
@@ -0,0 +1,87 @@
+"""vad.py 测试"""
+
+import numpy as np
+
+from voxy.vad import EnergyVAD, Endpointer, NoiseFloorTracker, create_vad, frame_features
+
+SR = 16000
+rng = np.random.default_rng(0)
+
+
+def _speech(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SR)) / SR
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _noise(seconds: float, level: float = 0.01) -> np.ndarray:
+    return (rng.standard_normal(int(seconds * SR)) * level).astype(np.float32)
+
+
+def test_frame_features():
+    energy, zcr, flatness = frame_features(np.concatenate([_speech(0.04), _noise(0.04)]), 320)
+    assert len(energy) == 4
+    assert energy[0] > energy[3]
+    assert zcr[0] < zcr[3]          # 白噪音过零率高
+    assert flatness[0] < 0.1 < flatness[3]  # 纯音频谱集中，白噪音频谱平坦
+
+
+def test_noise_floor_tracks_background():
+    """噪音底取近期帧能量低分位，不被说话抬高，背景变化后能跟上。"""
+    tracker = NoiseFloorTracker(SR, window=2.0)
+
+    def frames(level: float) -> np.ndarray:
+        return level * (1 + 0.1 * rng.random(5))
+
+    for _ in range(10):
+        tracker.update(frames(0.01))
+    floor = tracker.floor
+    assert 0.01 <= floor < 0.011
+
+    # 说话（中间夹杂停顿）不会明显抬高噪音底
+    for i in range(20):
+        tracker.update(frames(0.01) if i % 3 == 0 else frames(0.3))
+    assert tracker.floor < floor * 2
+
+    # 背景变吵后在窗口时长内跟上
+    for _ in range(25):
+        tracker.update(frames(0.05))
+    assert tracker.floor > floor * 3
+
+
+def test_noise_floor_uses_cached_initial():
+    tracker = NoiseFloorTracker(SR, initial=0.02)
+    assert tracker.floor == 0.02
+    assert tracker.update(np.zeros(5, dtype=np.float32)) == 0.02  # 历史不足 1 秒
+
+
+def test_vad_rejects_steady_noise():
+    vad = create_vad("energy", SR)
+    audio = np.concatenate([_noise(1.0), _speech(0.5), _noise(1.0), _noise(0.5, level=0.05)])
+    flags = vad.detect(audio)
+    assert len(flags) == int(3.0 / 0.02)
+    assert not flags[:50].any()
+    assert flags[55:75].all()
+    assert not flags[90:].any()  # hangover 之后；变响的宽带噪声也不算语音
+
+
+def test_vad_handles_partial_frames_and_hangover():
+    vad = EnergyVAD(SR, hangover=0.1)
+    vad.detect(_noise(1.0))
+    flags = np.concatenate([vad.detect(b) for b in np.array_split(
+        np.concatenate([_speech(0.2), _noise(0.5)]), 7)])
+    speech = np.flatnonzero(flags)
+    assert speech[0] == 0
+    # 语音 10 帧 + hangover 5 帧
+    assert 14 <= speech[-1] <= 16
+
+
+def test_endpointer():
+    ep = Endpointer(frame=320, sample_rate=SR, silence=0.2, min_speech=0.06, preroll=0.1)
+    assert not ep.update(np.array([False] * 20 + [True]))  # 单帧不算开始说话
+    assert not ep.has_speech
+    assert not ep.update(np.array([False] * 5 + [True] * 10 + [False] * 9))
+    assert ep.has_speech
+    assert ep.update(np.array([False]))
+    start, end = ep.bounds(total=60 * 320)
+    assert start == 26 * 320 - 1600
+    assert end == 36 * 320 + 1600